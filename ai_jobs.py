@@ -0,0 +1,180 @@
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+
+class ModelRegistry:
+    """
+    Holds one shared model instance per model name, so routes stop constructing
+    a new GenerativeModel on every request. Instances are created by `factory`
+    the first time a name is requested (or up front via preload()). When
+    `factory` raises, `fallback` is served for that name for `retry_after`
+    seconds, after which the next get() calls `factory` again; without a
+    fallback the error propagates.
+    """
+
+    def __init__(self, factory, fallback=None, retry_after=60):
+        self._factory = factory
+        self.fallback = fallback
+        self.retry_after = retry_after
+        self._models = {}
+        self._retry_at = {}
+        self._lock = threading.Lock()
+
+    def register(self, name, model_obj):
+        with self._lock:
+            self._models[name] = model_obj
+            self._retry_at.pop(name, None)
+
+    def _retry_due(self, name):
+        retry_at = self._retry_at.get(name)
+        return retry_at is not None and time.monotonic() >= retry_at
+
+    def get(self, name):
+        model_obj = self._models.get(name)
+        if model_obj is not None and not self._retry_due(name):
+            return model_obj
+        with self._lock:
+            if name not in self._models or self._retry_due(name):
+                try:
+                    self._models[name] = self._factory(name)
+                    self._retry_at.pop(name, None)
+                except Exception:
+                    if self.fallback is None:
+                        raise
+                    self._models[name] = self.fallback
+                    self._retry_at[name] = time.monotonic() + self.retry_after
+            return self._models[name]
+
+    def is_loaded(self, name):
+        return name in self._models
+
+    def preload(self, names):
+        for name in names:
+            self.get(name)
+
+
+class JobQueueFull(Exception):
+    """Raised when the AI job queue already holds `max_pending` unfinished jobs."""
+
+
+class AIJobQueue:
+    """
+    Bounded worker pool for admin AI calls. At most `max_workers` calls run
+    concurrently and at most `max_pending` jobs may be queued or running;
+    each job is retried with exponential backoff and its status can be polled
+    by id. Finished jobs are kept (up to `max_history`) so clients can collect results.
+    """
+
+    def __init__(self, max_workers=4, max_pending=100, retries=2, backoff=0.5, max_history=1000):
+        self.max_workers = max_workers
+        self.max_pending = max_pending
+        self.retries = retries
+        self.backoff = backoff
+        self.max_history = max_history
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='ai-job')
+        self._jobs = OrderedDict()
+        self._lock = threading.Lock()
+        self._pending = 0
+        self.submitted = 0
+        self.succeeded = 0
+        self.failed = 0
+        self.rejected = 0
+        self.retried = 0
+
+    def submit(self, kind, call):
+        """Queues `call()` (which returns a JSON-serializable dict) and returns the job id."""
+        job_id = uuid.uuid4().hex
+        job = {
+            'job_id': job_id,
+            'kind': kind,
+            'status': 'queued',
+            'attempts': 0,
+            'result': None,
+            'error': None,
+            'submitted_at': time.time(),
+            'finished_at': None,
+        }
+
+        with self._lock:
+            if self._pending >= self.max_pending:
+                self.rejected += 1
+                raise JobQueueFull()
+            self._pending += 1
+            self.submitted += 1
+            self._jobs[job_id] = job
+            self._trim_history()
+
+        job['future'] = self._executor.submit(self._run, job, call)
+        return job_id
+
+    def _run(self, job, call):
+        job['status'] = 'running'
+        try:
+            for attempt in range(self.retries + 1):
+                job['attempts'] = attempt + 1
+                try:
+                    job['result'] = call()
+                    job['status'] = 'done'
+                    with self._lock:
+                        self.succeeded += 1
+                    return job['result']
+                except Exception as e:
+                    job['error'] = str(e)
+                    if attempt == self.retries:
+                        break
+                    with self._lock:
+                        self.retried += 1
+                    # Exponential backoff with jitter so parallel retries don't hit the API in lockstep.
+                    time.sleep(self.backoff * (2 ** attempt) * (1 + random.random()))
+
+            print(f"AI Job {job['job_id']} ({job['kind']}) failed after {job['attempts']} attempts: {job['error']}")
+            job['status'] = 'failed'
+            with self._lock:
+                self.failed += 1
+            return None
+        finally:
+            job['finished_at'] = time.time()
+            with self._lock:
+                self._pending -= 1
+
+    def _trim_history(self):
+        # Called with the lock held; only finished jobs are dropped.
+        while len(self._jobs) > self.max_history:
+            oldest_id = next((jid for jid, j in self._jobs.items() if j['status'] in ('done', 'failed')), None)
+            if oldest_id is None:
+                break
+            del self._jobs[oldest_id]
+
+    def wait(self, job_id, timeout=None):
+        """Blocks until the job finishes (or `timeout` elapses) and returns its status."""
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        try:
+            job['future'].result(timeout=timeout)
+        except Exception:
+            pass
+        return self.status(job_id)
+
+    def status(self, job_id):
+        job = self._jobs.get(job_id)
+        if job is None:
+            return None
+        return {key: value for key, value in job.items() if key != 'future'}
+
+    def stats(self):
+        with self._lock:
+            return {
+                'pending': self._pending,
+                'submitted': self.submitted,
+                'succeeded': self.succeeded,
+                'failed': self.failed,
+                'retried': self.retried,
+                'rejected': self.rejected,
+                'max_workers': self.max_workers,
+                'max_pending': self.max_pending,
+            }
@@ -1,12 +1,32 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, session
-import google.generativeai as genai
-import firebase_admin
-from firebase_admin import credentials, firestore
-from google.cloud.firestore_v1.base_query import FieldFilter 
+from flask import Flask, Response, render_template, request, jsonify, redirect, url_for, session, stream_with_context, g
+from flask import before_render_template, template_rendered
+from werkzeug.middleware.proxy_fix import ProxyFix
 import json 
+import math
 from pathlib import Path
 import uuid
 import os
+import time
+import atexit
+import threading
+from datetime import datetime, timezone
+
+from record_cache import CollectionCache
+import attendance_import
+from attendance_index import AttendanceIndexes
+from reply_cache import ReplyCache
+from chat_stream import StreamingChatPool, ChatPoolFull, sse_event
+from ai_jobs import ModelRegistry, AIJobQueue, JobQueueFull
+from registration_counter import RegistrationCounter
+import storage
+import metrics
+import http_cache
+from write_behind import WriteBehindBuffer, BufferFull
+from live_view import LiveCollections, FirestoreChangeFeed, LocalChangeFeed, ChangeBroadcaster, SubscribersFull, Change, MODIFIED, REMOVED
+from retrieval import CampusRetriever, Entry, build_prompt, context_fingerprint
+from lazy_clients import LazyResource, LazyProxy
+from page_cache import PageCache, FragmentCache
+from rate_limit import RateLimiter, ConcurrencyLimiter, MemoryBucketStore, RedisBucketStore, parse_rate
 
 # =======================================================================
 # 1. APPLICATION & FIREBASE SETUP (Must be at the beginning)
@@ -16,58 +36,653 @@ app = Flask(__name__) # <--- THIS MUST BE THE FIRST LINE AFTER IMPORTS!
 app.secret_key = 'secret key here ' 
 
 
-# FIREBASE SETUP
+# STORAGE / FIREBASE SETUP
+# STORAGE_BACKEND selects where records live: "firestore" (default) or "sqlite" for fully offline runs.
+# `db` is a storage backend (see storage.py), not a raw Firestore client. It is created on first use
+# (see lazy_clients.py), so importing the app and serving template-only pages never touches Firebase;
+# `if not db:` is how routes check that it is available.
+STORAGE_BACKEND = os.environ.get("STORAGE_BACKEND", "firestore").lower()
+SQLITE_PATH = os.environ.get("SQLITE_PATH", str(Path(__file__).parent / "smartcampus.db"))
 SERVICE_ACCOUNT_FILE = "firebase-service-account.json"
-db = None
 DEFAULT_APP_ID = 'smartcampus-default'
 
-try:
-    base_dir = Path(__file__).parent
-    service_account_path = base_dir / SERVICE_ACCOUNT_FILE
+if STORAGE_BACKEND == "sqlite":
+    DEFAULT_APP_ID = os.environ.get("APP_ID", 'smartcampusai-8002a')
+else:
+    # Only the project id is read up front; credentials and the client wait for first use.
+    try:
+        with open(Path(__file__).parent / SERVICE_ACCOUNT_FILE, 'r') as f:
+            DEFAULT_APP_ID = json.load(f).get('project_id', 'smartcampusai-8002a')
+    except (OSError, ValueError):
+        pass
 
-    cred = credentials.Certificate(service_account_path)
-    
-    with open(service_account_path, 'r') as f:
-        service_account_data = json.load(f)
-    
-    DEFAULT_APP_ID = service_account_data.get('project_id', 'smartcampusai-8002a') 
 
-    if not firebase_admin._apps:
-        firebase_admin.initialize_app(cred)
-    db = firestore.client()
-    print(f"Firebase initialized successfully. Default App ID: {DEFAULT_APP_ID}")
+def create_storage():
+    """Connects the configured storage backend and starts the services that depend on it."""
+    if STORAGE_BACKEND == "sqlite":
+        backend = storage.SQLiteStorage(SQLITE_PATH)
+        print(f"SQLite storage initialized at {SQLITE_PATH}. Default App ID: {DEFAULT_APP_ID}")
+    else:
+        import firebase_admin
+        from firebase_admin import credentials, firestore
+
+        cred = credentials.Certificate(Path(__file__).parent / SERVICE_ACCOUNT_FILE)
+        if not firebase_admin._apps:
+            firebase_admin.initialize_app(cred)
+        backend = storage.FirestoreStorage(firestore.client())
+        print(f"Firebase initialized successfully. Default App ID: {DEFAULT_APP_ID}")
+
+    # Every storage call is timed for /metrics and the slow-request log.
+    backend = metrics.InstrumentedStorage(backend)
+    start_live_views(backend)
+    start_registration_buffer()
+    return backend
+
+storage_client = LazyResource('Storage', create_storage)
+db = LazyProxy(storage_client)
 
-except Exception as e:
-    print(f"CRITICAL ERROR: Firebase Setup Failed. Root Cause: {e}")
-    db = None
-# GEMINI API SETUP: GLOBAL INITIALIZATION (FIXED)
+# GEMINI API SETUP: LAZY INITIALIZATION
 # -------------------------------------------------------------------
 # !!! PLACE YOUR GEMINI API KEY HERE FOR LOCAL TESTING !!!
 # The code checks the OS environment variable first, then uses this hardcoded key.
 GEMINI_API_KEY = os.environ.get("GEMINI_API_KEY", "Your api key ")
 # I have directly inserted the key you provided into the fallback area.
 # -------------------------------------------------------------------
+GEMINI_MODEL_NAME = 'gemini-2.5-flash'
+# After a failed Gemini setup the AI routes use the offline fallback, and setup is tried again this many seconds later.
+MODEL_RETRY_SECONDS = float(os.environ.get("MODEL_RETRY_SECONDS", "45"))
+
+
+def configure_gemini():
+    """Imports and configures the Gemini SDK; the import alone is a large share of startup time."""
+    import google.generativeai as genai
 
-try:
-    # 1. Configure the API key first
     if GEMINI_API_KEY and GEMINI_API_KEY != "YOUR_API_KEY_HERE":
         genai.configure(api_key=GEMINI_API_KEY)
-        
-    # 2. Initialize the model using the standard method (NO explicit 'tools' argument, 
-    # as the runtime should handle grounding if available and compatible).
-    model = genai.GenerativeModel('gemini-2.5-flash')
-    print("Gemini model initialized successfully.")
-except Exception as e:
-    print(f"CRITICAL ERROR: Gemini Model Initialization Failed. Root Cause: {e}")
-    # Define a robust fallback model that won't raise NameErrors
-    def fallback_model_function(prompt):
-        return type('Response', (object,), {'text': f"Sorry, the live AI is currently offline due to a model error. You asked: {prompt}"})()
-    model = fallback_model_function
+    return genai
+
+gemini_sdk = LazyResource('Gemini SDK', configure_gemini, retry_after=MODEL_RETRY_SECONDS)
+
+
+def fallback_model_function(prompt):
+    """Robust stand-in used when the model can't be initialized, so AI routes still answer."""
+    return type('Response', (object,), {'text': f"Sorry, the live AI is currently offline due to a model error. You asked: {prompt}"})()
+
+
+def create_model(name):
+    """Model factory for model_registry: a GenerativeModel (the registry serves the fallback function if this raises)."""
+    try:
+        genai = gemini_sdk.get()
+        if genai is None:
+            raise RuntimeError(gemini_sdk.error)
+        # Standard initialization (NO explicit 'tools' argument; the runtime handles grounding if available).
+        model_obj = genai.GenerativeModel(name)
+        print("Gemini model initialized successfully.")
+        return model_obj
+    except Exception as e:
+        print(f"CRITICAL ERROR: Gemini Model Initialization Failed. Root Cause: {e}")
+        raise
+
+# Shared model instances, created on first use and reused by every AI route.
+model_registry = ModelRegistry(factory=create_model, fallback=fallback_model_function, retry_after=MODEL_RETRY_SECONDS)
+
+
+# STARTUP & READINESS
+# GUNICORN_PRELOAD=1 runs import_sdks() once in the gunicorn master so workers share the imported
+# modules; clients are still created per worker, after the fork. /ready creates them in the
+# background and answers 503 until they exist, so a probe warms each worker before it gets traffic.
+def import_sdks():
+    """Imports the Gemini and Firebase SDK modules without creating any client (safe before fork)."""
+    try:
+        import google.generativeai  # noqa: F401
+        if STORAGE_BACKEND != "sqlite":
+            from firebase_admin import firestore  # noqa: F401
+    except ImportError as e:
+        print(f"SDK preload skipped: {e}")
+
+
+def warm_up():
+    """Creates the storage backend and the default Gemini model, and pre-renders the static pages, ahead of the first request."""
+    prerender_static_pages()
+    storage_client.get()
+    model_registry.get(GEMINI_MODEL_NAME)
+
+
+warm_up_thread = None
+warm_up_lock = threading.Lock()
+
+def start_warm_up():
+    """Runs warm_up() on a background thread, once per worker."""
+    global warm_up_thread
+    with warm_up_lock:
+        if warm_up_thread is None:
+            warm_up_thread = threading.Thread(target=warm_up, name='warm-up', daemon=True)
+            warm_up_thread.start()
+
     
 # Hardcoded Admin credentials for demonstration (FIXED)
 ADMIN_USERNAME = "admin"
 ADMIN_PASSWORD = "secure_password" # Set your secure password here
 
+# LISTING CACHE SETUP
+# Shared by every request in this worker; admin writes invalidate the affected collection.
+RECORD_CACHE_TTL = int(os.environ.get("RECORD_CACHE_TTL", "60"))
+RECORD_CACHE_MAX_ENTRIES = int(os.environ.get("RECORD_CACHE_MAX_ENTRIES", "128"))
+record_cache = CollectionCache(ttl=RECORD_CACHE_TTL, max_entries=RECORD_CACHE_MAX_ENTRIES)
+
+# HTTP CACHING & COMPRESSION SETUP
+# Listing pages carry ETag/Last-Modified from the cached listing, so unchanged reloads get a 304.
+# Text responses of at least COMPRESS_MIN_BYTES are gzip (or brotli, if installed) compressed.
+COMPRESS_MIN_BYTES = int(os.environ.get("COMPRESS_MIN_BYTES", "1024"))
+response_compressor = http_cache.ResponseCompressor(min_bytes=COMPRESS_MIN_BYTES)
+
+# PAGE & FRAGMENT CACHE SETUP
+# Rendered pages are kept as bytes under their ETag: static pages (/, /timetable) once per template file,
+# listing pages once per listing version and admin/public variant. Listing records are rendered through
+# per-record card templates cached by (doc id, timestamp), so a changed listing re-renders only changed records.
+PAGE_CACHE_MAX_ENTRIES = int(os.environ.get("PAGE_CACHE_MAX_ENTRIES", "64"))
+FRAGMENT_CACHE_MAX_ENTRIES = int(os.environ.get("FRAGMENT_CACHE_MAX_ENTRIES", "5000"))
+STATIC_PAGES = ("index.html", "timetable.html")
+page_cache = PageCache(max_entries=PAGE_CACHE_MAX_ENTRIES)
+fragment_cache = FragmentCache(max_entries=FRAGMENT_CACHE_MAX_ENTRIES)
+
+# WORKER CAPACITY
+# Read from the same variable as gunicorn.conf.py. Every open stream (chatbot or live updates) holds one
+# of the worker's GUNICORN_THREADS threads until it ends.
+REQUEST_THREADS = int(os.environ.get("GUNICORN_THREADS", "32"))
+
+# LIVE VIEW SETUP (optional, LIVE_VIEWS=1)
+# One change listener per collection (Firestore on_snapshot; this worker's own writes on SQLite) keeps an
+# in-memory view that the listing routes read from, and pushes each change to browsers on /live/<collection>.
+# Streams are capped at a quarter of the threads so they can't starve page requests; browsers over the
+# cap simply get no live updates.
+LIVE_VIEWS = os.environ.get("LIVE_VIEWS", "0") == "1"
+LIVE_MAX_SUBSCRIBERS = int(os.environ.get("LIVE_MAX_SUBSCRIBERS", str(max(1, REQUEST_THREADS // 4))))
+LIVE_HEARTBEAT_SECONDS = int(os.environ.get("LIVE_HEARTBEAT_SECONDS", "25"))
+LIVE_EVENT_HISTORY = int(os.environ.get("LIVE_EVENT_HISTORY", "1000"))
+# Topics anyone may subscribe to; attendance changes are only streamed to admins.
+LIVE_PUBLIC_TOPICS = ('events', 'circulars', 'results')
+
+live_collections = None
+
+def start_live_views(backend):
+    """Starts the listeners and views (when LIVE_VIEWS is on); called once the storage backend exists."""
+    global live_collections
+    if not LIVE_VIEWS:
+        return
+    print(f"Live views: at most {LIVE_MAX_SUBSCRIBERS} open streams per worker.")
+    if backend.name == 'firestore':
+        live_feed = FirestoreChangeFeed(backend.backend.client)
+    else:
+        live_feed = LocalChangeFeed(backend)
+    collections = LiveCollections(live_feed, ChangeBroadcaster(
+        history=LIVE_EVENT_HISTORY, max_subscribers=LIVE_MAX_SUBSCRIBERS, heartbeat=LIVE_HEARTBEAT_SECONDS))
+    live_data_path = f"artifacts/{DEFAULT_APP_ID}/public/data"
+    collections.watch(f"{live_data_path}/events", 'events',
+                      lambda doc_id, data: dict(data, id=doc_id), order_by='timestamp', descending=True)
+    for live_record_type in ('circulars', 'results'):
+        collections.watch(f"{live_data_path}/{live_record_type}", live_record_type,
+                          lambda doc_id, data: format_public_record(doc_id, data), order_by='timestamp', descending=True)
+    collections.watch(f"{live_data_path}/attendance", 'attendance',
+                      lambda doc_id, data: format_attendance_record(doc_id, data))
+    atexit.register(collections.close)
+    live_collections = collections
+
+# CHATBOT REPLY CACHE SETUP
+# Identical (normalized) questions are answered from memory; concurrent duplicates share one Gemini call.
+CHAT_CACHE_TTL = int(os.environ.get("CHAT_CACHE_TTL", "600"))
+CHAT_CACHE_MAX_ENTRIES = int(os.environ.get("CHAT_CACHE_MAX_ENTRIES", "512"))
+# Seconds a chat reply may take, for the Gemini call and for requests waiting on a duplicate in flight.
+CHAT_TIMEOUT = float(os.environ.get("CHAT_TIMEOUT", "30"))
+chat_cache = ReplyCache(ttl=CHAT_CACHE_TTL, max_entries=CHAT_CACHE_MAX_ENTRIES)
+
+# CHATBOT RETRIEVAL SETUP
+# Chatbot questions are grounded in a BM25 index of circulars, results and events: the best
+# matching records go into the Gemini prompt, and a question that is exactly a record's title is
+# answered from the record without calling the model. This worker's writes update the index in
+# place; a rebuild every RETRIEVAL_INDEX_TTL seconds picks up writes made by other workers.
+CHAT_RETRIEVAL = os.environ.get("CHAT_RETRIEVAL", "1") == "1"
+RETRIEVAL_INDEX_TTL = int(os.environ.get("RETRIEVAL_INDEX_TTL", "600"))
+RETRIEVAL_TOP_K = int(os.environ.get("RETRIEVAL_TOP_K", "3"))
+RETRIEVAL_COLLECTIONS = ('circulars', 'results', 'events')
+campus_retriever = CampusRetriever(ttl=RETRIEVAL_INDEX_TTL, top_k=RETRIEVAL_TOP_K)
+
+
+# STREAMING CHAT POOL SETUP
+# Streaming generations run on their own bounded thread pool, separate from the request threads.
+# Every running or queued stream still holds one request thread while it relays chunks, so the
+# defaults keep the total to a fraction of the worker's REQUEST_THREADS.
+CHAT_STREAM_WORKERS = int(os.environ.get("CHAT_STREAM_WORKERS", str(max(1, REQUEST_THREADS // 4))))
+CHAT_STREAM_QUEUE = int(os.environ.get("CHAT_STREAM_QUEUE", str(REQUEST_THREADS // 16)))
+chat_stream_pool = StreamingChatPool(max_workers=CHAT_STREAM_WORKERS, max_queued=CHAT_STREAM_QUEUE)
+
+
+# REGISTRATION COUNTER SETUP
+# Per-event sharded counters, bumped in the same batch as each registration.
+REGISTRATION_COUNTER_SHARDS = int(os.environ.get("REGISTRATION_COUNTER_SHARDS", "10"))
+registration_counter = RegistrationCounter(shard_count=REGISTRATION_COUNTER_SHARDS)
+
+# REGISTRATION WRITE-BEHIND SETUP (optional, REGISTRATION_WRITE_BEHIND=1)
+# Registrations are acknowledged once appended to a local spill file and committed to Firestore in batches.
+REGISTRATION_WRITE_BEHIND = os.environ.get("REGISTRATION_WRITE_BEHIND", "0") == "1"
+REGISTRATION_SPILL_DIR = os.environ.get("REGISTRATION_SPILL_DIR", str(Path(__file__).parent / "spill"))
+REGISTRATION_FLUSH_BATCH = int(os.environ.get("REGISTRATION_FLUSH_BATCH", "200"))
+REGISTRATION_FLUSH_INTERVAL = float(os.environ.get("REGISTRATION_FLUSH_INTERVAL", "1.0"))
+# Each registration is two writes (document + counter shard); Firestore allows 500 per batch.
+REGISTRATIONS_PER_COMMIT = 250
+
+
+def flush_registrations(records, maybe_committed):
+    """
+    Commits buffered registrations. A registration document and its shard increment commit in the
+    same batch, so a record in `maybe_committed` whose document already exists has been counted
+    and is skipped rather than incremented again.
+    """
+    if maybe_committed:
+        records = [record for record in records if record['id'] not in maybe_committed or db.get(
+            f"artifacts/{record['app_id']}/public/data/registrations", record['id']) is None]
+    for start in range(0, len(records), REGISTRATIONS_PER_COMMIT):
+        batch = db.batch()
+        for record in records[start:start + REGISTRATIONS_PER_COMMIT]:
+            accepted_at = datetime.fromisoformat(record['accepted_at'])
+            registration_data = {
+                'event_id': record['event_id'],
+                'user_id': record['user_id'],
+                'registration_date': accepted_at
+            }
+            registration_counter.add_to_batch(
+                batch,
+                f"artifacts/{record['app_id']}/public/data/registrations",
+                f"artifacts/{record['app_id']}/public/data/registration_stats",
+                record['id'], registration_data, now=accepted_at)
+        batch.commit()
+
+
+registration_buffer = None
+
+def start_registration_buffer():
+    """Starts the write-behind buffer (when REGISTRATION_WRITE_BEHIND is on); called once the storage backend exists."""
+    global registration_buffer
+    if not REGISTRATION_WRITE_BEHIND:
+        return
+    buffer = WriteBehindBuffer(
+        flush_registrations, REGISTRATION_SPILL_DIR, name='registrations',
+        max_batch=REGISTRATION_FLUSH_BATCH, flush_interval=REGISTRATION_FLUSH_INTERVAL)
+    buffer.start()
+    # Drain on shutdown; anything still unflushed stays in the spill file for the next start.
+    atexit.register(buffer.drain)
+    registration_buffer = buffer
+
+# ADMIN AI JOB QUEUE SETUP
+# Summary/analysis calls run on a bounded pool with per-call timeouts and retries; clients may poll by job id.
+AI_JOB_WORKERS = int(os.environ.get("AI_JOB_WORKERS", "4"))
+AI_JOB_MAX_PENDING = int(os.environ.get("AI_JOB_MAX_PENDING", "100"))
+AI_JOB_RETRIES = int(os.environ.get("AI_JOB_RETRIES", "2"))
+AI_CALL_TIMEOUT = float(os.environ.get("AI_CALL_TIMEOUT", "30"))
+# How long a non-async request waits for its job before answering with the job id instead.
+AI_SYNC_WAIT = float(os.environ.get("AI_SYNC_WAIT", "60"))
+ai_jobs = AIJobQueue(max_workers=AI_JOB_WORKERS, max_pending=AI_JOB_MAX_PENDING, retries=AI_JOB_RETRIES)
+
+# ATTENDANCE INDEX SETUP
+# Admin filter/sort queries and summary stats run on a compact in-memory index of the attendance
+# collection. This worker's updates are applied in place; a full rebuild every ATTENDANCE_INDEX_TTL
+# seconds picks up writes made by other workers.
+ATTENDANCE_INDEX_TTL = int(os.environ.get("ATTENDANCE_INDEX_TTL", "300"))
+attendance_indexes = AttendanceIndexes(ttl=ATTENDANCE_INDEX_TTL)
+
+# RATE LIMITING & LOAD SHEDDING SETUP
+# Token buckets per client IP and route group bound how often the routes that spend Gemini quota or
+# storage writes can be hit. RATE_LIMIT_<GROUP> is "<requests>/<seconds>" ("0" disables the group).
+# Buckets live in this worker's memory, or in Redis (shared by all workers and instances) when
+# RATE_LIMIT_REDIS_URL is set. Logged-in admins draw AI reports from a larger bucket of their own per
+# login session (RATE_LIMIT_AI_REPORTS_ADMIN) instead of their IP's. MAX_CONCURRENT_REQUESTS caps
+# requests in flight per worker (0 = no cap); requests over it get an immediate 503 instead of
+# queueing. Behind a reverse proxy, set PROXY_HOPS so the client IP is taken from X-Forwarded-For.
+RATE_LIMITS = {
+    'chat': parse_rate(os.environ.get("RATE_LIMIT_CHAT", "30/60")),
+    'ai_reports': parse_rate(os.environ.get("RATE_LIMIT_AI_REPORTS", "10/60")),
+    'ai_reports_admin': parse_rate(os.environ.get("RATE_LIMIT_AI_REPORTS_ADMIN", "60/60")),
+    'register': parse_rate(os.environ.get("RATE_LIMIT_REGISTER", "20/60")),
+}
+RATE_LIMITED_ENDPOINTS = {
+    'chatbot_reply': 'chat',
+    'chatbot_stream': 'chat',
+    'generate_summary': 'ai_reports',
+    'analyze_registrations': 'ai_reports',
+    'register_for_event': 'register',
+}
+# Groups whose logged-in admin requests use another group's rate, keyed by login session.
+ADMIN_RATE_LIMIT_GROUPS = {'ai_reports': 'ai_reports_admin'}
+RATE_LIMIT_REDIS_URL = os.environ.get("RATE_LIMIT_REDIS_URL")
+# The default cap leaves threads free for live streams (which don't count toward it) plus an eighth as
+# headroom, so a request over the cap still finds a thread to turn it away instead of waiting in
+# gunicorn's accept queue.
+DEFAULT_MAX_CONCURRENT_REQUESTS = max(1, REQUEST_THREADS - (LIVE_MAX_SUBSCRIBERS if LIVE_VIEWS else 0)
+                                      - max(2, REQUEST_THREADS // 8))
+MAX_CONCURRENT_REQUESTS = int(os.environ.get("MAX_CONCURRENT_REQUESTS", str(DEFAULT_MAX_CONCURRENT_REQUESTS)))
+# Long-lived streams and probes don't count toward the cap.
+UNCAPPED_ENDPOINTS = ('live_updates', 'prometheus_metrics', 'readiness', 'static')
+PROXY_HOPS = int(os.environ.get("PROXY_HOPS", "0"))
+
+if PROXY_HOPS:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_HOPS)
+
+
+def create_rate_limit_store():
+    if RATE_LIMIT_REDIS_URL:
+        try:
+            import redis
+            return RedisBucketStore(redis.Redis.from_url(RATE_LIMIT_REDIS_URL))
+        except ImportError as e:
+            print(f"Rate limit store: redis package unavailable ({e}); using in-memory buckets.")
+    return MemoryBucketStore()
+
+rate_limiter = RateLimiter(create_rate_limit_store(), RATE_LIMITS)
+request_limiter = ConcurrencyLimiter(MAX_CONCURRENT_REQUESTS)
+
+# Component stats exported on /metrics alongside the latency histograms.
+metrics.add_stats_collector('record_cache', record_cache.stats)
+metrics.add_stats_collector('page_cache', page_cache.stats)
+metrics.add_stats_collector('fragment_cache', fragment_cache.stats)
+metrics.add_stats_collector('chat_cache', chat_cache.stats)
+metrics.add_stats_collector('retrieval', campus_retriever.stats)
+metrics.add_stats_collector('chat_stream', chat_stream_pool.stats)
+metrics.add_stats_collector('ai_jobs', ai_jobs.stats)
+metrics.add_stats_collector('registration_buffer', lambda: registration_buffer.stats() if registration_buffer else None)
+metrics.add_stats_collector('attendance_index', attendance_indexes.stats)
+metrics.add_stats_collector('rate_limit', rate_limiter.stats)
+metrics.add_stats_collector('load_shedding', request_limiter.stats)
+metrics.add_stats_collector('live_views', lambda: live_collections.stats() if live_collections else None)
+
+
+def model_label(model_obj):
+    return getattr(model_obj, 'model_name', None) or 'fallback'
+
+
+def is_live_model(model_obj):
+    """False for the plain-function fallback used when the model failed to initialize."""
+    return hasattr(model_obj, 'generate_content')
+
+
+def generate_text(model_obj, prompt, timeout=None):
+    """Calls a Gemini model, or the plain-function fallback used when the model failed to initialize."""
+    with metrics.span('gemini', 'generate_content', model_label(model_obj)):
+        if is_live_model(model_obj):
+            if timeout:
+                return model_obj.generate_content(prompt, request_options={"timeout": timeout}).text
+            return model_obj.generate_content(prompt).text
+        return model_obj(prompt).text
+
+
+def generate_text_chunks(model_obj, prompt):
+    """Yields reply text as Gemini streams it; the fallback function yields its whole reply at once."""
+    with metrics.span('gemini', 'generate_content_stream', model_label(model_obj)):
+        if is_live_model(model_obj):
+            for chunk in model_obj.generate_content(prompt, stream=True):
+                if chunk.text:
+                    yield chunk.text
+        else:
+            yield model_obj(prompt).text
+
+
+# REQUEST INSTRUMENTATION SETUP
+# Requests slower than SLOW_REQUEST_LOG_SECONDS are printed with their storage/Gemini/render breakdown (0 disables).
+SLOW_REQUEST_LOG_SECONDS = float(os.environ.get("SLOW_REQUEST_LOG_SECONDS", "0"))
+
+@app.before_request
+def start_request_timer():
+    g.request_received_at = time.time()
+    g.request_breakdown, g.request_breakdown_token = metrics.start_request(request.method, request.path)
+
+@app.after_request
+def record_request_timing(response):
+    breakdown = g.get('request_breakdown')
+    if breakdown is None:
+        return response
+    # Label by URL rule, not the raw path, so ids don't explode the series count.
+    route = request.url_rule.rule if request.url_rule else 'unmatched'
+    method = request.method
+    status = response.status_code
+
+    def finish():
+        # Runs once the body has been sent, so streamed responses are timed in full.
+        elapsed = time.perf_counter() - breakdown.started
+        metrics.request_duration.observe(elapsed, method=method, route=route, status=status)
+        if SLOW_REQUEST_LOG_SECONDS and elapsed >= SLOW_REQUEST_LOG_SECONDS:
+            print(f"SLOW REQUEST {method} {breakdown.path} {status} {elapsed * 1000:.1f}ms: {breakdown.describe(elapsed)}")
+
+    response.call_on_close(finish)
+    return response
+
+@app.teardown_request
+def end_request_timer(exc):
+    token = g.pop('request_breakdown_token', None)
+    if token is not None:
+        metrics.end_request(token)
+
+def shed_response(status, message, retry_after):
+    """Fast rejection in the shape the route's callers expect (chatbot: "reply", others: "success"/"message")."""
+    if RATE_LIMITED_ENDPOINTS.get(request.endpoint) == 'chat':
+        response = jsonify({"reply": message})
+    else:
+        response = jsonify({"success": False, "message": message})
+    response.status_code = status
+    response.headers['Retry-After'] = str(max(1, math.ceil(retry_after)))
+    return response
+
+@app.before_request
+def limit_request():
+    """Sheds requests over the concurrency cap (503) and over the client's rate limit (429) before any work is done."""
+    if request.endpoint not in UNCAPPED_ENDPOINTS:
+        if not request_limiter.try_acquire():
+            return shed_response(503, "The server is busy right now. Please try again in a moment.", 1)
+        g.request_slot = True
+
+    group = RATE_LIMITED_ENDPOINTS.get(request.endpoint)
+    if group is not None:
+        client = request.remote_addr or 'unknown'
+        if group in ADMIN_RATE_LIMIT_GROUPS and session.get('logged_in'):
+            group, client = ADMIN_RATE_LIMIT_GROUPS[group], session.get('rate_limit_id', client)
+        allowed, retry_after = rate_limiter.check(group, client)
+        if not allowed:
+            return shed_response(429, "Too many requests. Please wait a moment and try again.", retry_after)
+
+@app.teardown_request
+def release_request_slot(exc):
+    if g.pop('request_slot', False):
+        request_limiter.release()
+
+# REQUEST LOG SETUP (optional, REQUEST_LOG_PATH=/path/to/traffic.jsonl)
+# Appends one JSON line per request for benchmarks/replay.py: arrival time, method, path, query, form
+# fields and whether the session was an admin's. Passwords and uploaded files are never written; login,
+# logout, probes and SSE streams are left out (the replay tool logs its admin clients in itself).
+REQUEST_LOG_PATH = os.environ.get("REQUEST_LOG_PATH")
+UNRECORDED_ENDPOINTS = ('admin_login', 'admin_logout', 'live_updates', 'prometheus_metrics', 'readiness', 'static')
+request_log = None
+request_log_lock = threading.Lock()
+
+def record_request(response):
+    """Writes the request to the request log (opened on first use, so each worker opens its own handle)."""
+    global request_log
+    if request.endpoint in UNRECORDED_ENDPOINTS:
+        return response
+    line = json.dumps({
+        'timestamp': round(g.get('request_received_at', time.time()), 3),
+        'method': request.method,
+        'path': request.path,
+        'query': request.args.to_dict(),
+        'form': {key: value for key, value in request.form.items() if 'password' not in key.lower()},
+        'admin': bool(session.get('logged_in')),
+    }) + '\n'
+    with request_log_lock:
+        try:
+            if request_log is None:
+                request_log = open(REQUEST_LOG_PATH, 'a', encoding='utf-8')
+            request_log.write(line)
+            request_log.flush()
+        except OSError as e:
+            print(f"Request log write error: {e}")
+    return response
+
+if REQUEST_LOG_PATH:
+    app.after_request(record_request)
+
+def _start_template_timer(sender, template, context, **extra):
+    g.template_started = time.perf_counter()
+
+def _stop_template_timer(sender, template, context, **extra):
+    started = g.pop('template_started', None)
+    if started is not None:
+        metrics.record_span('render', 'template', template.name, time.perf_counter() - started)
+
+before_render_template.connect(_start_template_timer, app)
+template_rendered.connect(_stop_template_timer, app)
+
+@app.after_request
+def compress_response(response):
+    return response_compressor(request, response)
+
+_template_stamps = {}
+
+def template_stamp(template_name):
+    stamp = _template_stamps.get(template_name)
+    if stamp is None:
+        stamp = _template_stamps[template_name] = http_cache.file_stamp(app.jinja_env.get_template(template_name).filename)
+    return stamp
+
+def static_page_etag(template_name):
+    return f"{template_name}-{template_stamp(template_name)}"
+
+def render_static_page(template_name):
+    """Serves a page with no per-request content from its pre-rendered bytes (a 304 for unchanged reloads)."""
+    etag = static_page_etag(template_name)
+    cached = http_cache.not_modified(request, etag, None)
+    if cached is not None:
+        return cached
+    body = page_cache.get_or_render(etag, lambda: render_template(template_name))
+    return http_cache.add_validators(Response(body, mimetype="text/html"), etag, None)
+
+def prerender_static_pages():
+    """Renders the static pages into the page cache (part of warm_up)."""
+    try:
+        with app.app_context():
+            for template_name in STATIC_PAGES:
+                page_cache.get_or_render(static_page_etag(template_name), lambda: render_template(template_name))
+    except Exception as e:
+        print(f"Static page pre-render error: {e}")
+
+def render_cards(card_template, listing, is_admin):
+    """HTML for each listing record; only records missing from the fragment cache are rendered."""
+    template = app.jinja_env.get_template(card_template)
+    variant = (card_template, template_stamp(card_template), is_admin)
+    return fragment_cache.render(variant, listing.keys, listing.records,
+                                 lambda record: template.render(record=record, is_admin=is_admin))
+
+def render_listing(template_name, card_template, listing, is_admin, **context):
+    """
+    Renders a listing page with validators taken from the cached listing.
+    A matching If-None-Match / If-Modified-Since is answered with a 304
+    before the template is rendered, and a page already rendered for this
+    listing version and variant is served from the page cache.
+    """
+    live_updates = live_collections is not None
+    etag = http_cache.listing_etag(listing.version, 'admin' if is_admin else 'public', 'live' if live_updates else 'static',
+                                   template_stamp(template_name), template_stamp(card_template))
+    last_modified = listing.version.last_modified
+
+    cached = http_cache.not_modified(request, etag, last_modified)
+    if cached is not None:
+        return cached
+    body = page_cache.get_or_render(etag, lambda: render_template(
+        template_name, is_admin=is_admin, live_updates=live_updates,
+        cards=render_cards(card_template, listing, is_admin), **context))
+    return http_cache.add_validators(Response(body, mimetype="text/html"), etag, last_modified)
+
+def live_view(collection_path):
+    """The in-memory view of a watched collection, or None when reads must go to storage."""
+    return live_collections.view(collection_path) if live_collections else None
+
+def retrieval_entry(record_type, data):
+    """Converts a circular/result/event document into a chatbot retrieval index entry."""
+    title = data.get('title') or 'No Title'
+    details = data.get('details') or ''
+    timestamp = data.get('timestamp')
+    stamp = timestamp.strftime('%Y-%m-%d %H:%M') if timestamp and hasattr(timestamp, 'strftime') else 'N/A'
+    if record_type == 'events':
+        when = f"{data.get('date', 'N/A')} at {data.get('time', 'N/A')}"
+        return Entry('Event', title, f"{details}\nDate: {when}.", f"{title}: {when}. {details}".strip(), stamp)
+    label = 'Circular' if record_type == 'circulars' else 'Result'
+    return Entry(label, title, details, f"{title}: {details}".strip(), stamp)
+
+def retrieval_entries(app_id):
+    """Loader for the retrieval index: every circular, result and event, keyed '<collection>/<doc id>'."""
+    data_path = f"artifacts/{app_id}/public/data"
+    for record_type in RETRIEVAL_COLLECTIONS:
+        collection_path = f"{data_path}/{record_type}"
+        view = live_view(collection_path)
+        docs = view.documents() if view is not None else db.stream(collection_path)
+        for doc in docs:
+            yield f"{record_type}/{doc.id}", retrieval_entry(record_type, doc.data)
+
+def collection_changed(app_id, collection_path, doc_ids=None):
+    """
+    Called after every admin write: drops the cached listing and brings this worker's in-memory
+    copies up to date. The written documents are read back once and pushed into the live views
+    (when the backend has no change listeners, i.e. SQLite) and the chatbot retrieval index.
+    Without doc_ids (bulk writes) both are rebuilt from the collection.
+    """
+    record_cache.invalidate(app_id, collection_path)
+    record_type = collection_path.rsplit('/', 1)[-1]
+    local_feed = None
+    if live_collections is not None and isinstance(live_collections.feed, LocalChangeFeed) \
+            and live_collections.feed.watching(collection_path):
+        local_feed = live_collections.feed
+    indexed = record_type in RETRIEVAL_COLLECTIONS and campus_retriever.is_built(app_id)
+    if local_feed is None and not indexed:
+        return
+    try:
+        if doc_ids is None:
+            if local_feed is not None:
+                local_feed.refresh(collection_path)
+            if indexed:
+                campus_retriever.invalidate(app_id)
+            return
+        changes = []
+        for doc_id in doc_ids:
+            data = db.get(collection_path, doc_id)
+            changes.append(Change(REMOVED, doc_id, None) if data is None else Change(MODIFIED, doc_id, data))
+        if local_feed is not None:
+            local_feed.publish(collection_path, changes)
+        if indexed:
+            for change in changes:
+                key = f"{record_type}/{change.doc_id}"
+                if change.data is None:
+                    campus_retriever.remove(app_id, key)
+                else:
+                    campus_retriever.upsert(app_id, key, retrieval_entry(record_type, change.data))
+    except Exception as e:
+        print(f"In-memory refresh error ({collection_path}): {e}")
+
+def ground_question(user_msg):
+    """
+    Returns (faq_answer, prompt, cache_key) for a chatbot question. faq_answer is set when a
+    record answers the question outright; otherwise prompt carries the retrieved records and
+    cache_key includes which record versions were used, so edits don't serve stale replies.
+    """
+    if not CHAT_RETRIEVAL or not db:
+        return None, user_msg, user_msg
+    app_id = request.environ.get('__app_id', DEFAULT_APP_ID)
+    try:
+        with metrics.span('retrieval', 'search', 'campus'):
+            faq_answer, hits = campus_retriever.ground(app_id, user_msg, retrieval_entries)
+    except Exception as e:
+        print(f"Retrieval Error: {e}")
+        return None, user_msg, user_msg
+    if faq_answer is not None:
+        return faq_answer, None, None
+    fingerprint = context_fingerprint(hits)
+    return None, build_prompt(user_msg, hits), f"{fingerprint} {user_msg}" if fingerprint else user_msg
+
 
 # =======================================================================
 # 2. APPLICATION ROUTES
@@ -76,7 +691,7 @@ ADMIN_PASSWORD = "secure_password" # Set your secure password here
 @app.route("/")
 def index():
     """Renders the main dashboard page."""
-    return render_template("index.html")
+    return render_static_page("index.html")
 
 # --- Chatbot Route (FIXED to use global model without internal configure calls) ---
 @app.route("/get", methods=["GET"])
@@ -88,9 +703,16 @@ def chatbot_reply():
         return jsonify({"reply": "Error: Missing user message."}), 400
 
     try:
-        # Use the global model instance 'model'
-        response = model.generate_content(user_msg)
-        bot_reply = response.text
+        faq_answer, prompt, cache_key = ground_question(user_msg)
+        if faq_answer is not None:
+            return jsonify({"reply": faq_answer})
+        model_obj = model_registry.get(GEMINI_MODEL_NAME)
+        if not is_live_model(model_obj):
+            # The offline fallback echoes its input: give it the question, not the grounded prompt, and don't cache it.
+            return jsonify({"reply": generate_text(model_obj, user_msg)})
+        # Use the global model instance 'model', through the shared reply cache
+        bot_reply = chat_cache.get_or_generate(
+            cache_key, lambda _: generate_text(model_obj, prompt, timeout=CHAT_TIMEOUT), timeout=CHAT_TIMEOUT)
         return jsonify({"reply": bot_reply})
 
     except Exception as e:
@@ -99,6 +721,53 @@ def chatbot_reply():
         return jsonify({"reply": "Sorry, an error occurred while connecting to the AI. Please try again."}), 500
 
 
+@app.route("/get/stream", methods=["GET"])
+def chatbot_stream():
+    """Streams the chatbot reply to the browser as server-sent events while Gemini generates it."""
+    user_msg = request.args.get("msg")
+
+    if not user_msg:
+        return jsonify({"reply": "Error: Missing user message."}), 400
+
+    sse_headers = {"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+
+    faq_answer, prompt, cache_key = ground_question(user_msg)
+    cached_reply = faq_answer if faq_answer is not None else chat_cache.peek(cache_key)
+    if cached_reply is not None:
+        body = sse_event({"token": cached_reply}) + sse_event({}, event="done")
+        return Response(body, mimetype="text/event-stream", headers=sse_headers)
+
+    model_obj = model_registry.get(GEMINI_MODEL_NAME)
+    live_model = is_live_model(model_obj)
+    if not live_model:
+        # The offline fallback echoes its input: give it the question, not the grounded prompt, and don't cache it.
+        prompt = user_msg
+    try:
+        chunks = chat_stream_pool.stream(lambda: generate_text_chunks(model_obj, prompt))
+    except ChatPoolFull:
+        return jsonify({"reply": "The assistant is busy right now. Please try again in a moment."}), 503
+
+    def events_stream():
+        started = time.perf_counter()
+        parts = []
+        try:
+            for chunk in chunks:
+                parts.append(chunk)
+                yield sse_event({"token": chunk})
+        except Exception as e:
+            print(f"Gemini API Error (Stream): {e}")
+            yield sse_event({"message": "Sorry, an error occurred while connecting to the AI. Please try again."}, event="error")
+            return
+        if live_model:
+            chat_cache.put(cache_key, "".join(parts), time.perf_counter() - started)
+        yield sse_event({}, event="done")
+
+    response = Response(stream_with_context(events_stream()), mimetype="text/event-stream", headers=sse_headers)
+    # Frees the generation slot even if the client leaves before the body is ever read.
+    response.call_on_close(chunks.close)
+    return response
+
+
 # --- Admin & Auth Routes ---
 
 @app.route("/admin/login", methods=["GET", "POST"])
@@ -111,6 +780,8 @@ def admin_login():
         if username == ADMIN_USERNAME and password == ADMIN_PASSWORD:
             session['logged_in'] = True
             session['username'] = username
+            # Keys this login's rate-limit buckets, so admins sharing an IP (or an account) don't share them.
+            session['rate_limit_id'] = uuid.uuid4().hex
             # Redirect admin to the attendance view
             return redirect(url_for('events')) 
         else:
@@ -123,6 +794,7 @@ def admin_logout():
     """Logs the admin out by clearing the session."""
     session.pop('logged_in', None)
     session.pop('username', None)
+    session.pop('rate_limit_id', None)
     return redirect(url_for('index'))
 
 
@@ -131,7 +803,7 @@ def admin_logout():
 @app.route("/events/create", methods=["POST"])
 def create_event():
     """Endpoint to handle event creation and save data to Firestore."""
-    if not session.get('logged_in') or db is None:
+    if not session.get('logged_in') or not db:
         return jsonify({"success": False, "message": "Unauthorized or database unavailable."}), 401
     
     event_data = {
@@ -139,14 +811,15 @@ def create_event():
         'date': request.form.get('date'),
         'time': request.form.get('time'),
         'details': request.form.get('details'),
-        'timestamp': firestore.SERVER_TIMESTAMP 
+        'timestamp': storage.SERVER_TIMESTAMP 
     }
 
     try:
         app_id = request.environ.get('__app_id', DEFAULT_APP_ID)
         collection_path = f"artifacts/{app_id}/public/data/events"
         
-        db.collection(collection_path).add(event_data)
+        event_id = db.add(collection_path, event_data)
+        collection_changed(app_id, collection_path, [event_id])
         print(f"Event successfully saved to: {collection_path}")
         return jsonify({"success": True, "message": "Event created successfully!"})
     except Exception as e:
@@ -156,15 +829,15 @@ def create_event():
 @app.route("/events/delete/<event_id>", methods=["POST"])
 def delete_event(event_id):
     """Endpoint to handle event deletion by Admin."""
-    if not session.get('logged_in') or db is None:
+    if not session.get('logged_in') or not db:
         return jsonify({"success": False, "message": "Unauthorized or database unavailable."}), 401
 
     try:
         app_id = request.environ.get('__app_id', DEFAULT_APP_ID)
         collection_path = f"artifacts/{app_id}/public/data/events"
         
-        doc_ref = db.collection(collection_path).document(event_id)
-        doc_ref.delete()
+        db.delete(collection_path, event_id)
+        collection_changed(app_id, collection_path, [event_id])
         
         print(f"Event {event_id} successfully deleted from {collection_path}")
         return jsonify({"success": True, "message": "Event deleted successfully!"})
@@ -175,23 +848,27 @@ def delete_event(event_id):
 @app.route("/events/register/<event_id>", methods=["POST"])
 def register_for_event(event_id):
     """Handles student registration for a specific event."""
-    if db is None:
+    if not db:
         return jsonify({"success": False, "message": "Database unavailable."}), 500
 
     # Using a temp UUID for unauthenticated user
     temp_user_id = str(uuid.uuid4()) 
+
+    if registration_buffer is not None:
+        return buffer_registration(event_id, temp_user_id)
     
     registration_data = {
         'event_id': event_id,
         'user_id': temp_user_id,
-        'registration_date': firestore.SERVER_TIMESTAMP
+        'registration_date': storage.SERVER_TIMESTAMP
     }
 
     try:
         app_id = request.environ.get('__app_id', DEFAULT_APP_ID)
         collection_path = f"artifacts/{app_id}/public/data/registrations" 
+        stats_path = f"artifacts/{app_id}/public/data/registration_stats"
         
-        db.collection(collection_path).add(registration_data)
+        registration_counter.add_registration(db, collection_path, stats_path, registration_data)
         
         print(f"Registration successful for user {temp_user_id} on event {event_id}")
         return jsonify({
@@ -205,6 +882,68 @@ def register_for_event(event_id):
         return jsonify({"success": False, "message": "Failed to save registration record."}), 500
 
 
+def buffer_registration(event_id, temp_user_id):
+    """Write-behind path: acknowledge once the registration is in the spill file; the flusher commits it."""
+    record = {
+        'id': uuid.uuid4().hex,
+        'app_id': request.environ.get('__app_id', DEFAULT_APP_ID),
+        'event_id': event_id,
+        'user_id': temp_user_id,
+        'accepted_at': datetime.now(timezone.utc).isoformat()
+    }
+
+    try:
+        registration_buffer.submit(record)
+    except BufferFull:
+        return jsonify({"success": False, "message": "Registrations are backed up. Please try again shortly."}), 503
+    except Exception as e:
+        print(f"Write-behind Error during registration: {e}")
+        return jsonify({"success": False, "message": "Failed to save registration record."}), 500
+
+    return jsonify({
+        "success": True,
+        "message": "Registration successful!",
+        "user_id": temp_user_id,
+        "registration_id": record['id']
+    })
+
+
+# --- Admin AI Job Helpers ---
+def submit_ai_job(kind, call, error_message):
+    """
+    Queues an admin AI call. With `async=1` the job id is returned immediately (202)
+    for polling via /ai/jobs/<job_id>; otherwise the request waits for the result.
+    """
+    try:
+        job_id = ai_jobs.submit(kind, call)
+    except JobQueueFull:
+        return jsonify({"success": False, "message": "Too many AI requests in progress. Please try again shortly."}), 503
+
+    if request.values.get('async') == '1':
+        return jsonify({"success": True, "job_id": job_id, "status": "queued",
+                        "status_url": url_for('ai_job_status', job_id=job_id)}), 202
+
+    job = ai_jobs.wait(job_id, timeout=AI_SYNC_WAIT)
+    if job['status'] == 'done':
+        return jsonify(dict(job['result'], success=True))
+    if job['status'] == 'failed':
+        print(f"Gemini API Error ({kind}): {job['error']}")
+        return jsonify({"success": False, "message": error_message}), 500
+    # Still running: hand the id back so the client can keep polling.
+    return jsonify({"success": True, "job_id": job_id, "status": job['status'],
+                    "status_url": url_for('ai_job_status', job_id=job_id)}), 202
+
+@app.route("/ai/jobs/<job_id>", methods=["GET"])
+def ai_job_status(job_id):
+    """Reports the status (and result, once finished) of a queued admin AI job."""
+    if not session.get('logged_in'):
+        return jsonify({"success": False, "message": "Unauthorized access."}), 401
+
+    job = ai_jobs.status(job_id)
+    if job is None:
+        return jsonify({"success": False, "message": "Unknown job id."}), 404
+    return jsonify(dict(job, success=job['status'] != 'failed'))
+
 @app.route("/events/generate_summary", methods=["POST"])
 def generate_summary():
     """Generates a short, engaging summary for the event using Gemini."""
@@ -217,29 +956,45 @@ def generate_summary():
     prompt = (f"Write a short, engaging, 1-2 sentence social media caption for a student event titled '{event_title}'. "
             f"The event details are: {event_details}. The tone should be exciting and informal.")
     
-    try:
+    def run_summary():
         # Use a model without grounding, as summaries are creative.
-        summary_model = genai.GenerativeModel('gemini-2.5-flash')
-        response = summary_model.generate_content(prompt)
-        return jsonify({"success": True, "summary": response.text})
+        summary_model = model_registry.get(GEMINI_MODEL_NAME)
+        return {"summary": generate_text(summary_model, prompt, timeout=AI_CALL_TIMEOUT)}
+
+    return submit_ai_job('summary', run_summary, "Failed to generate summary.")
+
+def get_registration_stats(app_id, event_id):
+    """
+    Registration totals for one event from its sharded counters. Registrations made before the
+    counters existed are counted once with a server-side count aggregation (no hourly breakdown).
+    """
+    reg_collection_path = f"artifacts/{app_id}/public/data/registrations"
+    stats_path = f"artifacts/{app_id}/public/data/registration_stats"
+    return registration_counter.read_stats(db, reg_collection_path, stats_path, event_id)
+
+@app.route("/events/stats/<event_id>", methods=["GET"])
+def event_stats(event_id):
+    """Returns registration totals and registrations per hour for an event."""
+    if not session.get('logged_in') or not db:
+        return jsonify({"success": False, "message": "Unauthorized or database unavailable."}), 401
+
+    try:
+        app_id = request.environ.get('__app_id', DEFAULT_APP_ID)
+        stats = get_registration_stats(app_id, event_id)
+        return jsonify(dict(stats, success=True, event_id=event_id))
     except Exception as e:
-        print(f"Gemini API Error (Summary): {e}")
-        return jsonify({"success": False, "message": "Failed to generate summary."}), 500
+        print(f"Firestore READ Error (Event Stats): {e}")
+        return jsonify({"success": False, "message": "Failed to fetch event stats."}), 500
 
 @app.route("/events/analyze_registrations/<event_id>", methods=["GET"])
 def analyze_registrations(event_id):
     """Analyzes registration data for an event and generates a short report using Gemini."""
-    if not session.get('logged_in') or db is None:
+    if not session.get('logged_in') or not db:
         return jsonify({"success": False, "message": "Unauthorized or database unavailable."}), 401
 
     try:
         app_id = request.environ.get('__app_id', DEFAULT_APP_ID)
-        reg_collection_path = f"artifacts/{app_id}/public/data/registrations"
-        
-        registrations_ref = db.collection(reg_collection_path).where(filter=FieldFilter('event_id', '==', event_id)).stream()
-        registrations = [doc.to_dict() for doc in registrations_ref]
-        
-        total_registrations = len(registrations)
+        total_registrations = get_registration_stats(app_id, event_id)['total']
         if total_registrations == 0:
             return jsonify({"success": True, "report": "No registrations recorded yet."})
 
@@ -249,45 +1004,80 @@ def analyze_registrations(event_id):
                 f"Provide a brief, single-paragraph summary of the current engagement status and future expected turnout. "
                 f"The current total is {total_registrations}.")
         
-        # Use a model for analysis
-        analysis_model = genai.GenerativeModel('gemini-2.5-flash')
-        response = analysis_model.generate_content(prompt)
-        return jsonify({"success": True, "report": response.text})
-        
     except Exception as e:
         print(f"Error analyzing registrations: {e}")
         return jsonify({"success": False, "message": "Failed to generate analysis report."}), 500
 
+    def run_analysis():
+        # Use a model for analysis
+        analysis_model = model_registry.get(GEMINI_MODEL_NAME)
+        return {"report": generate_text(analysis_model, prompt, timeout=AI_CALL_TIMEOUT)}
+
+    return submit_ai_job('registration_analysis', run_analysis, "Failed to generate analysis report.")
+
+
+def build_event_listing(collection_path, docs):
+    """Events page listing from documents ordered newest first."""
+    docs = list(docs)
+    keys = [(doc.id, doc.data.get('timestamp')) for doc in docs]
+    return http_cache.Listing([dict(doc.data, id=doc.id) for doc in docs], http_cache.listing_version(collection_path, keys), keys)
+
 
 @app.route("/events")
 def events():
     """Renders the Events page, fetching data from Firestore and checking admin status."""
-    if db is None:
-        return render_template("events.html", events=[], is_admin=session.get('logged_in', False), db_error=True)
+    if not db:
+        return render_template("events.html", events=[], cards=[], is_admin=session.get('logged_in', False), db_error=True)
 
     app_id = request.environ.get('__app_id', DEFAULT_APP_ID)
     collection_path = f"artifacts/{app_id}/public/data/events"
 
+    def load_events():
+        return build_event_listing(collection_path, db.stream(collection_path, order_by='timestamp', descending=True))
+
+    is_admin = session.get('logged_in', False)
+
     try:
-        events_ref = db.collection(collection_path).order_by('timestamp', direction=firestore.Query.DESCENDING).stream()
-        event_list = [dict(doc.to_dict(), id=doc.id) for doc in events_ref] 
+        view = live_view(collection_path)
+        if view is not None:
+            listing = view.build(build_event_listing)
+        else:
+            listing = record_cache.get_or_load(app_id, collection_path, load_events)
     except Exception as e:
         print(f"Firestore READ Error: {e}")
-        event_list = []
-    
-    is_admin = session.get('logged_in', False)
+        return render_template("events.html", events=[], cards=[], is_admin=is_admin)
     
-    return render_template("events.html", events=event_list, is_admin=is_admin)
+    return render_listing("events.html", "event_card.html", listing, is_admin, events=listing.records)
 
 
 # --- Timetable Route ---
 @app.route("/timetable")
 def timetable():
     """Renders the Class Timetable page."""
-    return render_template("timetable.html")
+    return render_static_page("timetable.html")
 
 
 # --- Utility function to handle common read/write logic for Circulars and Results ---
+def format_public_record(doc_id, data):
+    """Converts a raw circular/result document into the dict the templates expect."""
+    timestamp = data.get('timestamp')
+    last_updated = 'N/A'
+    if timestamp and hasattr(timestamp, 'strftime'):
+        last_updated = timestamp.strftime('%Y-%m-%d %H:%M')
+
+    return {
+        'doc_id': doc_id,
+        'title': data.get('title', 'No Title'),
+        'details': data.get('details', 'No Details'),
+        'last_updated': last_updated
+    }
+
+def build_public_record_listing(collection_path, docs):
+    """Circulars/results listing from documents ordered newest first."""
+    docs = list(docs)
+    keys = [(doc.id, doc.data.get('timestamp')) for doc in docs]
+    return http_cache.Listing([format_public_record(doc.id, doc.data) for doc in docs], http_cache.listing_version(collection_path, keys), keys)
+
 def handle_public_record(record_type, is_write=False):
     """
     Handles common Firestore logic for read (circulars, results) and write (admin upload).
@@ -297,7 +1087,7 @@ def handle_public_record(record_type, is_write=False):
     app_id = request.environ.get('__app_id', DEFAULT_APP_ID)
     collection_path = f"artifacts/{app_id}/public/data/{record_type}"
     
-    if db is None:
+    if not db:
         return {'success': False, 'message': 'Database unavailable.'}
 
     if is_write:
@@ -316,9 +1106,10 @@ def handle_public_record(record_type, is_write=False):
             record_data = {
                 'title': title,
                 'details': details,
-                'timestamp': firestore.SERVER_TIMESTAMP 
+                'timestamp': storage.SERVER_TIMESTAMP 
             }
-            db.collection(collection_path).document(doc_id).set(record_data, merge=True)
+            db.set(collection_path, doc_id, record_data, merge=True)
+            collection_changed(app_id, collection_path, [doc_id])
             return {'success': True, 'message': f"{record_type.capitalize()} record saved successfully!"}
         except Exception as e:
             print(f"Firestore WRITE Error ({record_type}): {e}")
@@ -326,24 +1117,18 @@ def handle_public_record(record_type, is_write=False):
     
     else:
         # READ LOGIC (Global Access)
+        def load_records():
+            return build_public_record_listing(
+                collection_path, db.stream(collection_path, order_by='timestamp', descending=True))
+
         try:
-            records_ref = db.collection(collection_path).order_by('timestamp', direction=firestore.Query.DESCENDING).stream()
-            record_list = []
-            for doc in records_ref:
-                data = doc.to_dict()
-                timestamp = data.get('timestamp')
-                last_updated = 'N/A'
-                if timestamp and hasattr(timestamp, 'strftime'):
-                    last_updated = timestamp.strftime('%Y-%m-%d %H:%M')
-                
-                record_list.append({
-                    'doc_id': doc.id,
-                    'title': data.get('title', 'No Title'),
-                    'details': data.get('details', 'No Details'),
-                    'last_updated': last_updated
-                })
+            view = live_view(collection_path)
+            if view is not None:
+                listing = view.build(build_public_record_listing)
+            else:
+                listing = record_cache.get_or_load(app_id, collection_path, load_records)
             
-            return {'success': True, 'records': record_list, 'is_admin': is_admin}
+            return {'success': True, 'listing': listing, 'is_admin': is_admin}
         
         except Exception as e:
             print(f"Firestore READ Error ({record_type}): {e}")
@@ -358,9 +1143,10 @@ def circulars():
     context = handle_public_record('circulars', is_write=False)
     if not context['success']:
         # Return empty list and is_admin if read failed
-        return render_template("circulars.html", records=[], is_admin=session.get('logged_in', False), error_message=context['message'])
+        return render_template("circulars.html", records=[], cards=[], is_admin=session.get('logged_in', False), error_message=context['message'])
         
-    return render_template("circulars.html", records=context['records'], is_admin=context['is_admin'])
+    listing = context['listing']
+    return render_listing("circulars.html", "circular_card.html", listing, context['is_admin'], records=listing.records)
 
 @app.route("/circulars/update", methods=["POST"])
 def update_circulars():
@@ -376,9 +1162,10 @@ def results():
     """Renders the Results page and fetches all results."""
     context = handle_public_record('results', is_write=False)
     if not context['success']:
-        return render_template("results.html", records=[], is_admin=session.get('logged_in', False), error_message=context['message'])
+        return render_template("results.html", records=[], cards=[], is_admin=session.get('logged_in', False), error_message=context['message'])
         
-    return render_template("results.html", records=context['records'], is_admin=context['is_admin'])
+    listing = context['listing']
+    return render_listing("results.html", "result_card.html", listing, context['is_admin'], records=listing.records)
 
 @app.route("/results/update", methods=["POST"])
 def update_results():
@@ -387,14 +1174,127 @@ def update_results():
     return jsonify(result)
 
 
-# --- Attendance Routes (Unchanged) ---
+# --- Live Update Route ---
+@app.route("/live/<collection>")
+def live_updates(collection):
+    """
+    Server-sent events for one collection: a "change" event per created, updated or deleted
+    document (record formatted like the page renders it), or "reset" when the page should reload.
+    """
+    if live_collections is None:
+        return jsonify({"success": False, "message": "Live updates are not enabled."}), 404
+    if collection not in LIVE_PUBLIC_TOPICS and not (collection == 'attendance' and session.get('logged_in')):
+        return jsonify({"success": False, "message": "Unknown or restricted collection."}), 404
+
+    last_event_id = request.headers.get('Last-Event-ID')
+    try:
+        stream = live_collections.broadcaster.subscribe({collection}, last_event_id=last_event_id)
+    except SubscribersFull:
+        return jsonify({"success": False, "message": "Too many live connections. Please refresh later."}), 503
+
+    return Response(stream, mimetype="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+
+# --- Metrics Route ---
+@app.route("/metrics")
+def prometheus_metrics():
+    """Prometheus scrape endpoint: request/backend latency histograms plus cache and pool stats (this worker only)."""
+    return Response(metrics.render_prometheus(), mimetype="text/plain; version=0.0.4")
+
+
+# --- Readiness Route ---
+@app.route("/ready")
+def readiness():
+    """
+    Readiness probe: 200 once this worker's storage backend and Gemini model exist, else 503 while
+    they are set up, or when setup failed and the AI routes are answering with the offline fallback.
+    """
+    storage_status = storage_client.status()
+    model_loaded = model_registry.is_loaded(GEMINI_MODEL_NAME)
+    model_available = model_loaded and is_live_model(model_registry.get(GEMINI_MODEL_NAME))
+    ready = storage_status['available'] and model_available
+    if not ready:
+        start_warm_up()
+    return jsonify({"ready": ready, "storage": storage_status,
+                    "gemini": dict(gemini_sdk.status(), model_loaded=model_loaded, model_available=model_available)}), \
+        200 if ready else 503
+
+
+# --- Cache Stats Route ---
+@app.route("/cache/stats")
+def cache_stats():
+    """Exposes hit/miss counters for the listing cache and the chatbot reply cache."""
+    return jsonify({"records": record_cache.stats(), "pages": page_cache.stats(), "fragments": fragment_cache.stats(),
+                    "chatbot": chat_cache.stats(), "retrieval": campus_retriever.stats(),
+                    "chat_stream": chat_stream_pool.stats(), "ai_jobs": ai_jobs.stats(),
+                    "registration_buffer": registration_buffer.stats() if registration_buffer else None,
+                    "live_views": live_collections.stats() if live_collections else None,
+                    "attendance_index": attendance_indexes.stats(),
+                    "rate_limit": rate_limiter.stats(), "load_shedding": request_limiter.stats()})
+
+
+# --- Attendance Routes ---
+ATTENDANCE_PAGE_SIZE = 50
+ATTENDANCE_MAX_PAGE_SIZE = 500
+
+def format_attendance_record(student_id, data):
+    """Converts a raw attendance document into the dict the templates expect."""
+    timestamp = data.get('timestamp')
+    last_updated = 'N/A'
+
+    if timestamp and hasattr(timestamp, 'strftime'):
+        last_updated = timestamp.strftime('%Y-%m-%d %H:%M')
+    elif timestamp and hasattr(timestamp, 'date'):
+        last_updated = timestamp.date().strftime('%Y-%m-%d')
+
+    return {
+        'student_id': student_id,
+        'percentage': data.get('percentage', 0),
+        'status': data.get('status', 'Unknown'),
+        'last_updated': last_updated
+    }
+
+def fetch_student_attendance(collection_path, student_id):
+    """Single-document read for one student. Returns None when no record exists."""
+    view = live_view(collection_path)
+    data = view.get(student_id) if view is not None else db.get(collection_path, student_id)
+    if data is None:
+        return None
+    return format_attendance_record(student_id, data)
+
+def fetch_attendance_page(collection_path, page_size, after=None):
+    """
+    Reads one page of the attendance table ordered by student_id (the document ID).
+    Returns (records, next_cursor); next_cursor is None on the last page.
+    """
+    # Ask for one extra document to learn whether another page exists.
+    view = live_view(collection_path)
+    if view is not None:
+        docs = view.stream(limit=page_size + 1, start_after=after or None)
+    else:
+        docs = list(db.stream(collection_path, order_by=storage.DOCUMENT_ID, limit=page_size + 1, start_after=after or None))
+    records = [format_attendance_record(doc.id, doc.data) for doc in docs[:page_size]]
+    next_cursor = records[-1]['student_id'] if len(docs) > page_size else None
+    return records, next_cursor
+
+def parse_page_size(raw_value):
+    """Clamps the requested page size to 1..ATTENDANCE_MAX_PAGE_SIZE."""
+    try:
+        page_size = int(raw_value)
+    except (TypeError, ValueError):
+        return ATTENDANCE_PAGE_SIZE
+    return max(1, min(page_size, ATTENDANCE_MAX_PAGE_SIZE))
+
 @app.route("/attendance")
 def attendance():
-    """Renders the Attendance page, fetching ALL student data for global view."""
+    """Renders the Attendance page: one cursor-based page of the global table plus the student card."""
     is_admin = session.get('logged_in', False)
     
     # 1. Initialize data structures
     all_students_data = [] 
+    next_cursor = None
+    page_size = parse_page_size(request.args.get('page_size'))
+    after = request.args.get('after')
     
     # Default data for the specific student card (used when not admin)
     student_id = request.args.get('user_id', 'generic_student') 
@@ -410,43 +1310,14 @@ def attendance():
         collection_path = f"artifacts/{app_id}/public/data/attendance"
         
         try:
-            # --- GLOBAL DATA FETCH (Needed by EVERYONE for the table) ---
-            students_ref = db.collection(collection_path).stream()
-            
-            for doc in students_ref:
-                data = doc.to_dict()
-                timestamp = data.get('timestamp')
-                last_updated = 'N/A'
-                
-                if timestamp and hasattr(timestamp, 'strftime'):
-                    last_updated = timestamp.strftime('%Y-%m-%d %H:%M')
-                elif timestamp and hasattr(timestamp, 'date'):
-                    last_updated = timestamp.date().strftime('%Y-%m-%d')
-                    
-                all_students_data.append({
-                    'student_id': doc.id,
-                    'percentage': data.get('percentage', 0),
-                    'status': data.get('status', 'Unknown'),
-                    'last_updated': last_updated
-                })
-            
-            # Sort students for consistent display (e.g., by ID)
-            all_students_data.sort(key=lambda x: x['student_id'])
-            
-            # --- SINGLE STUDENT DATA FETCH (Needed only by the student-specific card) ---
-            # Look up the specific student data from the list we just fetched (or fetch again if needed)
-            single_student_doc = db.collection(collection_path).document(student_id).get()
+            # --- GLOBAL DATA FETCH (one page, ordered by student_id) ---
+            all_students_data, next_cursor = fetch_attendance_page(collection_path, page_size, after)
             
-            if single_student_doc.exists:
-                data = single_student_doc.to_dict()
-                attendance_data['percentage'] = data.get('percentage', 0)
-                attendance_data['status'] = data.get('status', 'Unknown')
-                
-                timestamp = data.get('timestamp')
-                if timestamp and hasattr(timestamp, 'strftime'):
-                    attendance_data['last_updated'] = timestamp.strftime('%Y-%m-%d %H:%M')
-                elif timestamp and hasattr(timestamp, 'date'):
-                    attendance_data['last_updated'] = timestamp.date().strftime('%Y-%m-%d')
+            # --- SINGLE STUDENT DATA FETCH (only needed by the student card) ---
+            if not is_admin:
+                student_record = fetch_student_attendance(collection_path, student_id)
+                if student_record:
+                    attendance_data = student_record
                          
         except Exception as e:
             print(f"Firestore READ Error (Attendance): {e}")
@@ -456,12 +1327,97 @@ def attendance():
     return render_template("attendance.html", 
                         attendance=attendance_data, # For the single student card view
                         is_admin=is_admin,
-                        all_students=all_students_data) # For the global table view
+                        all_students=all_students_data, # For the global table view
+                        next_cursor=next_cursor,
+                        page_size=page_size,
+                        is_first_page=not after)
+
+@app.route("/attendance/student/<student_id>")
+def student_attendance(student_id):
+    """Per-student lookup: a single document read, independent of the roster size."""
+    if not db:
+        return jsonify({"success": False, "message": "Database unavailable."}), 500
+
+    try:
+        app_id = request.environ.get('__app_id', DEFAULT_APP_ID)
+        collection_path = f"artifacts/{app_id}/public/data/attendance"
+
+        student_record = fetch_student_attendance(collection_path, student_id)
+        if student_record is None:
+            return jsonify({"success": False, "message": f"No attendance record for {student_id}."}), 404
+        return jsonify({"success": True, "attendance": student_record})
+
+    except Exception as e:
+        print(f"Firestore READ Error (Student Attendance): {e}")
+        return jsonify({"success": False, "message": "Failed to fetch attendance record."}), 500
+
+def get_attendance_index(collection_path):
+    """The worker's attendance index, built from the live view when there is one, else one full collection read."""
+    def load_documents():
+        view = live_view(collection_path)
+        return view.documents() if view is not None else db.stream(collection_path)
+    return attendance_indexes.get(collection_path, load_documents)
+
+def parse_percentage(raw_value):
+    """Optional percentage bound from the query string; raises ValueError when it isn't a number."""
+    if raw_value is None or raw_value == '':
+        return None
+    return float(raw_value)
+
+@app.route("/attendance/query")
+def query_attendance():
+    """
+    Admin search over the attendance index: ?status=&min_percentage=&max_percentage=&sort=&order=&offset=&page_size=.
+    min_percentage is inclusive and max_percentage exclusive, so "below 75%" is max_percentage=75.
+    """
+    if not session.get('logged_in') or not db:
+        return jsonify({"success": False, "message": "Unauthorized or database unavailable."}), 401
+
+    try:
+        min_percentage = parse_percentage(request.args.get('min_percentage'))
+        max_percentage = parse_percentage(request.args.get('max_percentage'))
+        offset = int(request.args.get('offset', 0))
+    except ValueError:
+        return jsonify({"success": False, "message": "Percentages and offset must be numbers."}), 400
+
+    sort = request.args.get('sort', 'student_id')
+    if sort not in ('student_id', 'percentage'):
+        return jsonify({"success": False, "message": "sort must be student_id or percentage."}), 400
+    page_size = parse_page_size(request.args.get('page_size'))
+
+    app_id = request.environ.get('__app_id', DEFAULT_APP_ID)
+    collection_path = f"artifacts/{app_id}/public/data/attendance"
+    try:
+        index = get_attendance_index(collection_path)
+        records, total = index.query(
+            status=request.args.get('status') or None, min_percentage=min_percentage, max_percentage=max_percentage,
+            sort=sort, descending=request.args.get('order') == 'desc', offset=offset, limit=page_size)
+    except Exception as e:
+        print(f"Attendance Query Error: {e}")
+        return jsonify({"success": False, "message": "Failed to query attendance records."}), 500
+
+    return jsonify({"success": True, "records": records, "total": total, "offset": max(0, offset), "page_size": page_size})
+
+@app.route("/attendance/summary")
+def attendance_summary():
+    """Admin summary from the attendance index: mean percentage overall and per status, plus a histogram."""
+    if not session.get('logged_in') or not db:
+        return jsonify({"success": False, "message": "Unauthorized or database unavailable."}), 401
+
+    app_id = request.environ.get('__app_id', DEFAULT_APP_ID)
+    collection_path = f"artifacts/{app_id}/public/data/attendance"
+    try:
+        summary = get_attendance_index(collection_path).summary()
+    except Exception as e:
+        print(f"Attendance Summary Error: {e}")
+        return jsonify({"success": False, "message": "Failed to summarize attendance records."}), 500
+
+    return jsonify(dict(summary, success=True))
 
 @app.route("/attendance/update", methods=["POST"])
 def update_attendance():
     """Admin endpoint to update a student's attendance record in Firestore."""
-    if not session.get('logged_in') or db is None:
+    if not session.get('logged_in') or not db:
         return jsonify({"success": False, "message": "Unauthorized or database unavailable."}), 401
     
     student_id = request.form.get('student_id')
@@ -475,13 +1431,16 @@ def update_attendance():
         attendance_data = {
             'percentage': int(percentage),
             'status': status,
-            'timestamp': firestore.SERVER_TIMESTAMP 
+            'timestamp': storage.SERVER_TIMESTAMP 
         }
 
         app_id = request.environ.get('__app_id', DEFAULT_APP_ID)
         collection_path = f"artifacts/{app_id}/public/data/attendance" 
         
-        db.collection(collection_path).document(student_id).set(attendance_data, merge=True)
+        db.set(collection_path, student_id, attendance_data, merge=True)
+        collection_changed(app_id, collection_path, [student_id])
+        attendance_indexes.update(collection_path, student_id,
+                                  dict(attendance_data, timestamp=datetime.now(timezone.utc)))
         
         print(f"Attendance for {student_id} updated successfully.")
         return jsonify({"success": True, "message": f"Attendance for {student_id} updated successfully!"})
@@ -490,6 +1449,44 @@ def update_attendance():
         print(f"Firestore WRITE Error (Attendance Update): {e}")
         return jsonify({"success": False, "message": "Failed to save attendance record."}), 500
 
+@app.route("/attendance/import", methods=["POST"])
+def import_attendance():
+    """
+    Admin endpoint for bulk attendance uploads (CSV or JSONL rows of student_id, percentage, status).
+    The upload is streamed row by row and written in Firestore WriteBatches.
+    """
+    if not session.get('logged_in') or not db:
+        return jsonify({"success": False, "message": "Unauthorized or database unavailable."}), 401
+
+    upload = request.files.get('file')
+    if upload is None or not upload.filename:
+        return jsonify({"success": False, "message": "Missing upload file."}), 400
+
+    file_format = attendance_import.detect_format(upload.filename, request.form.get('format'))
+    try:
+        batch_size = int(request.form.get('batch_size', attendance_import.MAX_BATCH_SIZE))
+    except ValueError:
+        return jsonify({"success": False, "message": "batch_size must be an integer."}), 400
+
+    app_id = request.environ.get('__app_id', DEFAULT_APP_ID)
+    collection_path = f"artifacts/{app_id}/public/data/attendance"
+
+    try:
+        rows = attendance_import.iter_raw_rows(upload.stream, file_format)
+        summary = attendance_import.import_attendance(
+            db, collection_path, rows, batch_size=batch_size)
+    except Exception as e:
+        print(f"Attendance Import Error: {e}")
+        return jsonify({"success": False, "message": "Failed to import attendance file."}), 500
+    finally:
+        collection_changed(app_id, collection_path)
+        attendance_indexes.invalidate(collection_path)
+
+    print(f"Attendance import: {summary['rows_written']} written, {summary['rows_failed']} failed "
+        f"in {summary['elapsed_seconds']}s")
+    return jsonify(dict(summary, success=summary['rows_failed'] == 0,
+                        message=f"Imported {summary['rows_written']} attendance records ({summary['rows_failed']} rows failed)."))
+
 
 # =======================================================================
 # 3. RUN THE APPLICATION
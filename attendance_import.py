@@ -0,0 +1,169 @@
+import csv
+import io
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+from storage import SERVER_TIMESTAMP
+
+# Firestore rejects batches with more than 500 writes.
+MAX_BATCH_SIZE = 500
+DEFAULT_MAX_IN_FLIGHT = 4
+# Keep the JSON response bounded even when a whole file is malformed.
+MAX_REPORTED_ERRORS = 1000
+
+REQUIRED_FIELDS = ('student_id', 'percentage', 'status')
+
+
+def detect_format(filename, explicit_format=None):
+    """Returns 'csv' or 'jsonl' from the explicit form value or the file extension."""
+    if explicit_format:
+        return explicit_format.lower()
+    if filename and filename.lower().endswith(('.jsonl', '.ndjson')):
+        return 'jsonl'
+    return 'csv'
+
+
+def iter_raw_rows(binary_stream, file_format):
+    """
+    Yields (row_number, row_dict_or_None, parse_error) from an uploaded file
+    without reading the whole upload into memory.
+    """
+    text_stream = io.TextIOWrapper(binary_stream, encoding='utf-8-sig', newline='')
+
+    if file_format == 'jsonl':
+        for row_number, line in enumerate(text_stream, start=1):
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                row = json.loads(line)
+            except ValueError as e:
+                yield row_number, None, f"Invalid JSON: {e}"
+                continue
+            if not isinstance(row, dict):
+                yield row_number, None, "Each JSONL line must be an object."
+                continue
+            yield row_number, row, None
+
+    elif file_format == 'csv':
+        reader = csv.DictReader(text_stream)
+        missing = [f for f in REQUIRED_FIELDS if f not in (reader.fieldnames or [])]
+        if missing:
+            yield 1, None, f"CSV header is missing columns: {', '.join(missing)}"
+            return
+        # Row 1 is the header, so data rows start at 2.
+        for row_number, row in enumerate(reader, start=2):
+            yield row_number, row, None
+
+    else:
+        yield 0, None, f"Unsupported format '{file_format}'. Use 'csv' or 'jsonl'."
+
+
+def validate_row(row):
+    """Returns (student_id, attendance_fields) or raises ValueError with a readable message."""
+    student_id = str(row.get('student_id') or '').strip()
+    status = str(row.get('status') or '').strip()
+    percentage = row.get('percentage')
+
+    if not student_id:
+        raise ValueError("Missing student_id.")
+    if '/' in student_id:
+        raise ValueError("student_id must not contain '/'.")
+    if not status:
+        raise ValueError("Missing status.")
+    try:
+        percentage = int(str(percentage).strip())
+    except (TypeError, ValueError):
+        raise ValueError(f"Percentage '{percentage}' is not an integer.")
+    if not 0 <= percentage <= 100:
+        raise ValueError(f"Percentage {percentage} is outside 0-100.")
+
+    return student_id, {'percentage': percentage, 'status': status}
+
+
+def _commit_batch(store, collection_path, chunk):
+    batch = store.batch()
+    for _, student_id, fields in chunk:
+        batch.set(collection_path, student_id, dict(fields, timestamp=SERVER_TIMESTAMP), merge=True)
+    batch.commit()
+
+
+def import_attendance(store, collection_path, raw_rows,
+                      batch_size=MAX_BATCH_SIZE, max_in_flight=DEFAULT_MAX_IN_FLIGHT):
+    """
+    Validates rows and writes them with merge=True in batches of up to
+    `batch_size`, keeping at most `max_in_flight` batches committing at once.
+    `store` is any storage backend, so the Firestore emulator or the SQLite
+    backend works as well as production.
+    """
+    batch_size = max(1, min(batch_size, MAX_BATCH_SIZE))
+    started = time.perf_counter()
+
+    errors = []
+    error_count = 0
+    rows_read = 0
+    written = 0
+    batches_committed = 0
+
+    def record_error(row_number, student_id, message):
+        nonlocal error_count
+        error_count += 1
+        if len(errors) < MAX_REPORTED_ERRORS:
+            errors.append({'row': row_number, 'student_id': student_id, 'error': message})
+
+    def collect(done_futures):
+        nonlocal written, batches_committed
+        for future in done_futures:
+            chunk = pending.pop(future)
+            try:
+                future.result()
+                written += len(chunk)
+                batches_committed += 1
+            except Exception as e:
+                print(f"Firestore WRITE Error (Attendance Import batch): {e}")
+                for row_number, student_id, _ in chunk:
+                    record_error(row_number, student_id, f"Batch commit failed: {e}")
+
+    pending = {}
+    chunk = []
+    with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+
+        def submit(current_chunk):
+            if len(pending) >= max_in_flight:
+                done, _ = wait(list(pending), return_when=FIRST_COMPLETED)
+                collect(done)
+            future = executor.submit(_commit_batch, store, collection_path, current_chunk)
+            pending[future] = current_chunk
+
+        for row_number, row, parse_error in raw_rows:
+            rows_read += 1
+            if parse_error:
+                record_error(row_number, None, parse_error)
+                continue
+            try:
+                student_id, fields = validate_row(row)
+            except ValueError as e:
+                record_error(row_number, row.get('student_id'), str(e))
+                continue
+
+            chunk.append((row_number, student_id, fields))
+            if len(chunk) >= batch_size:
+                submit(chunk)
+                chunk = []
+
+        if chunk:
+            submit(chunk)
+        collect(list(pending))
+
+    elapsed = time.perf_counter() - started
+    return {
+        'rows_read': rows_read,
+        'rows_written': written,
+        'rows_failed': error_count,
+        'batches_committed': batches_committed,
+        'elapsed_seconds': round(elapsed, 3),
+        'rows_per_second': round(written / elapsed, 1) if elapsed > 0 else 0.0,
+        'errors': errors,
+        'errors_truncated': error_count > len(errors),
+    }
@@ -0,0 +1,406 @@
+import bisect
+import functools
+import sys
+import threading
+import time
+from array import array
+from datetime import datetime, timezone
+
+SORT_FIELDS = ('student_id', 'percentage')
+
+# Above this many percentage-range matches, a student_id-ordered page is found by scanning
+# the id order instead of sorting every match.
+_SORT_CANDIDATES_LIMIT = 4096
+
+
+def _epoch(timestamp):
+    if isinstance(timestamp, datetime):
+        if timestamp.tzinfo is None:
+            timestamp = timestamp.replace(tzinfo=timezone.utc)
+        return timestamp.timestamp()
+    return float('nan')
+
+
+def _format_updated(epoch):
+    if epoch != epoch:  # NaN: no timestamp
+        return 'N/A'
+    return _format_minute(int(epoch // 60))
+
+
+@functools.lru_cache(maxsize=4096)
+def _format_minute(minute):
+    # Bulk imports stamp thousands of rows within the same minute.
+    return datetime.fromtimestamp(minute * 60, timezone.utc).strftime('%Y-%m-%d %H:%M')
+
+
+def _number(value):
+    return int(value) if value == int(value) else round(value, 2)
+
+
+class AttendanceIndex:
+    """
+    Column-oriented, in-memory attendance table.
+
+    Each student is a row: an interned id, a float32 percentage, a one-byte
+    status code and the last-update time. Two orders are kept sorted as
+    students are updated: by student_id and by percentage. Each order carries
+    its own copy of the status codes as a bytearray, so status filters count
+    and seek with bytearray.count()/find() instead of Python loops. Range
+    bounds are found with bisect (equal percentages are ordered by row, so a
+    student's position is a bisect too), and per-status totals and sums are
+    running counters, so queries and summaries don't touch every row.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        # Row columns.
+        self._ids = []
+        self._rows = {}
+        self._pct = array('f')
+        self._status = bytearray()
+        self._updated = array('d')
+        # Categorical statuses: code -> name, plus running count/sum and sorted percentages per code.
+        self._status_names = []
+        self._status_codes = {}
+        self._status_count = []
+        self._status_sum = []
+        self._status_pct = []
+        # student_id order.
+        self._id_keys = []
+        self._id_rows = array('I')
+        self._id_pct = array('f')
+        self._id_status = bytearray()
+        # percentage order (ascending).
+        self._pct_keys = array('f')
+        self._pct_rows = array('I')
+        self._pct_status = bytearray()
+        self.built_at = time.monotonic()
+
+    # --- Building & updates ---------------------------------------------
+
+    @classmethod
+    def build(cls, docs):
+        """Builds an index from storage Documents (or anything with .id and .data)."""
+        index = cls()
+        for doc in docs:
+            index._append(doc.id, doc.data)
+        index._rebuild_orders()
+        return index
+
+    def _code(self, status):
+        status = str(status)
+        code = self._status_codes.get(status)
+        if code is None:
+            if len(self._status_names) == 256:
+                raise ValueError("Too many distinct attendance statuses (max 256).")
+            code = self._status_codes[status] = len(self._status_names)
+            self._status_names.append(sys.intern(status))
+            self._status_count.append(0)
+            self._status_sum.append(0.0)
+            self._status_pct.append(array('f'))
+        return code
+
+    def _append(self, student_id, data):
+        row = len(self._ids)
+        student_id = sys.intern(str(student_id))
+        code = self._code(data.get('status', 'Unknown'))
+        self._ids.append(student_id)
+        self._rows[student_id] = row
+        self._pct.append(float(data.get('percentage', 0) or 0))
+        self._status.append(code)
+        self._updated.append(_epoch(data.get('timestamp')))
+        self._status_count[code] += 1
+        self._status_sum[code] += self._pct[row]
+        return row
+
+    def _rebuild_orders(self):
+        by_id = sorted(range(len(self._ids)), key=self._ids.__getitem__)
+        self._id_keys = [self._ids[row] for row in by_id]
+        self._id_rows = array('I', by_id)
+        self._id_pct = array('f', (self._pct[row] for row in by_id))
+        self._id_status = bytearray(self._status[row] for row in by_id)
+
+        by_pct = sorted(range(len(self._ids)), key=self._pct.__getitem__)
+        self._pct_keys = array('f', (self._pct[row] for row in by_pct))
+        self._pct_rows = array('I', by_pct)
+        self._pct_status = bytearray(self._status[row] for row in by_pct)
+
+        self._status_pct = [array('f') for _ in self._status_names]
+        for row in by_pct:
+            self._status_pct[self._status[row]].append(self._pct[row])
+
+    def _pct_position(self, row):
+        """Where `row` sits (or belongs) in the percentage order: its percentage run, then by row."""
+        pct = self._pct[row]
+        lo = bisect.bisect_left(self._pct_keys, pct)
+        hi = bisect.bisect_right(self._pct_keys, pct, lo)
+        return bisect.bisect_left(self._pct_rows, row, lo, hi)
+
+    def _remove_from_pct_order(self, row):
+        i = self._pct_position(row)
+        del self._pct_keys[i]
+        del self._pct_rows[i]
+        del self._pct_status[i]
+        status_pct = self._status_pct[self._status[row]]
+        del status_pct[bisect.bisect_left(status_pct, self._pct[row])]
+
+    def _insert_into_pct_order(self, row):
+        i = self._pct_position(row)
+        self._pct_keys.insert(i, self._pct[row])
+        self._pct_rows.insert(i, row)
+        self._pct_status.insert(i, self._status[row])
+        bisect.insort(self._status_pct[self._status[row]], self._pct[row])
+
+    def update(self, student_id, data):
+        """Inserts or updates one student from an attendance document (percentage, status, timestamp)."""
+        with self._lock:
+            row = self._rows.get(student_id)
+            if row is None:
+                row = self._append(student_id, data)
+                student_id = self._ids[row]
+                j = bisect.bisect_left(self._id_keys, student_id)
+                self._id_keys.insert(j, student_id)
+                self._id_rows.insert(j, row)
+                self._id_pct.insert(j, self._pct[row])
+                self._id_status.insert(j, self._status[row])
+                self._insert_into_pct_order(row)
+                return
+
+            old_code = self._status[row]
+            code = self._code(data.get('status', self._status_names[old_code]))
+            self._status_count[old_code] -= 1
+            self._status_sum[old_code] -= self._pct[row]
+            self._remove_from_pct_order(row)
+
+            self._pct[row] = float(data.get('percentage', self._pct[row]) or 0)
+            self._status[row] = code
+            if 'timestamp' in data:
+                self._updated[row] = _epoch(data.get('timestamp'))
+            self._status_count[code] += 1
+            self._status_sum[code] += self._pct[row]
+
+            self._insert_into_pct_order(row)
+            j = bisect.bisect_left(self._id_keys, student_id)
+            self._id_pct[j] = self._pct[row]
+            self._id_status[j] = code
+
+    def remove(self, student_id):
+        """Drops a student; the last row moves into the freed slot."""
+        with self._lock:
+            row = self._rows.pop(student_id, None)
+            if row is None:
+                return
+            code = self._status[row]
+            self._status_count[code] -= 1
+            self._status_sum[code] -= self._pct[row]
+            self._remove_from_pct_order(row)
+            j = bisect.bisect_left(self._id_keys, student_id)
+            del self._id_keys[j]
+            del self._id_rows[j]
+            del self._id_pct[j]
+            del self._id_status[j]
+
+            last = len(self._ids) - 1
+            if row != last:
+                # The last row takes the freed row number; re-place it within its percentage run.
+                moved_id = self._ids[last]
+                self._remove_from_pct_order(last)
+                self._id_rows[bisect.bisect_left(self._id_keys, moved_id)] = row
+                self._ids[row] = moved_id
+                self._rows[moved_id] = row
+                self._pct[row] = self._pct[last]
+                self._status[row] = self._status[last]
+                self._updated[row] = self._updated[last]
+                self._insert_into_pct_order(row)
+            self._ids.pop()
+            self._pct.pop()
+            self._status.pop()
+            self._updated.pop()
+
+    # --- Queries ----------------------------------------------------------
+
+    def __len__(self):
+        return len(self._ids)
+
+    def _record(self, row):
+        return {
+            'student_id': self._ids[row],
+            'percentage': _number(self._pct[row]),
+            'status': self._status_names[self._status[row]],
+            'last_updated': _format_updated(self._updated[row]),
+        }
+
+    def get(self, student_id):
+        with self._lock:
+            row = self._rows.get(student_id)
+            return None if row is None else self._record(row)
+
+    @staticmethod
+    def _range(sorted_pct, min_percentage, max_percentage):
+        """Slice bounds of [min_percentage, max_percentage) within an ascending percentage array."""
+        lo = 0 if min_percentage is None else bisect.bisect_left(sorted_pct, min_percentage)
+        hi = len(sorted_pct) if max_percentage is None else bisect.bisect_left(sorted_pct, max_percentage)
+        return lo, max(lo, hi)
+
+    @staticmethod
+    def _positions(status_bytes, lo, hi, code, descending):
+        """Positions in [lo, hi) of an order, optionally only those with status `code`, in page order."""
+        if code is None:
+            return iter(range(hi - 1, lo - 1, -1)) if descending else iter(range(lo, hi))
+
+        def matches():
+            if descending:
+                i = status_bytes.rfind(code, lo, hi)
+                while i != -1:
+                    yield i
+                    i = status_bytes.rfind(code, lo, i)
+            else:
+                i = status_bytes.find(code, lo, hi)
+                while i != -1:
+                    yield i
+                    i = status_bytes.find(code, i + 1, hi)
+        return matches()
+
+    def query(self, status=None, min_percentage=None, max_percentage=None,
+              sort='student_id', descending=False, offset=0, limit=50):
+        """
+        Students matching the filters, one page at a time.
+        `min_percentage` is inclusive and `max_percentage` exclusive ("below 75%" is max_percentage=75).
+        Returns (records, total) where total counts every match, not just this page.
+        """
+        if sort not in SORT_FIELDS:
+            raise ValueError(f"sort must be one of {', '.join(SORT_FIELDS)}")
+        offset = max(0, offset)
+
+        with self._lock:
+            code = None
+            if status is not None:
+                code = self._status_codes.get(status)
+                if code is None:
+                    return [], 0
+
+            # The percentage range is a contiguous slice of the percentage order.
+            lo, hi = self._range(self._pct_keys, min_percentage, max_percentage)
+            if code is None:
+                total = hi - lo
+            else:
+                status_lo, status_hi = self._range(self._status_pct[code], min_percentage, max_percentage)
+                total = status_hi - status_lo
+            if total <= offset:
+                return [], total
+            ranged = min_percentage is not None or max_percentage is not None
+
+            if sort == 'percentage':
+                positions = self._positions(self._pct_status, lo, hi, code, descending)
+                rows = [self._pct_rows[i] for _, i in zip(range(offset + limit), positions)][offset:]
+
+            elif not ranged:
+                positions = self._positions(self._id_status, 0, len(self._id_keys), code, descending)
+                rows = [self._id_rows[i] for _, i in zip(range(offset + limit), positions)][offset:]
+
+            elif total <= _SORT_CANDIDATES_LIMIT:
+                candidates = [self._pct_rows[i] for i in self._positions(self._pct_status, lo, hi, code, False)]
+                candidates.sort(key=self._ids.__getitem__, reverse=descending)
+                rows = candidates[offset:offset + limit]
+
+            else:
+                # Many matches: walk the id order and keep the ones in range; a page fills quickly.
+                low = float('-inf') if min_percentage is None else min_percentage
+                high = float('inf') if max_percentage is None else max_percentage
+                id_pct = self._id_pct
+                rows = []
+                skipped = 0
+                for i in self._positions(self._id_status, 0, len(self._id_keys), code, descending):
+                    if low <= id_pct[i] < high:
+                        if skipped < offset:
+                            skipped += 1
+                            continue
+                        rows.append(self._id_rows[i])
+                        if len(rows) == limit:
+                            break
+
+            return [self._record(row) for row in rows], total
+
+    def summary(self, bins=10):
+        """Overall and per-status counts and mean percentage, plus a percentage histogram over [0, 100]."""
+        with self._lock:
+            count = len(self._ids)
+            total = sum(self._status_sum)
+            edges = [100.0 * i / bins for i in range(bins + 1)]
+            cuts = [bisect.bisect_left(self._pct_keys, edge) for edge in edges[:-1]] + [len(self._pct_keys)]
+            histogram = [{'from': _number(edges[i]), 'to': _number(edges[i + 1]), 'count': cuts[i + 1] - cuts[i]}
+                         for i in range(bins)]
+            # Values below 0 land in the first bin; values above 100 in the last.
+            histogram[0]['count'] += cuts[0]
+            by_status = {
+                name: {'count': self._status_count[code],
+                       'mean_percentage': round(self._status_sum[code] / self._status_count[code], 2)}
+                for code, name in enumerate(self._status_names) if self._status_count[code]
+            }
+            return {
+                'students': count,
+                'mean_percentage': round(total / count, 2) if count else 0.0,
+                'by_status': by_status,
+                'histogram': histogram,
+            }
+
+    def memory_bytes(self):
+        """Approximate memory held by the index (columns, orders, lookup dict and id strings)."""
+        with self._lock:
+            arrays = (self._pct, self._updated, self._id_rows, self._id_pct, self._pct_keys, self._pct_rows,
+                      *self._status_pct)
+            size = sum(a.buffer_info()[1] * a.itemsize for a in arrays)
+            size += len(self._status) + len(self._id_status) + len(self._pct_status)
+            size += sys.getsizeof(self._ids) + sys.getsizeof(self._id_keys) + sys.getsizeof(self._rows)
+            size += sum(sys.getsizeof(student_id) for student_id in self._ids)
+            return size
+
+
+class AttendanceIndexes:
+    """
+    One AttendanceIndex per attendance collection in this worker, built on
+    first use from `loader()` and rebuilt after `ttl` seconds so writes made by
+    other workers show up; this worker's own writes are applied in place.
+    """
+
+    def __init__(self, ttl=300):
+        self.ttl = ttl
+        self._indexes = {}
+        self._lock = threading.Lock()
+        self.builds = 0
+        self.last_build_seconds = 0.0
+
+    def get(self, collection_path, loader):
+        index = self._indexes.get(collection_path)
+        if index is not None and time.monotonic() - index.built_at < self.ttl:
+            return index
+        with self._lock:
+            index = self._indexes.get(collection_path)
+            if index is not None and time.monotonic() - index.built_at < self.ttl:
+                return index
+            started = time.perf_counter()
+            index = AttendanceIndex.build(loader())
+            self.last_build_seconds = time.perf_counter() - started
+            self.builds += 1
+            self._indexes[collection_path] = index
+            return index
+
+    def update(self, collection_path, student_id, data):
+        index = self._indexes.get(collection_path)
+        if index is not None:
+            index.update(student_id, data)
+
+    def invalidate(self, collection_path):
+        with self._lock:
+            self._indexes.pop(collection_path, None)
+
+    def stats(self):
+        indexes = list(self._indexes.values())
+        return {
+            'indexes': len(indexes),
+            'students': sum(len(index) for index in indexes),
+            'memory_bytes': sum(index.memory_bytes() for index in indexes),
+            'builds': self.builds,
+            'last_build_seconds': round(self.last_build_seconds, 4),
+            'ttl_seconds': self.ttl,
+        }
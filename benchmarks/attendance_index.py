@@ -0,0 +1,98 @@
+"""
+Measures the in-memory attendance index against the list-of-dicts it replaces.
+
+    python benchmarks/attendance_index.py --students 50000
+
+Builds an AttendanceIndex from synthetic attendance documents and prints
+p50/p95 latency in microseconds for typical admin queries, summary stats and
+single-student updates, plus the memory held by the index versus a list of
+per-student dicts.
+"""
+import argparse
+import json
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from attendance_index import AttendanceIndex
+from storage import Document
+
+STATUSES = ('Good', 'Warning', 'Critical', 'Detained')
+
+QUERIES = {
+    'all_page_1': {},
+    'status_detained': {'status': 'Detained'},
+    'below_75': {'max_percentage': 75},
+    'below_75_critical': {'max_percentage': 75, 'status': 'Critical'},
+    'below_75_by_percentage_desc': {'max_percentage': 75, 'sort': 'percentage', 'descending': True},
+    'between_90_and_91': {'min_percentage': 90, 'max_percentage': 91},
+    'page_20_by_percentage': {'sort': 'percentage', 'offset': 1000},
+}
+
+
+def make_documents(students, seed):
+    rng = random.Random(seed)
+    now = datetime.now(timezone.utc)
+    return [Document(f"S{i:06d}", {
+        'percentage': rng.randint(30, 100),
+        'status': rng.choice(STATUSES),
+        'timestamp': now - timedelta(minutes=rng.randint(0, 60 * 24 * 30)),
+    }) for i in rng.sample(range(students * 2), students)]
+
+
+def measure(fn, repeats):
+    samples = []
+    for _ in range(repeats):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1e6)
+    ordered = sorted(samples)
+    return {'p50_us': round(statistics.median(samples), 1),
+            'p95_us': round(ordered[min(len(ordered) - 1, int(0.95 * (len(ordered) - 1)))], 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--students', type=int, default=50000)
+    parser.add_argument('--repeats', type=int, default=500)
+    parser.add_argument('--seed', type=int, default=1)
+    args = parser.parse_args()
+
+    docs = make_documents(args.students, args.seed)
+
+    started = time.perf_counter()
+    index = AttendanceIndex.build(docs)
+    build_seconds = time.perf_counter() - started
+
+    tracemalloc.start()
+    as_dicts = [{'student_id': doc.id, 'percentage': doc.data['percentage'], 'status': doc.data['status'],
+                 'last_updated': doc.data['timestamp'].strftime('%Y-%m-%d %H:%M')} for doc in docs]
+    dicts_bytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del as_dicts
+
+    results = {name: measure(lambda: index.query(**kwargs), args.repeats) for name, kwargs in QUERIES.items()}
+    results['summary'] = measure(index.summary, args.repeats)
+    rng = random.Random(args.seed)
+    ids = [doc.id for doc in docs]
+    results['update'] = measure(
+        lambda: index.update(rng.choice(ids), {'percentage': rng.randint(30, 100), 'status': rng.choice(STATUSES)}),
+        args.repeats)
+
+    print(json.dumps({
+        'students': args.students,
+        'build_seconds': round(build_seconds, 3),
+        'index_bytes': index.memory_bytes(),
+        'list_of_dicts_bytes': dicts_bytes,
+        'operations': results,
+    }, indent=2))
+
+
+if __name__ == '__main__':
+    main()
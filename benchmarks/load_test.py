@@ -0,0 +1,342 @@
+"""
+Load test for every SmartCampus route against stubbed backends.
+
+    python benchmarks/load_test.py --attendance-docs 20000 --concurrency 16 --requests 400
+    python benchmarks/load_test.py --output results/new.json --compare results/baseline.json
+
+The app runs in-process on the in-memory SQLite storage backend, seeded with
+the requested dataset, and a stub Gemini model with configurable latency.
+Each route is driven by a pool of concurrent Flask test clients. The report
+gives p50/p95/p99 latency, throughput, error count and peak RSS per route,
+and can be written as JSON and compared against an earlier run.
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(REPO_ROOT))
+
+
+# =======================================================================
+# STUB GEMINI MODEL
+# =======================================================================
+
+class _StubResponse:
+    def __init__(self, text):
+        self.text = text
+
+
+class StubModel:
+    """Stands in for genai.GenerativeModel: sleeps `latency` seconds, then answers (streamed in `chunks` parts if asked)."""
+
+    def __init__(self, latency=0.2, chunks=8):
+        self.latency = latency
+        self.chunks = chunks
+
+    def generate_content(self, prompt, stream=False, request_options=None):
+        text = f"Stub answer for: {prompt[:60]}"
+        if not stream:
+            time.sleep(self.latency)
+            return _StubResponse(text)
+
+        def chunked():
+            step = max(1, len(text) // self.chunks)
+            for start in range(0, len(text), step):
+                time.sleep(self.latency / self.chunks)
+                yield _StubResponse(text[start:start + step])
+        return chunked()
+
+
+# =======================================================================
+# APP SETUP & SEEDING
+# =======================================================================
+
+def load_app(model_latency, use_caches):
+    os.environ.setdefault("STORAGE_BACKEND", "sqlite")
+    os.environ.setdefault("SQLITE_PATH", ":memory:")
+    # Every simulated client shares one address; per-client limits would turn the run into 429s.
+    for limit in ("RATE_LIMIT_CHAT", "RATE_LIMIT_AI_REPORTS", "RATE_LIMIT_AI_REPORTS_ADMIN", "RATE_LIMIT_REGISTER",
+                  "MAX_CONCURRENT_REQUESTS"):
+        os.environ.setdefault(limit, "0")
+    if not use_caches:
+        os.environ["RECORD_CACHE_TTL"] = "0"
+        os.environ["CHAT_CACHE_TTL"] = "0"
+
+    import app as campus_app
+
+    stub = StubModel(latency=model_latency)
+    campus_app.model_registry.register(campus_app.GEMINI_MODEL_NAME, stub)
+    # Templates live next to app.py in this repo.
+    campus_app.app.template_folder = str(REPO_ROOT)
+    return campus_app
+
+
+def seed(campus_app, attendance_docs, events, records, registrations):
+    import storage
+
+    db = campus_app.db
+    base = f"artifacts/{campus_app.DEFAULT_APP_ID}/public/data"
+    statuses = ('Good', 'Warning', 'Critical')
+
+    def write_in_batches(items):
+        for start in range(0, len(items), 250):
+            batch = db.batch()
+            for collection_path, doc_id, data in items[start:start + 250]:
+                batch.set(collection_path, doc_id, data)
+            batch.commit()
+
+    write_in_batches([
+        (f"{base}/attendance", f"S{i:06d}", {'percentage': i % 101, 'status': statuses[i % 3], 'timestamp': storage.SERVER_TIMESTAMP})
+        for i in range(attendance_docs)
+    ])
+    for kind in ('circulars', 'results'):
+        write_in_batches([
+            (f"{base}/{kind}", f"{kind[0].upper()}{i:04d}", {'title': f"{kind} {i}", 'details': "Details " * 20, 'timestamp': storage.SERVER_TIMESTAMP})
+            for i in range(records)
+        ])
+    event_ids = [f"EV{i:04d}" for i in range(events)]
+    write_in_batches([
+        (f"{base}/events", event_id, {'title': f"Event {event_id}", 'date': '2026-01-01', 'time': '10:00',
+                                      'details': 'Fest', 'timestamp': storage.SERVER_TIMESTAMP})
+        for event_id in event_ids
+    ])
+    for i in range(registrations):
+        batch = db.batch()
+        campus_app.registration_counter.add_to_batch(
+            batch, f"{base}/registrations", f"{base}/registration_stats", None,
+            {'event_id': event_ids[i % len(event_ids)], 'user_id': uuid.uuid4().hex, 'registration_date': storage.SERVER_TIMESTAMP})
+        batch.commit()
+    return event_ids
+
+
+# =======================================================================
+# SCENARIOS
+# =======================================================================
+
+def build_scenarios(event_ids, attendance_docs):
+    """(name, method, admin, request-kwargs factory) for every route under test."""
+    def student(i):
+        return f"S{i % max(attendance_docs, 1):06d}"
+
+    return [
+        ('GET /', 'get', False, lambda i: {'path': '/'}),
+        ('GET /timetable', 'get', False, lambda i: {'path': '/timetable'}),
+        ('GET /events', 'get', False, lambda i: {'path': '/events'}),
+        ('GET /circulars', 'get', False, lambda i: {'path': '/circulars'}),
+        ('GET /results', 'get', False, lambda i: {'path': '/results'}),
+        ('GET /attendance', 'get', False, lambda i: {'path': f'/attendance?user_id={student(i)}'}),
+        ('GET /attendance (admin page)', 'get', True, lambda i: {'path': f'/attendance?after={student(i)}'}),
+        ('GET /attendance/student', 'get', False, lambda i: {'path': f'/attendance/student/{student(i)}'}),
+        ('GET /attendance/query', 'get', True, lambda i: {'path': f'/attendance/query?max_percentage={50 + i % 50}&status=Good'}),
+        ('GET /attendance/summary', 'get', True, lambda i: {'path': '/attendance/summary'}),
+        ('GET /get', 'get', False, lambda i: {'path': f'/get?msg=question {i % 20}'}),
+        ('GET /get/stream', 'get', False, lambda i: {'path': f'/get/stream?msg=stream question {i % 20}'}),
+        ('POST /events/register', 'post', False, lambda i: {'path': f'/events/register/{event_ids[i % len(event_ids)]}'}),
+        ('POST /attendance/update', 'post', True, lambda i: {'path': '/attendance/update', 'data': {
+            'student_id': student(i), 'percentage': str(i % 101), 'status': 'Good'}}),
+        ('POST /circulars/update', 'post', True, lambda i: {'path': '/circulars/update', 'data': {
+            'doc_id': f"C{i % 50:04d}", 'title': 'Updated', 'details': 'Updated details'}}),
+        ('POST /results/update', 'post', True, lambda i: {'path': '/results/update', 'data': {
+            'doc_id': f"R{i % 50:04d}", 'title': 'Updated', 'details': 'Updated details'}}),
+        ('POST /events/create', 'post', True, lambda i: {'path': '/events/create', 'data': {
+            'title': f"Bench {i}", 'date': '2026-01-01', 'time': '10:00', 'details': 'x'}}),
+        ('POST /events/generate_summary', 'post', True, lambda i: {'path': '/events/generate_summary', 'data': {
+            'title': f"Event {i}", 'details': 'Fest'}}),
+        ('GET /events/analyze_registrations', 'get', True, lambda i: {'path': f'/events/analyze_registrations/{event_ids[i % len(event_ids)]}'}),
+        ('GET /events/stats', 'get', True, lambda i: {'path': f'/events/stats/{event_ids[i % len(event_ids)]}'}),
+    ]
+
+
+# =======================================================================
+# DRIVER
+# =======================================================================
+
+def current_rss_bytes():
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, AttributeError):
+        # Not Linux: fall back to the process-lifetime peak (KiB on Linux, bytes on macOS).
+        if resource is None:
+            return 0
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return peak if sys.platform == 'darwin' else peak * 1024
+
+
+class RSSSampler:
+    """Samples RSS in the background and remembers the peak seen while a route runs."""
+
+    def __init__(self, interval=0.01):
+        self.interval = interval
+        self.peak = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            self.peak = max(self.peak, current_rss_bytes())
+            self._stop.wait(self.interval)
+
+    def __enter__(self):
+        self.peak = current_rss_bytes()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss_bytes())
+
+
+def make_client(campus_app, admin):
+    client = campus_app.app.test_client()
+    if admin:
+        client.post('/admin/login', data={'username': campus_app.ADMIN_USERNAME, 'password': campus_app.ADMIN_PASSWORD})
+    return client
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run_scenario(campus_app, scenario, total_requests, concurrency, quiet=True):
+    name, method, admin, make_request = scenario
+    clients = threading.local()
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def one(i):
+        nonlocal errors
+        if not hasattr(clients, 'client'):
+            clients.client = make_client(campus_app, admin)
+        kwargs = make_request(i)
+        started = time.perf_counter()
+        response = getattr(clients.client, method)(kwargs.pop('path'), **kwargs)
+        response.get_data()  # Drain streamed bodies so their full duration is measured.
+        response.close()
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed * 1000)
+            if response.status_code >= 400:
+                errors += 1
+
+    # The app logs every write with print(); keep that out of the report unless asked for.
+    app_output = contextlib.redirect_stdout(io.StringIO()) if quiet else contextlib.nullcontext()
+    with app_output, RSSSampler() as rss:
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(one, range(total_requests)))
+        wall = time.perf_counter() - started
+
+    return {
+        'route': name,
+        'requests': total_requests,
+        'errors': errors,
+        'p50_ms': round(statistics.median(latencies), 3),
+        'p95_ms': round(percentile(latencies, 95), 3),
+        'p99_ms': round(percentile(latencies, 99), 3),
+        'throughput_rps': round(total_requests / wall, 1) if wall > 0 else 0.0,
+        'peak_rss_mb': round(rss.peak / (1024 * 1024), 1),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=REPO_ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results, baseline_path, threshold):
+    """Prints p95 and throughput deltas against a previous run; returns True when any route regressed."""
+    with open(baseline_path) as f:
+        baseline = {row['route']: row for row in json.load(f)['routes']}
+
+    regressed = False
+    print(f"\nComparison with {baseline_path} (regression threshold {threshold:.0%}):")
+    for row in results:
+        before = baseline.get(row['route'])
+        if before is None:
+            continue
+        p95_change = (row['p95_ms'] - before['p95_ms']) / before['p95_ms'] if before['p95_ms'] else 0.0
+        rps_change = (row['throughput_rps'] - before['throughput_rps']) / before['throughput_rps'] if before['throughput_rps'] else 0.0
+        flag = p95_change > threshold or rps_change < -threshold
+        regressed = regressed or flag
+        print(f"  {'REGRESSION ' if flag else ''}{row['route']}: p95 {before['p95_ms']} -> {row['p95_ms']} ms ({p95_change:+.0%}), "
+              f"throughput {before['throughput_rps']} -> {row['throughput_rps']} rps ({rps_change:+.0%})")
+    return regressed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--attendance-docs', type=int, default=1000, help="attendance documents to seed (e.g. 100 to 50000)")
+    parser.add_argument('--events', type=int, default=50)
+    parser.add_argument('--records', type=int, default=200, help="circulars and results documents to seed (each)")
+    parser.add_argument('--registrations', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--requests', type=int, default=200, help="requests per route")
+    parser.add_argument('--model-latency', type=float, default=0.05, help="stub Gemini latency in seconds")
+    parser.add_argument('--no-cache', action='store_true', help="disable the listing and chatbot caches")
+    parser.add_argument('--routes', help="only run routes whose name contains this substring")
+    parser.add_argument('--verbose', action='store_true', help="show the app's own log output")
+    parser.add_argument('--output', help="write machine-readable results to this JSON file")
+    parser.add_argument('--compare', help="previous results JSON to compare against")
+    parser.add_argument('--threshold', type=float, default=0.2, help="relative change counted as a regression")
+    args = parser.parse_args()
+
+    campus_app = load_app(args.model_latency, use_caches=not args.no_cache)
+    if not campus_app.db:
+        sys.exit("Storage backend failed to initialize; see the error above.")
+
+    seed_started = time.perf_counter()
+    event_ids = seed(campus_app, args.attendance_docs, args.events, args.records, args.registrations)
+    print(f"Seeded {args.attendance_docs} attendance docs, {args.events} events, {args.records} circulars/results, "
+          f"{args.registrations} registrations in {time.perf_counter() - seed_started:.1f}s")
+
+    results = []
+    for scenario in build_scenarios(event_ids, args.attendance_docs):
+        if args.routes and args.routes not in scenario[0]:
+            continue
+        row = run_scenario(campus_app, scenario, args.requests, args.concurrency, quiet=not args.verbose)
+        results.append(row)
+        print(f"{row['route']:<38} p50 {row['p50_ms']:>8} ms  p95 {row['p95_ms']:>8} ms  p99 {row['p99_ms']:>8} ms  "
+              f"{row['throughput_rps']:>8} rps  errors {row['errors']:>4}  rss {row['peak_rss_mb']} MB")
+
+    report = {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'parameters': vars(args),
+        'routes': results,
+    }
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nResults written to {args.output}")
+
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
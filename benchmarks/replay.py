@@ -0,0 +1,341 @@
+"""
+Replays a recorded request log against the app, in-process or over HTTP.
+
+    python benchmarks/replay.py traffic.jsonl
+    python benchmarks/replay.py traffic.jsonl.gz --speed 4 --workers 32 --output results/replay.json
+    python benchmarks/replay.py traffic.jsonl --url http://localhost:8000 --speed 0 --compare results/replay.json
+
+Each log line is one request, in the format the app writes when
+REQUEST_LOG_PATH is set (`timestamp` may also be an ISO-8601 string; `query`,
+`form` and `admin` are optional):
+
+    {"timestamp": 1767254400.25, "method": "POST", "path": "/events/register/EV0001",
+     "query": {}, "form": {}, "admin": false}
+
+The log is read as a stream, so it can be any size. Each request is sent at
+its recorded offset from the first one, divided by --speed (--speed 0 sends
+as fast as the worker pool allows). If the pool can't keep up, requests go
+out late rather than piling up, and the report shows how far behind
+schedule the replay fell. In-process runs use the in-memory SQLite backend and
+the stub Gemini model from load_test.py, seeded the same way. --url targets
+a running server, e.g. one started with STORAGE_BACKEND=sqlite. The report
+gives p50/p95/p99 latency, throughput, status counts and errors per route,
+and can be written as JSON and compared against an earlier run.
+"""
+import argparse
+import contextlib
+import gzip
+import http.client
+import io
+import json
+import platform
+import statistics
+import sys
+import threading
+import time
+from array import array
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from functools import lru_cache
+from pathlib import Path
+from urllib.parse import urlencode, urlsplit
+
+from werkzeug.exceptions import HTTPException
+from werkzeug.routing import RequestRedirect
+
+from load_test import compare, git_revision, load_app, percentile, seed
+
+
+# =======================================================================
+# LOG READING
+# =======================================================================
+
+def parse_timestamp(value):
+    if isinstance(value, (int, float)):
+        return float(value)
+    return datetime.fromisoformat(value.replace('Z', '+00:00')).timestamp()
+
+
+class RequestLog:
+    """Iterates the log's requests one line at a time (plain or .gz); malformed lines are counted and skipped."""
+
+    def __init__(self, path, limit=None):
+        self.path = path
+        self.limit = limit
+        self.skipped = 0
+
+    def _open(self):
+        if self.path == '-':
+            return contextlib.nullcontext(sys.stdin)
+        if self.path.endswith('.gz'):
+            return gzip.open(self.path, 'rt', encoding='utf-8')
+        return open(self.path, encoding='utf-8')
+
+    def __iter__(self):
+        count = 0
+        with self._open() as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    entry = json.loads(line)
+                    record = {
+                        'timestamp': parse_timestamp(entry['timestamp']),
+                        'method': entry.get('method', 'GET').upper(),
+                        'path': entry['path'],
+                        'query': entry.get('query') or {},
+                        'form': entry.get('form') or {},
+                        'admin': bool(entry.get('admin')),
+                    }
+                except (ValueError, KeyError, TypeError, AttributeError):
+                    self.skipped += 1
+                    continue
+                yield record
+                count += 1
+                if self.limit and count >= self.limit:
+                    return
+
+
+# =======================================================================
+# TARGETS
+# =======================================================================
+
+class InProcessTarget:
+    """Sends requests through Flask test clients, one public and one logged-in admin client per worker thread."""
+
+    def __init__(self, campus_app):
+        self.campus_app = campus_app
+        self._local = threading.local()
+
+    def _client(self, admin):
+        clients = getattr(self._local, 'clients', None)
+        if clients is None:
+            clients = self._local.clients = {}
+        if admin not in clients:
+            client = self.campus_app.app.test_client()
+            if admin:
+                client.post('/admin/login', data={'username': self.campus_app.ADMIN_USERNAME,
+                                                  'password': self.campus_app.ADMIN_PASSWORD})
+            clients[admin] = client
+        return clients[admin]
+
+    def send(self, record):
+        response = self._client(record['admin']).open(
+            record['path'], method=record['method'], query_string=record['query'],
+            data=record['form'] if record['form'] else None)
+        response.get_data()  # Drain streamed bodies so their full duration is measured.
+        response.close()
+        return response.status_code
+
+
+class HTTPTarget:
+    """
+    Sends requests to a running server over keep-alive connections, one per
+    worker thread and session kind; admin connections log in first and carry
+    the session cookie.
+    """
+
+    def __init__(self, base_url, username, password, timeout=60):
+        parts = urlsplit(base_url)
+        self.connection_class = http.client.HTTPSConnection if parts.scheme == 'https' else http.client.HTTPConnection
+        self.netloc = parts.netloc
+        self.prefix = parts.path.rstrip('/')
+        self.username = username
+        self.password = password
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _request(self, session, method, path, form=None):
+        headers = {'Cookie': session['cookie']} if session['cookie'] else {}
+        body = None
+        if form is not None:
+            body = urlencode(form)
+            headers['Content-Type'] = 'application/x-www-form-urlencoded'
+        for attempt in range(2):
+            if session['connection'] is None:
+                session['connection'] = self.connection_class(self.netloc, timeout=self.timeout)
+            try:
+                session['connection'].request(method, self.prefix + path, body=body, headers=headers)
+                response = session['connection'].getresponse()
+                response.read()
+                break
+            except (http.client.HTTPException, OSError):
+                # Server closed the kept-alive connection: reconnect once.
+                session['connection'].close()
+                session['connection'] = None
+                if attempt:
+                    raise
+        cookie = response.getheader('Set-Cookie')
+        if cookie:
+            session['cookie'] = cookie.split(';', 1)[0]
+        return response.status
+
+    def _session(self, admin):
+        sessions = getattr(self._local, 'sessions', None)
+        if sessions is None:
+            sessions = self._local.sessions = {}
+        if admin not in sessions:
+            session = sessions[admin] = {'connection': None, 'cookie': None}
+            if admin:
+                self._request(session, 'POST', '/admin/login', {'username': self.username, 'password': self.password})
+        return sessions[admin]
+
+    def send(self, record):
+        path = record['path']
+        if record['query']:
+            path += '?' + urlencode(record['query'])
+        form = record['form'] if record['form'] or record['method'] == 'POST' else None
+        return self._request(self._session(record['admin']), record['method'], path, form)
+
+
+def route_labeler(flask_app):
+    """Maps (method, path) to "METHOD /url/<rule>" so ids in paths don't split a route's stats."""
+    adapter = flask_app.url_map.bind('localhost')
+
+    @lru_cache(maxsize=10000)
+    def label(method, path):
+        try:
+            rule, _ = adapter.match(path, method=method, return_rule=True)
+            return f"{method} {rule.rule}"
+        except RequestRedirect as redirect:
+            return label(method, urlsplit(redirect.new_url).path)
+        except HTTPException:
+            return f"{method} (unmatched)"
+    return label
+
+
+# =======================================================================
+# REPLAY
+# =======================================================================
+
+class RouteStats:
+    def __init__(self):
+        self.latencies = array('d')
+        self.statuses = Counter()
+        self.errors = 0
+
+
+def replay(requests_log, target, label, workers, speed):
+    """Sends every logged request on schedule through a pool of `workers`; returns (route stats, wall seconds, max lag)."""
+    routes = {}
+    lock = threading.Lock()
+    # Bounds the requests handed to the pool but not yet started, so a slow target can't make the
+    # replay read the whole log into memory.
+    slots = threading.BoundedSemaphore(workers * 2)
+
+    def one(record):
+        try:
+            started = time.perf_counter()
+            try:
+                status = target.send(record)
+            except Exception as e:
+                status = type(e).__name__
+            elapsed = time.perf_counter() - started
+            with lock:
+                stats = routes.setdefault(label(record['method'], record['path']), RouteStats())
+                stats.latencies.append(elapsed)
+                stats.statuses[status] += 1
+                if not isinstance(status, int) or status >= 500:
+                    stats.errors += 1
+        finally:
+            slots.release()
+
+    max_lag = 0.0
+    first_timestamp = None
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='replay') as executor:
+        for record in requests_log:
+            if first_timestamp is None:
+                first_timestamp = record['timestamp']
+            if speed > 0:
+                delay = started + (record['timestamp'] - first_timestamp) / speed - time.perf_counter()
+                if delay > 0:
+                    time.sleep(delay)
+                else:
+                    max_lag = max(max_lag, -delay)
+            slots.acquire()
+            executor.submit(one, record)
+    return routes, time.perf_counter() - started, max_lag
+
+
+def report_rows(routes, wall):
+    rows = []
+    for route, stats in sorted(routes.items(), key=lambda item: -len(item[1].latencies)):
+        latencies = [value * 1000 for value in stats.latencies]
+        rows.append({
+            'route': route,
+            'requests': len(latencies),
+            'errors': stats.errors,
+            'statuses': {str(status): count for status, count in sorted(stats.statuses.items(), key=str)},
+            'p50_ms': round(statistics.median(latencies), 3),
+            'p95_ms': round(percentile(latencies, 95), 3),
+            'p99_ms': round(percentile(latencies, 99), 3),
+            'throughput_rps': round(len(latencies) / wall, 1) if wall > 0 else 0.0,
+        })
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('log', help="JSONL request log (.gz accepted, '-' for stdin)")
+    parser.add_argument('--speed', type=float, default=1.0, help="replay speed multiplier; 0 sends as fast as possible")
+    parser.add_argument('--workers', type=int, default=16, help="concurrent requests in flight")
+    parser.add_argument('--limit', type=int, help="replay only the first N requests")
+    parser.add_argument('--url', help="replay over HTTP against this server instead of in-process")
+    parser.add_argument('--admin-username', default=None, help="admin login for --url (default: the app's demo admin)")
+    parser.add_argument('--admin-password', default=None)
+    parser.add_argument('--attendance-docs', type=int, default=1000, help="in-process seed data, as in load_test.py")
+    parser.add_argument('--events', type=int, default=50)
+    parser.add_argument('--records', type=int, default=200)
+    parser.add_argument('--registrations', type=int, default=2000)
+    parser.add_argument('--model-latency', type=float, default=0.05, help="stub Gemini latency in seconds (in-process)")
+    parser.add_argument('--verbose', action='store_true', help="show the app's own log output")
+    parser.add_argument('--output', help="write machine-readable results to this JSON file")
+    parser.add_argument('--compare', help="previous results JSON to compare against")
+    parser.add_argument('--threshold', type=float, default=0.2, help="relative change counted as a regression")
+    args = parser.parse_args()
+
+    campus_app = load_app(args.model_latency, use_caches=True)
+    if args.url:
+        target = HTTPTarget(args.url, args.admin_username or campus_app.ADMIN_USERNAME,
+                            args.admin_password or campus_app.ADMIN_PASSWORD)
+    else:
+        if not campus_app.db:
+            sys.exit("Storage backend failed to initialize; see the error above.")
+        seed(campus_app, args.attendance_docs, args.events, args.records, args.registrations)
+        target = InProcessTarget(campus_app)
+
+    requests_log = RequestLog(args.log, limit=args.limit)
+    app_output = contextlib.redirect_stdout(io.StringIO()) if not args.verbose else contextlib.nullcontext()
+    with app_output:
+        routes, wall, max_lag = replay(requests_log, target, route_labeler(campus_app.app), args.workers, args.speed)
+
+    results = report_rows(routes, wall)
+    total = sum(row['requests'] for row in results)
+    for row in results:
+        statuses = ' '.join(f"{status}:{count}" for status, count in row['statuses'].items())
+        print(f"{row['route']:<44} n {row['requests']:>6}  p50 {row['p50_ms']:>8} ms  p95 {row['p95_ms']:>8} ms  "
+              f"p99 {row['p99_ms']:>8} ms  {row['throughput_rps']:>8} rps  errors {row['errors']:>4}  [{statuses}]")
+    print(f"Replayed {total} requests in {wall:.1f}s ({total / wall if wall else 0:.1f} rps), "
+          f"{requests_log.skipped} malformed lines skipped, max schedule lag {max_lag * 1000:.0f} ms")
+
+    report = {
+        'revision': git_revision(),
+        'python': platform.python_version(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'parameters': vars(args),
+        'summary': {'requests': total, 'wall_seconds': round(wall, 3), 'skipped_lines': requests_log.skipped,
+                    'max_lag_ms': round(max_lag * 1000, 1)},
+        'routes': results,
+    }
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    if args.compare and compare(results, args.compare, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
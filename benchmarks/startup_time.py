@@ -0,0 +1,131 @@
+"""
+Startup cost of the SmartCampus app: import time and first-request latency.
+
+    python benchmarks/startup_time.py --runs 5
+    python benchmarks/startup_time.py --baseline HEAD~1 --output results/startup.json
+
+Each run imports app.py in a fresh interpreter (what every gunicorn worker
+fork or new instance pays), then times the first GET of each route and
+finally warm_up(), i.e. whatever client setup is still outstanding. Medians
+over the runs are reported. --baseline also measures a git revision of the
+tree (exported to a temporary directory) for a before/after comparison.
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+
+DEFAULT_PATHS = ['/', '/timetable', '/circulars', '/events']
+
+# Runs inside the fresh interpreter; prints one JSON line.
+CHILD = r"""
+import contextlib, io, json, os, sys, time
+app_dir, paths = sys.argv[1], json.loads(sys.argv[2])
+sys.path.insert(0, app_dir)
+os.chdir(app_dir)
+result = {'first_request_ms': {}}
+with contextlib.redirect_stdout(io.StringIO()):
+    started = time.perf_counter()
+    import app as campus_app
+    result['import_ms'] = (time.perf_counter() - started) * 1000
+    campus_app.app.template_folder = app_dir
+    client = campus_app.app.test_client()
+    for path in paths:
+        started = time.perf_counter()
+        status = client.get(path).status_code
+        result['first_request_ms'][path] = (time.perf_counter() - started) * 1000
+        result.setdefault('status', {})[path] = status
+    warm_up = getattr(campus_app, 'warm_up', None)
+    started = time.perf_counter()
+    if warm_up is not None:
+        warm_up()
+    result['warm_up_ms'] = (time.perf_counter() - started) * 1000
+result['modules'] = len(sys.modules)
+print(json.dumps(result))
+"""
+
+
+def run_once(app_dir, paths, env):
+    child = subprocess.run([sys.executable, '-c', CHILD, str(app_dir), json.dumps(paths)],
+                           env=env, capture_output=True, text=True)
+    if child.returncode != 0:
+        sys.stderr.write(child.stderr)
+        sys.exit(f"Measuring {app_dir} failed (exit status {child.returncode}); its output is above.")
+    return json.loads(child.stdout.strip().splitlines()[-1])
+
+
+def measure(app_dir, paths, runs, env):
+    samples = [run_once(app_dir, paths, env) for _ in range(runs)]
+    return {
+        'import_ms': round(statistics.median(s['import_ms'] for s in samples), 1),
+        'first_request_ms': {path: round(statistics.median(s['first_request_ms'][path] for s in samples), 1)
+                             for path in paths},
+        'warm_up_ms': round(statistics.median(s['warm_up_ms'] for s in samples), 1),
+        'status': samples[-1].get('status', {}),
+        'modules': samples[-1]['modules'],
+    }
+
+
+def export_revision(revision, target):
+    archive = subprocess.run(['git', 'archive', revision], cwd=REPO_ROOT, capture_output=True, check=True).stdout
+    subprocess.run(['tar', '-x', '-C', str(target)], input=archive, check=True)
+
+
+def git_revision(revision='HEAD'):
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', revision], cwd=REPO_ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def print_row(label, row, paths):
+    first = '  '.join(f"{path} {row['first_request_ms'][path]:>7} ms" for path in paths)
+    print(f"{label:<10} import {row['import_ms']:>7} ms  {first}  warm-up {row['warm_up_ms']:>7} ms  modules {row['modules']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5, help="fresh interpreters per tree")
+    parser.add_argument('--backend', choices=('sqlite', 'firestore'), default='sqlite',
+                        help="storage backend (firestore needs credentials or FIRESTORE_EMULATOR_HOST)")
+    parser.add_argument('--paths', nargs='+', default=DEFAULT_PATHS, help="routes to time, in request order")
+    parser.add_argument('--baseline', help="git revision to measure as well, e.g. HEAD~1")
+    parser.add_argument('--output', help="write machine-readable results to this JSON file")
+    args = parser.parse_args()
+
+    env = dict(os.environ, STORAGE_BACKEND=args.backend)
+    if args.backend == 'sqlite':
+        env['SQLITE_PATH'] = ':memory:'
+
+    results = {}
+    if args.baseline:
+        with tempfile.TemporaryDirectory() as baseline_dir:
+            export_revision(args.baseline, baseline_dir)
+            results[git_revision(args.baseline) or args.baseline] = measure(baseline_dir, args.paths, args.runs, env)
+    results['current'] = measure(REPO_ROOT, args.paths, args.runs, env)
+
+    for label, row in results.items():
+        print_row(label, row, args.paths)
+
+    report = {
+        'python': platform.python_version(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'parameters': vars(args),
+        'revisions': results,
+    }
+    if args.output:
+        Path(args.output).parent.mkdir(parents=True, exist_ok=True)
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+"""
+Compares per-operation latency of the storage backends.
+
+    python benchmarks/storage_latency.py --backend sqlite --docs 5000
+    python benchmarks/storage_latency.py --backend firestore --docs 500   # needs credentials or FIRESTORE_EMULATOR_HOST
+
+Runs the same operations app.py performs (add, set-merge, get, ordered
+stream, cursor page, where-equals, count, delete) against a scratch app id
+and prints p50/p95 latency in milliseconds per operation.
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+import uuid
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import storage
+
+
+def make_backend(name, sqlite_path):
+    if name == 'sqlite':
+        return storage.SQLiteStorage(sqlite_path)
+
+    import firebase_admin
+    from firebase_admin import credentials, firestore
+
+    if not firebase_admin._apps:
+        service_account_path = Path(__file__).resolve().parent.parent / "firebase-service-account.json"
+        firebase_admin.initialize_app(credentials.Certificate(service_account_path))
+    return storage.FirestoreStorage(firestore.client())
+
+
+def timed(samples, operation, fn):
+    started = time.perf_counter()
+    result = fn()
+    samples.setdefault(operation, []).append((time.perf_counter() - started) * 1000)
+    return result
+
+
+def percentile(values, pct):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+
+def run(backend, docs, repeats):
+    app_id = f"bench-{uuid.uuid4().hex[:8]}"
+    attendance = f"artifacts/{app_id}/public/data/attendance"
+    circulars = f"artifacts/{app_id}/public/data/circulars"
+    registrations = f"artifacts/{app_id}/public/data/registrations"
+    samples = {}
+
+    # Seed with batches so seeding time isn't what we measure.
+    for start in range(0, docs, 250):
+        batch = backend.batch()
+        for i in range(start, min(start + 250, docs)):
+            batch.set(attendance, f"S{i:06d}", {'percentage': i % 101, 'status': 'Good', 'timestamp': storage.SERVER_TIMESTAMP})
+            batch.set(registrations, None, {'event_id': f"E{i % 10}", 'user_id': uuid.uuid4().hex})
+        batch.commit()
+
+    for i in range(repeats):
+        timed(samples, 'add', lambda: backend.add(circulars, {'title': f"C{i}", 'details': 'x', 'timestamp': storage.SERVER_TIMESTAMP}))
+        timed(samples, 'set_merge', lambda: backend.set(attendance, f"S{i:06d}", {'percentage': 50, 'timestamp': storage.SERVER_TIMESTAMP}, merge=True))
+        timed(samples, 'get', lambda: backend.get(attendance, f"S{i:06d}"))
+        timed(samples, 'stream_ordered', lambda: list(backend.stream(circulars, order_by='timestamp', descending=True)))
+        timed(samples, 'page_50', lambda: list(backend.stream(attendance, order_by=storage.DOCUMENT_ID, limit=50, start_after=f"S{i:06d}")))
+        timed(samples, 'where_equals', lambda: list(backend.where_equals(registrations, 'event_id', 'E1', limit=50)))
+        timed(samples, 'count', lambda: backend.count(registrations, 'event_id', 'E1'))
+
+    for doc in list(backend.stream(circulars)):
+        timed(samples, 'delete', lambda: backend.delete(circulars, doc.id))
+
+    return {
+        operation: {
+            'p50_ms': round(statistics.median(values), 3),
+            'p95_ms': round(percentile(values, 95), 3),
+            'n': len(values),
+        }
+        for operation, values in samples.items()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--backend', choices=['sqlite', 'firestore'], default='sqlite')
+    parser.add_argument('--sqlite-path', default=':memory:')
+    parser.add_argument('--docs', type=int, default=5000, help="attendance and registration documents to seed")
+    parser.add_argument('--repeats', type=int, default=50)
+    args = parser.parse_args()
+
+    results = run(make_backend(args.backend, args.sqlite_path), args.docs, args.repeats)
+    print(json.dumps({'backend': args.backend, 'docs': args.docs, 'operations': results}, indent=2))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,144 @@
+import json
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+_DONE = object()
+
+
+class ChatPoolFull(Exception):
+    """Raised when every generation slot and queue slot is taken."""
+
+
+class StreamingChatPool:
+    """
+    Runs streaming Gemini generations on a dedicated thread pool so slow
+    generations never occupy the threads serving the Firestore pages.
+    At most `max_workers` generations run at once and at most `max_queued`
+    more wait for a slot; anything beyond that is rejected immediately.
+    Each generation hands its chunks to the response through a bounded queue;
+    a producer whose client has gone away gives up its slot within
+    `poll_interval` seconds instead of waiting out `chunk_timeout`.
+    """
+
+    def __init__(self, max_workers=8, max_queued=2, chunk_timeout=60, buffer_size=64, poll_interval=0.5):
+        self.max_workers = max_workers
+        self.max_queued = max_queued
+        self.chunk_timeout = chunk_timeout
+        self.buffer_size = buffer_size
+        self.poll_interval = poll_interval
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='chat-stream')
+        self._slots = threading.BoundedSemaphore(max_workers + max_queued)
+        self._lock = threading.Lock()
+        self.active = 0
+        self.rejected = 0
+        self.completed = 0
+        self.failed = 0
+
+    def stream(self, produce_chunks):
+        """
+        Schedules `produce_chunks()` (an iterable of text chunks) on the pool and
+        returns a ChunkStream yielding those chunks as they arrive.
+        Raises ChatPoolFull when the pool and its queue are saturated.
+        """
+        if not self._slots.acquire(blocking=False):
+            with self._lock:
+                self.rejected += 1
+            raise ChatPoolFull()
+
+        chunks = queue.Queue(maxsize=self.buffer_size)
+        cancelled = threading.Event()
+
+        def put(item):
+            # Short waits so a disconnected client is noticed promptly; returns False once cancelled.
+            deadline = time.monotonic() + self.chunk_timeout
+            while not cancelled.is_set():
+                try:
+                    chunks.put(item, timeout=self.poll_interval)
+                    return True
+                except queue.Full:
+                    if time.monotonic() >= deadline:
+                        raise
+            return False
+
+        def run():
+            with self._lock:
+                self.active += 1
+            try:
+                for chunk in produce_chunks():
+                    if not put(chunk):
+                        break
+                else:
+                    put(_DONE)
+                with self._lock:
+                    self.completed += 1
+            except Exception as e:
+                with self._lock:
+                    self.failed += 1
+                try:
+                    put(e)
+                except queue.Full:
+                    pass
+            finally:
+                with self._lock:
+                    self.active -= 1
+                self._slots.release()
+
+        self._executor.submit(run)
+        return ChunkStream(chunks, cancelled, self.chunk_timeout)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'active': self.active,
+                'completed': self.completed,
+                'failed': self.failed,
+                'rejected': self.rejected,
+                'max_workers': self.max_workers,
+                'max_queued': self.max_queued,
+            }
+
+
+class ChunkStream:
+    """
+    Iterator over one generation's chunks. close() stops the producer, and
+    works even if iteration never started (e.g. the client went away before
+    the response body was read), so callers should register it to run when
+    the response closes.
+    """
+
+    def __init__(self, chunks, cancelled, chunk_timeout):
+        self._chunks = chunks
+        self._cancelled = cancelled
+        self._chunk_timeout = chunk_timeout
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        if self._cancelled.is_set():
+            raise StopIteration
+        try:
+            item = self._chunks.get(timeout=self._chunk_timeout)
+        except BaseException:
+            self.close()
+            raise
+        if item is _DONE:
+            self.close()
+            raise StopIteration
+        if isinstance(item, Exception):
+            self.close()
+            raise item
+        return item
+
+    def close(self):
+        self._cancelled.set()
+
+
+def sse_event(data, event=None):
+    """Formats one server-sent event with a JSON payload."""
+    message = f"data: {json.dumps(data)}\n\n"
+    if event:
+        message = f"event: {event}\n" + message
+    return message
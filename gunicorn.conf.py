@@ -0,0 +1,32 @@
+# Gunicorn settings for SmartCampus AI.
+# Threaded workers keep long-lived chatbot streams (/get/stream) from occupying a whole
+# worker process; the Gemini generation itself runs on the app's own bounded chat pool.
+import os
+
+bind = os.environ.get("GUNICORN_BIND", "0.0.0.0:8000")
+workers = int(os.environ.get("GUNICORN_WORKERS", "2"))
+# Keep "gthread": the Firestore listeners, gRPC clients and the app's thread pools are not set up for
+# gevent/eventlet monkey-patching. Each open /live/<collection> stream holds one of the `threads` below,
+# so the app caps live streams at threads // 4 per worker and page requests always have threads left.
+worker_class = os.environ.get("GUNICORN_WORKER_CLASS", "gthread")
+threads = int(os.environ.get("GUNICORN_THREADS", "32"))
+# Streams can stay open for the full generation time.
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", "120"))
+
+# GUNICORN_PRELOAD=1 imports the app and the Gemini/Firebase SDK modules once in the master, so workers
+# fork with them already loaded. Clients are never created in the master (gRPC channels don't survive
+# fork); each worker creates its own on first use, or right after fork with GUNICORN_WARM_UP=1.
+preload_app = os.environ.get("GUNICORN_PRELOAD", "0") == "1"
+warm_up_workers = os.environ.get("GUNICORN_WARM_UP", "0") == "1"
+
+
+def when_ready(server):
+    if preload_app:
+        import app
+        app.import_sdks()
+
+
+def post_worker_init(worker):
+    if warm_up_workers:
+        import app
+        app.start_warm_up()
@@ -0,0 +1,137 @@
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict, namedtuple
+from datetime import datetime, timezone
+
+from flask import Response
+
+try:
+    import brotli
+except ImportError:  # Optional: without it responses are gzip-compressed only.
+    brotli = None
+
+# Bodies smaller than this aren't worth the compression overhead.
+MIN_COMPRESS_BYTES = 1024
+COMPRESSIBLE_MIMETYPES = ('text/html', 'text/plain', 'text/css', 'application/json', 'application/javascript')
+
+
+# A cached collection listing together with the validators computed when it was loaded
+# and each record's (doc_id, timestamp) key, which identifies its rendered fragment.
+Listing = namedtuple('Listing', ['records', 'version', 'keys'])
+ListingVersion = namedtuple('ListingVersion', ['token', 'last_modified'])
+
+
+def listing_version(collection_path, stamps):
+    """
+    Validators for a listing from its (doc_id, timestamp) pairs: a content hash
+    (changes on any create, update or delete) and the newest timestamp.
+    """
+    digest = hashlib.blake2b(collection_path.encode('utf-8'), digest_size=12)
+    newest = None
+    for doc_id, timestamp in stamps:
+        digest.update(f"\0{doc_id}\0{timestamp}".encode('utf-8'))
+        if isinstance(timestamp, datetime):
+            if timestamp.tzinfo is None:
+                timestamp = timestamp.replace(tzinfo=timezone.utc)
+            if newest is None or timestamp > newest:
+                newest = timestamp
+    return ListingVersion(digest.hexdigest(), newest)
+
+
+def listing_etag(version, *variant):
+    """ETag for a rendered listing; `variant` separates e.g. the admin and public HTML."""
+    return '-'.join((version.token,) + tuple(str(part) for part in variant))
+
+
+def not_modified(request, etag, last_modified):
+    """Returns a 304 response when the client's cached copy is still current, else None."""
+    if request.if_none_match:
+        if not request.if_none_match.contains_weak(etag):
+            return None
+    elif not (request.if_modified_since and last_modified
+              and last_modified.replace(microsecond=0) <= request.if_modified_since):
+        return None
+
+    response = Response(status=304)
+    add_validators(response, etag, last_modified)
+    return response
+
+
+def add_validators(response, etag, last_modified):
+    response.set_etag(etag, weak=True)
+    if last_modified is not None:
+        response.last_modified = last_modified
+    # Let browsers keep the page but revalidate on every load (cheap 304s).
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+class ResponseCompressor:
+    """
+    Compresses large text responses with brotli (when installed and accepted)
+    or gzip. Bodies of responses carrying an ETag are cached per encoding, so
+    a listing that hasn't changed is only compressed once.
+    """
+
+    def __init__(self, min_bytes=MIN_COMPRESS_BYTES, gzip_level=6, brotli_quality=5, max_cached=64):
+        self.min_bytes = min_bytes
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+        self.max_cached = max_cached
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+
+    def choose_encoding(self, accept_encodings):
+        if brotli is not None and accept_encodings['br']:
+            return 'br'
+        if accept_encodings['gzip']:
+            return 'gzip'
+        return None
+
+    def _compress(self, body, encoding):
+        if encoding == 'br':
+            return brotli.compress(body, quality=self.brotli_quality)
+        return gzip.compress(body, compresslevel=self.gzip_level)
+
+    def __call__(self, request, response):
+        if (response.direct_passthrough or response.is_streamed or response.status_code != 200
+                or 'Content-Encoding' in response.headers
+                or response.mimetype not in COMPRESSIBLE_MIMETYPES):
+            return response
+
+        encoding = self.choose_encoding(request.accept_encodings)
+        response.vary.add('Accept-Encoding')
+        if encoding is None:
+            return response
+
+        body = response.get_data()
+        if len(body) < self.min_bytes:
+            return response
+
+        etag, _ = response.get_etag()
+        cache_key = (etag, encoding) if etag else None
+        compressed = None
+        if cache_key:
+            with self._lock:
+                compressed = self._cache.get(cache_key)
+                if compressed is not None:
+                    self._cache.move_to_end(cache_key)
+
+        if compressed is None:
+            compressed = self._compress(body, encoding)
+            if cache_key:
+                with self._lock:
+                    self._cache[cache_key] = compressed
+                    while len(self._cache) > self.max_cached:
+                        self._cache.popitem(last=False)
+
+        response.set_data(compressed)
+        response.headers['Content-Encoding'] = encoding
+        return response
+
+
+def file_stamp(path):
+    """Short token for a file's modification time, so ETags change when a template is redeployed."""
+    return format(int(os.path.getmtime(path)), 'x')
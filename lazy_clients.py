@@ -0,0 +1,89 @@
+import os
+import threading
+import time
+
+_UNSET = object()
+
+
+class LazyResource:
+    """
+    An expensive client (SDK import, credentials, connection) created on first
+    use instead of at import. get() calls `factory()` once; threads arriving
+    while it runs wait for that call rather than starting their own. A factory
+    that raises leaves the resource unavailable: get() returns None, from then
+    on as the eager setup did, or, with `retry_after`, until that many seconds
+    have passed and the next get() calls `factory()` again. A forked child
+    starts uninitialized, so gRPC channels are never shared between a
+    preloading master and its workers.
+    """
+
+    def __init__(self, name, factory, retry_after=None):
+        self.name = name
+        self._factory = factory
+        self.retry_after = retry_after
+        self._reset()
+        if hasattr(os, 'register_at_fork'):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        self._value = _UNSET
+        self._lock = threading.Lock()
+        self.error = None
+        self.init_seconds = None
+        self._retry_at = None
+
+    def _retry_due(self):
+        return self._retry_at is not None and time.monotonic() >= self._retry_at
+
+    def get(self):
+        value = self._value
+        if value is not _UNSET and not self._retry_due():
+            return value
+        with self._lock:
+            if self._value is _UNSET or self._retry_due():
+                started = time.perf_counter()
+                try:
+                    value = self._factory()
+                    self.error = None
+                    self._retry_at = None
+                except Exception as e:
+                    print(f"CRITICAL ERROR: {self.name} setup failed. Root Cause: {e}")
+                    self.error = str(e)
+                    value = None
+                    if self.retry_after is not None:
+                        self._retry_at = time.monotonic() + self.retry_after
+                self.init_seconds = time.perf_counter() - started
+                self._value = value
+            return self._value
+
+    @property
+    def initialized(self):
+        return self._value is not _UNSET
+
+    def status(self):
+        return {
+            'initialized': self.initialized,
+            'available': self.initialized and self._value is not None,
+            'init_seconds': round(self.init_seconds, 4) if self.init_seconds is not None else None,
+            'error': self.error,
+        }
+
+
+class LazyProxy:
+    """
+    Stands in for a LazyResource's value in module globals. Attribute access
+    creates the resource and forwards to it; truthiness says whether it is
+    available, so `if not db:` replaces the eager `if db is None:`.
+    """
+
+    def __init__(self, resource):
+        self._resource = resource
+
+    def __bool__(self):
+        return self._resource.get() is not None
+
+    def __getattr__(self, name):
+        value = self._resource.get()
+        if value is None:
+            raise RuntimeError(f"{self._resource.name} is unavailable")
+        return getattr(value, name)
@@ -0,0 +1,355 @@
+import bisect
+import itertools
+import json
+import threading
+import uuid
+from collections import deque, namedtuple
+
+from storage import DOCUMENT_ID, Document
+
+# One document change from a change feed; `data` is None for removals.
+Change = namedtuple('Change', ['type', 'doc_id', 'data'])
+
+ADDED, MODIFIED, REMOVED = 'added', 'modified', 'removed'
+
+
+class SubscribersFull(Exception):
+    """Raised when the broadcaster already has `max_subscribers` open streams."""
+
+
+# =======================================================================
+# CHANGE FEEDS
+# =======================================================================
+
+class FirestoreChangeFeed:
+    """
+    One Firestore on_snapshot listener per watched collection. The first
+    snapshot delivers every document and is passed on as the initial state.
+    """
+
+    def __init__(self, client):
+        self.client = client
+
+    def subscribe(self, collection_path, callback):
+        """Calls `callback(changes, initial)` from the listener thread; returns an unsubscribe function."""
+        first = [True]
+
+        def on_snapshot(col_snapshot, changes, read_time):
+            initial, first[0] = first[0], False
+            callback([Change(change.type.name.lower(), change.document.id,
+                             None if change.type.name == 'REMOVED' else change.document.to_dict())
+                      for change in changes], initial)
+
+        watch = self.client.collection(collection_path).on_snapshot(on_snapshot)
+        return watch.unsubscribe
+
+
+class LocalChangeFeed:
+    """
+    In-process change feed. Subscribers get the collection's current documents
+    from `store` (if given) and then whatever is published. The app publishes
+    its own writes here when the backend has no listeners (SQLite, single
+    process), and tests drive the views by publishing changes by hand.
+    """
+
+    def __init__(self, store=None):
+        self.store = store
+        self._callbacks = {}
+        self._lock = threading.Lock()
+
+    def _snapshot(self, collection_path):
+        if self.store is None:
+            return []
+        return [Change(ADDED, doc.id, doc.data) for doc in self.store.stream(collection_path)]
+
+    def subscribe(self, collection_path, callback):
+        with self._lock:
+            self._callbacks.setdefault(collection_path, []).append(callback)
+        callback(self._snapshot(collection_path), True)
+
+        def unsubscribe():
+            with self._lock:
+                self._callbacks.get(collection_path, []).remove(callback)
+        return unsubscribe
+
+    def watching(self, collection_path):
+        with self._lock:
+            return bool(self._callbacks.get(collection_path))
+
+    def publish(self, collection_path, changes, initial=False):
+        with self._lock:
+            callbacks = list(self._callbacks.get(collection_path, ()))
+        for callback in callbacks:
+            callback(changes, initial)
+
+    def refresh(self, collection_path):
+        """Re-reads the whole collection from the store and publishes it as a new initial state (after bulk writes)."""
+        if self.store is None or not self.watching(collection_path):
+            return
+        self.publish(collection_path, self._snapshot(collection_path), initial=True)
+
+
+# =======================================================================
+# MATERIALIZED VIEW
+# =======================================================================
+
+class MaterializedView:
+    """
+    In-memory copy of one collection, kept current by a change feed and
+    ordered like the equivalent storage query (`order_by`, `descending`;
+    documents without the order field are left out, as Firestore does).
+    The sorted document list and anything built from it are cached until
+    the next change.
+    """
+
+    def __init__(self, collection_path, order_by=DOCUMENT_ID, descending=False):
+        self.collection_path = collection_path
+        self.order_by = order_by
+        self.descending = descending
+        self.version = 0
+        self.ready = threading.Event()
+        self._docs = {}
+        self._sorted = None
+        self._built = {}
+        self._lock = threading.Lock()
+
+    def _sort_key(self, doc_id, data):
+        return doc_id if self.order_by == DOCUMENT_ID else data.get(self.order_by)
+
+    def apply(self, changes, initial=False):
+        """Applies a batch of changes; an initial batch replaces the whole view."""
+        with self._lock:
+            if initial:
+                self._docs = {}
+            for change in changes:
+                if change.type == REMOVED:
+                    self._docs.pop(change.doc_id, None)
+                else:
+                    self._docs[change.doc_id] = change.data
+            self.version += 1
+            self._sorted = None
+            self._built = {}
+        self.ready.set()
+
+    def get(self, doc_id):
+        with self._lock:
+            return self._docs.get(doc_id)
+
+    def __len__(self):
+        return len(self._docs)
+
+    def _documents(self):
+        # Caller holds the lock.
+        if self._sorted is None:
+            keyed = [(self._sort_key(doc_id, data), doc_id, data) for doc_id, data in self._docs.items()]
+            keyed = [item for item in keyed if item[0] is not None]
+            keyed.sort(key=lambda item: item[0], reverse=self.descending)
+            self._sorted = ([item[0] for item in keyed], [Document(doc_id, data) for _, doc_id, data in keyed])
+        return self._sorted
+
+    def documents(self):
+        with self._lock:
+            return self._documents()[1]
+
+    def stream(self, limit=None, start_after=None):
+        """Same paging semantics as storage stream() with this view's ordering."""
+        with self._lock:
+            keys, docs = self._documents()
+        start = 0
+        if start_after is not None:
+            if self.descending:
+                start = next((i for i, key in enumerate(keys) if key < start_after), len(keys))
+            else:
+                start = bisect.bisect_right(keys, start_after)
+        return docs[start:start + limit] if limit else docs[start:]
+
+    def build(self, builder):
+        """Returns `builder(collection_path, documents)`, cached until the view changes."""
+        with self._lock:
+            version = self.version
+            built = self._built.get(builder)
+            if built is not None:
+                return built
+            docs = self._documents()[1]
+        built = builder(self.collection_path, docs)
+        with self._lock:
+            if self.version == version:
+                self._built[builder] = built
+        return built
+
+
+# =======================================================================
+# SSE FAN-OUT
+# =======================================================================
+
+class ChangeBroadcaster:
+    """
+    Fans change events out to server-sent-event streams. Each event is
+    serialized once into a shared ring buffer of the last `history` events;
+    subscribers only keep a cursor into it, so an idle connection costs a
+    waiting thread (or greenlet) and nothing per event it isn't sent.
+    Event ids are "<epoch>-<seq>", where the epoch is random per broadcaster,
+    so reconnecting clients resume from Last-Event-ID only when it was issued
+    by this broadcaster and is still buffered; any other id (another worker,
+    a restarted process, an evicted event) gets a "reset" telling the page to
+    reload.
+    """
+
+    def __init__(self, history=1000, max_subscribers=5000, heartbeat=25):
+        self.epoch = uuid.uuid4().hex[:8]
+        self.history = history
+        self.max_subscribers = max_subscribers
+        self.heartbeat = heartbeat
+        self._events = deque(maxlen=history)
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._closed = False
+        self.subscribers = 0
+        self.rejected = 0
+        self.published = 0
+
+    def publish(self, topic, event, data):
+        with self._cond:
+            self._seq += 1
+            message = f"id: {self.epoch}-{self._seq}\nevent: {event}\ndata: {json.dumps(data, default=str)}\n\n"
+            self._events.append((self._seq, topic, message))
+            self.published += 1
+            self._cond.notify_all()
+
+    def _resume_cursor(self, last_event_id):
+        # Caller holds the condition. None means the id wasn't issued by this broadcaster.
+        epoch, _, seq = last_event_id.partition('-')
+        if epoch != self.epoch or not seq.isdigit() or int(seq) > self._seq:
+            return None
+        return int(seq)
+
+    def _pending(self, cursor):
+        # Caller holds the condition. None means the cursor fell out of the buffer.
+        if cursor >= self._seq:
+            return []
+        oldest = self._seq - len(self._events) + 1
+        if cursor + 1 < oldest:
+            return None
+        return list(itertools.islice(self._events, cursor + 1 - oldest, None))
+
+    def subscribe(self, topics, last_event_id=None):
+        """
+        Returns a generator of SSE messages for `topics` (a set), resuming
+        after `last_event_id` when given. Raises SubscribersFull when
+        `max_subscribers` streams are already open.
+        """
+        with self._cond:
+            if self.subscribers >= self.max_subscribers:
+                self.rejected += 1
+                raise SubscribersFull()
+            self.subscribers += 1
+            cursor = self._seq
+            resume = self._resume_cursor(last_event_id) if last_event_id is not None else cursor
+            if resume is not None:
+                cursor = resume
+
+        def stream():
+            nonlocal cursor
+            try:
+                yield "retry: 5000\n\n"
+                if resume is None:
+                    yield f"id: {self.epoch}-{cursor}\nevent: reset\ndata: {{}}\n\n"
+                while True:
+                    with self._cond:
+                        pending = self._pending(cursor)
+                        if pending == [] and not self._closed:
+                            self._cond.wait(self.heartbeat)
+                            pending = self._pending(cursor)
+                        if self._closed:
+                            return
+                        latest = self._seq
+                    if pending is None:
+                        cursor = latest
+                        yield f"id: {self.epoch}-{latest}\nevent: reset\ndata: {{}}\n\n"
+                        continue
+                    if not pending:
+                        # Comment line: keeps proxies from closing the idle connection and detects gone clients.
+                        yield ": keepalive\n\n"
+                        continue
+                    for seq, topic, message in pending:
+                        cursor = seq
+                        if topic in topics:
+                            yield message
+            finally:
+                with self._cond:
+                    self.subscribers -= 1
+
+        return stream()
+
+    def close(self):
+        """Ends every open stream (shutdown hook)."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+
+    def stats(self):
+        with self._cond:
+            return {
+                'subscribers': self.subscribers,
+                'max_subscribers': self.max_subscribers,
+                'rejected': self.rejected,
+                'published': self.published,
+                'buffered_events': len(self._events),
+            }
+
+
+# =======================================================================
+# LIVE COLLECTIONS
+# =======================================================================
+
+class LiveCollections:
+    """
+    Wires watched collections to their views and the broadcaster: every change
+    batch updates the view, then each change is published to the collection's
+    topic as a "change" event (payload from `to_payload(doc_id, data)`), or a
+    "reset" event for a new initial state after the first one.
+    """
+
+    def __init__(self, feed, broadcaster):
+        self.feed = feed
+        self.broadcaster = broadcaster
+        self._views = {}
+        self._unsubscribes = []
+
+    def watch(self, collection_path, topic, to_payload, order_by=DOCUMENT_ID, descending=False):
+        view = MaterializedView(collection_path, order_by=order_by, descending=descending)
+        self._views[collection_path] = view
+
+        def on_changes(changes, initial):
+            was_ready = view.ready.is_set()
+            view.apply(changes, initial=initial)
+            if initial:
+                if was_ready:
+                    self.broadcaster.publish(topic, 'reset', {'collection': topic})
+                return
+            for change in changes:
+                record = None if change.type == REMOVED else to_payload(change.doc_id, change.data)
+                self.broadcaster.publish(topic, 'change', {
+                    'collection': topic, 'type': change.type, 'id': change.doc_id, 'record': record})
+
+        self._unsubscribes.append(self.feed.subscribe(collection_path, on_changes))
+        return view
+
+    def view(self, collection_path):
+        """The collection's view once its initial snapshot has arrived, else None (callers read storage)."""
+        view = self._views.get(collection_path)
+        return view if view is not None and view.ready.is_set() else None
+
+    def close(self):
+        for unsubscribe in self._unsubscribes:
+            try:
+                unsubscribe()
+            except Exception as e:
+                print(f"Live view listener shutdown error: {e}")
+        self.broadcaster.close()
+
+    def stats(self):
+        stats = {f"{view.collection_path.rsplit('/', 1)[-1]}_documents": len(view) for view in self._views.values()}
+        stats['views_ready'] = sum(1 for view in self._views.values() if view.ready.is_set())
+        stats.update(self.broadcaster.stats())
+        return stats
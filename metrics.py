@@ -0,0 +1,293 @@
+import contextvars
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from sub-millisecond cache hits to multi-second Gemini calls.
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+# The breakdown of the request currently being handled on this thread (None outside a request).
+_current_breakdown = contextvars.ContextVar('request_breakdown', default=None)
+
+
+class Histogram:
+    """Cumulative-bucket histogram, one series per label set."""
+
+    def __init__(self, name, help_text, label_names, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = buckets
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.label_names)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = {'buckets': [0] * len(self.buckets), 'sum': 0.0, 'count': 0}
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series['buckets'][i] += 1
+            series['sum'] += value
+            series['count'] += 1
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            for key, series in sorted(self._series.items()):
+                pairs = list(zip(self.label_names, key))
+                labels = _format_labels(pairs)
+                for bound, count in zip(self.buckets, series['buckets']):
+                    lines.append(f"{self.name}_bucket{_format_labels(pairs, le=bound)} {count}")
+                lines.append(f"{self.name}_bucket{_format_labels(pairs, le='+Inf')} {series['count']}")
+                lines.append(f"{self.name}_sum{labels} {series['sum']:.6f}")
+                lines.append(f"{self.name}_count{labels} {series['count']}")
+        return lines
+
+
+class Counter:
+    """Monotonic counter, one series per label set."""
+
+    def __init__(self, name, help_text, label_names):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._series = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.label_names)
+        with self._lock:
+            self._series[key] = self._series.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            for key, value in sorted(self._series.items()):
+                lines.append(f"{self.name}{_format_labels(zip(self.label_names, key))} {value}")
+        return lines
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(pairs, le=None):
+    parts = [f'{name}="{_escape(value)}"' for name, value in pairs]
+    if le is not None:
+        parts.append(f'le="{le}"')
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+# =======================================================================
+# METRICS USED BY THE APP
+# =======================================================================
+
+request_duration = Histogram(
+    'smartcampus_request_duration_seconds', 'Time to handle a request, including streaming the body.',
+    ('method', 'route', 'status'))
+span_duration = Histogram(
+    'smartcampus_span_duration_seconds', 'Time spent in backend calls and rendering, by kind and operation.',
+    ('kind', 'operation', 'target'))
+storage_documents = Counter(
+    'smartcampus_storage_documents_total', 'Documents returned by storage reads.',
+    ('operation', 'target'))
+span_errors = Counter(
+    'smartcampus_span_errors_total', 'Backend calls that raised an exception.',
+    ('kind', 'operation', 'target'))
+
+_collectors = []
+
+
+def add_stats_collector(component, stats_fn):
+    """Registers a function returning a flat dict of numbers; exported as smartcampus_component_stat gauges."""
+    _collectors.append((component, stats_fn))
+
+
+def render_prometheus():
+    """All metrics in the Prometheus text exposition format (per worker process)."""
+    lines = []
+    for metric in (request_duration, span_duration, storage_documents, span_errors):
+        lines.extend(metric.render())
+
+    lines.append("# HELP smartcampus_component_stat Counters and gauges reported by caches, pools and buffers.")
+    lines.append("# TYPE smartcampus_component_stat gauge")
+    for component, stats_fn in _collectors:
+        stats = stats_fn()
+        if not stats:
+            continue
+        for stat, value in sorted(stats.items()):
+            if isinstance(value, bool) or not isinstance(value, (int, float)):
+                continue
+            lines.append(f'smartcampus_component_stat{{component="{component}",stat="{stat}"}} {value}')
+    return '\n'.join(lines) + '\n'
+
+
+# =======================================================================
+# REQUEST BREAKDOWN & SPANS
+# =======================================================================
+
+class RequestBreakdown:
+    """Collects the spans of one request so slow requests can be logged with where their time went."""
+
+    def __init__(self, method, path):
+        self.method = method
+        self.path = path
+        self.started = time.perf_counter()
+        self.spans = []
+        self._lock = threading.Lock()
+
+    def add(self, kind, operation, target, seconds, docs=None):
+        with self._lock:
+            self.spans.append((kind, operation, target, seconds, docs))
+
+    def describe(self, total_seconds):
+        parts = []
+        accounted = 0.0
+        for kind, operation, target, seconds, docs in self.spans:
+            accounted += seconds
+            doc_note = f", {docs} docs" if docs is not None else ""
+            parts.append(f"{kind}.{operation}[{target}] {seconds * 1000:.1f}ms{doc_note}")
+        parts.append(f"other {max(total_seconds - accounted, 0.0) * 1000:.1f}ms")
+        return "; ".join(parts)
+
+
+def start_request(method, path):
+    breakdown = RequestBreakdown(method, path)
+    token = _current_breakdown.set(breakdown)
+    return breakdown, token
+
+
+def end_request(token):
+    _current_breakdown.reset(token)
+
+
+def record_span(kind, operation, target, seconds, docs=None, error=False):
+    span_duration.observe(seconds, kind=kind, operation=operation, target=target)
+    if docs is not None:
+        storage_documents.inc(docs, operation=operation, target=target)
+    if error:
+        span_errors.inc(kind=kind, operation=operation, target=target)
+    breakdown = _current_breakdown.get()
+    if breakdown is not None:
+        breakdown.add(kind, operation, target, seconds, docs)
+
+
+@contextmanager
+def span(kind, operation, target=''):
+    """Times the enclosed block as one span of the current request."""
+    started = time.perf_counter()
+    error = False
+    try:
+        yield
+    except Exception:
+        error = True
+        raise
+    finally:
+        record_span(kind, operation, target, time.perf_counter() - started, error=error)
+
+
+# =======================================================================
+# STORAGE INSTRUMENTATION
+# =======================================================================
+
+def collection_label(collection_path):
+    """
+    Low-cardinality label for a collection path: the collection names below
+    artifacts/<app_id>/public/data, without document ids
+    (e.g. ".../registration_stats/<event_id>/shards" -> "registration_stats/shards").
+    """
+    segments = collection_path.split('/')
+    if len(segments) > 4 and segments[0] == 'artifacts':
+        return '/'.join(segments[4::2])
+    return '/'.join(segments[::2])
+
+
+class InstrumentedStorage:
+    """Wraps a storage backend and records a span for every call (streams are timed only while fetching)."""
+
+    def __init__(self, backend):
+        self.backend = backend
+        self.name = backend.name
+
+    def _timed(self, operation, collection_path, fn, *args, **kwargs):
+        with span('storage', operation, collection_label(collection_path)):
+            return fn(collection_path, *args, **kwargs)
+
+    def add(self, collection_path, data):
+        return self._timed('add', collection_path, self.backend.add, data)
+
+    def set(self, collection_path, doc_id, data, merge=False):
+        return self._timed('set', collection_path, self.backend.set, doc_id, data, merge=merge)
+
+    def delete(self, collection_path, doc_id):
+        return self._timed('delete', collection_path, self.backend.delete, doc_id)
+
+    def get(self, collection_path, doc_id):
+        started = time.perf_counter()
+        error = False
+        found = None
+        try:
+            found = self.backend.get(collection_path, doc_id)
+            return found
+        except Exception:
+            error = True
+            raise
+        finally:
+            record_span('storage', 'get', collection_label(collection_path), time.perf_counter() - started,
+                        docs=0 if found is None else 1, error=error)
+
+    def _timed_stream(self, operation, collection_path, iterator):
+        target = collection_label(collection_path)
+        elapsed = 0.0
+        docs = 0
+        error = False
+        try:
+            while True:
+                started = time.perf_counter()
+                try:
+                    doc = next(iterator)
+                except StopIteration:
+                    elapsed += time.perf_counter() - started
+                    return
+                elapsed += time.perf_counter() - started
+                docs += 1
+                yield doc
+        except Exception:
+            error = True
+            raise
+        finally:
+            record_span('storage', operation, target, elapsed, docs=docs, error=error)
+
+    def stream(self, collection_path, **kwargs):
+        return self._timed_stream('stream', collection_path, iter(self.backend.stream(collection_path, **kwargs)))
+
+    def where_equals(self, collection_path, field, value, limit=None):
+        return self._timed_stream('where_equals', collection_path,
+                                  iter(self.backend.where_equals(collection_path, field, value, limit=limit)))
+
+    def count(self, collection_path, field=None, value=None):
+        return self._timed('count', collection_path, self.backend.count, field, value)
+
+    def batch(self):
+        return _InstrumentedBatch(self.backend.batch())
+
+
+class _InstrumentedBatch:
+    def __init__(self, batch):
+        self._batch = batch
+        self._targets = set()
+
+    def set(self, collection_path, doc_id, data, merge=False):
+        self._targets.add(collection_label(collection_path))
+        return self._batch.set(collection_path, doc_id, data, merge=merge)
+
+    def delete(self, collection_path, doc_id):
+        self._targets.add(collection_label(collection_path))
+        return self._batch.delete(collection_path, doc_id)
+
+    def commit(self):
+        with span('storage', 'batch_commit', ','.join(sorted(self._targets))):
+            return self._batch.commit()
@@ -0,0 +1,95 @@
+import threading
+from collections import OrderedDict
+
+from markupsafe import Markup
+
+
+class PageCache:
+    """
+    Rendered pages kept as encoded bytes under their ETag. Pages that are the
+    same for every request are rendered once per template file; listing pages
+    once per listing version and variant (admin/public). LRU-bounded.
+    """
+
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._pages = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get_or_render(self, etag, render):
+        """Returns the cached bytes for `etag`, calling `render()` (returning str) on a miss."""
+        with self._lock:
+            body = self._pages.get(etag)
+            if body is not None:
+                self._pages.move_to_end(etag)
+                self.hits += 1
+                return body
+            self.misses += 1
+        body = render().encode('utf-8')
+        with self._lock:
+            self._pages[etag] = body
+            self._pages.move_to_end(etag)
+            while len(self._pages) > self.max_entries:
+                self._pages.popitem(last=False)
+        return body
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._pages),
+                'bytes': sum(len(body) for body in self._pages.values()),
+                'hits': self.hits,
+                'misses': self.misses,
+            }
+
+
+class FragmentCache:
+    """
+    Rendered HTML of single listing records, keyed by variant (template and
+    admin/public) plus the record's (doc_id, timestamp), so a listing that
+    changed re-renders only the records whose timestamp moved. LRU-bounded.
+    """
+
+    def __init__(self, max_entries=5000):
+        self.max_entries = max_entries
+        self._fragments = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, variant, keys, records, render_one):
+        """Returns Markup for each record, calling `render_one(record)` only for records not cached under `variant`."""
+        with self._lock:
+            fragments = []
+            missing = []
+            for i, key in enumerate(keys):
+                fragment = self._fragments.get((variant, key))
+                if fragment is not None:
+                    self._fragments.move_to_end((variant, key))
+                fragments.append(fragment)
+                if fragment is None:
+                    missing.append(i)
+            self.hits += len(keys) - len(missing)
+            self.misses += len(missing)
+        if not missing:
+            return fragments
+
+        rendered = {}
+        for i in missing:
+            fragments[i] = rendered[(variant, keys[i])] = Markup(render_one(records[i]))
+        with self._lock:
+            self._fragments.update(rendered)
+            while len(self._fragments) > self.max_entries:
+                self._fragments.popitem(last=False)
+        return fragments
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._fragments),
+                'hits': self.hits,
+                'misses': self.misses,
+                'max_entries': self.max_entries,
+            }
@@ -0,0 +1,188 @@
+import threading
+import time
+from collections import namedtuple
+
+# A token bucket: `burst` requests at once, refilled at `per_second`.
+Rate = namedtuple('Rate', ['per_second', 'burst'])
+
+
+def parse_rate(text):
+    """'30/60' -> a burst of 30 requests refilled at 30 per 60 seconds. '0' or '' disables the limit (None)."""
+    text = (text or '').strip()
+    if text in ('', '0'):
+        return None
+    count, _, seconds = text.partition('/')
+    count, seconds = int(count), float(seconds or 1)
+    if count <= 0 or seconds <= 0:
+        raise ValueError(f"Invalid rate limit {text!r}; expected '<requests>/<seconds>'")
+    return Rate(count / seconds, count)
+
+
+# =======================================================================
+# BUCKET STORES
+# =======================================================================
+
+class MemoryBucketStore:
+    """
+    Token buckets in this process's memory (so each worker limits on its own).
+    Buckets that have refilled completely carry no state and are dropped when
+    the store reaches `max_keys`.
+    """
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, rate, burst, cost=1):
+        """Takes `cost` tokens if available; returns (allowed, seconds until they would be)."""
+        now = time.monotonic()
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                if len(self._buckets) >= self.max_keys:
+                    self._prune(now)
+                tokens = burst
+            else:
+                tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            allowed = tokens >= cost
+            if allowed:
+                tokens -= cost
+            self._buckets[key] = (tokens, now, now + (burst - tokens) / rate)
+        return allowed, 0.0 if allowed else (cost - tokens) / rate
+
+    def _prune(self, now):
+        # Caller holds the lock.
+        full = [key for key, bucket in self._buckets.items() if bucket[2] <= now]
+        for key in full:
+            del self._buckets[key]
+        if len(self._buckets) >= self.max_keys:
+            # Every bucket is active: forget the oldest tenth rather than grow without bound.
+            for key in list(self._buckets)[:max(1, self.max_keys // 10)]:
+                del self._buckets[key]
+
+    def __len__(self):
+        return len(self._buckets)
+
+
+# Refill and take in one round trip, on Redis's clock so app servers' clocks don't matter.
+_REDIS_TOKEN_BUCKET = """
+local rate, burst, cost = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'stamp')
+local tokens = tonumber(state[1]) or burst
+local stamp = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - stamp) * rate)
+local allowed, retry_after = 0, (cost - tokens) / rate
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed, retry_after = 1, 0
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'stamp', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil((burst - tokens) / rate * 1000) + 1000)
+return {allowed, tostring(retry_after)}
+"""
+
+
+class RedisBucketStore:
+    """
+    Token buckets in Redis, shared by every worker and instance. `client` is a
+    redis-py client (the redis package is only needed when this store is used).
+    """
+
+    def __init__(self, client, prefix='smartcampus:rate:'):
+        self.prefix = prefix
+        self._script = client.register_script(_REDIS_TOKEN_BUCKET)
+
+    def take(self, key, rate, burst, cost=1):
+        allowed, retry_after = self._script(keys=[self.prefix + key], args=[rate, burst, cost])
+        return bool(allowed), float(retry_after)
+
+
+# =======================================================================
+# LIMITERS
+# =======================================================================
+
+class RateLimiter:
+    """
+    Per-client token buckets for named route groups (`rates`: group -> Rate,
+    or None for unlimited). If the store fails, requests are let through: a
+    broken shared store shouldn't take the site down with it.
+    """
+
+    def __init__(self, store, rates):
+        self.store = store
+        self.rates = rates
+        self._lock = threading.Lock()
+        self._failing = False
+        self.allowed = 0
+        self.limited = {group: 0 for group in rates}
+        self.store_errors = 0
+
+    def check(self, group, client):
+        """Returns (allowed, retry_after_seconds) for one request from `client` to `group`."""
+        rate = self.rates.get(group)
+        if rate is None:
+            return True, 0.0
+        try:
+            allowed, retry_after = self.store.take(f"{group}:{client}", rate.per_second, rate.burst)
+        except Exception as e:
+            with self._lock:
+                self.store_errors += 1
+                if not self._failing:
+                    print(f"Rate limit store error (letting requests through): {e}")
+                self._failing = True
+            return True, 0.0
+        with self._lock:
+            self._failing = False
+            if allowed:
+                self.allowed += 1
+            else:
+                self.limited[group] += 1
+        return allowed, retry_after
+
+    def stats(self):
+        with self._lock:
+            stats = {f"limited_{group}": count for group, count in self.limited.items()}
+            stats.update(allowed=self.allowed, store_errors=self.store_errors)
+        if isinstance(self.store, MemoryBucketStore):
+            stats['buckets'] = len(self.store)
+        return stats
+
+
+class ConcurrencyLimiter:
+    """
+    Caps the requests in flight in this worker. try_acquire() never waits, so
+    requests over the cap are shed straight away instead of queueing behind
+    the ones already running. `max_in_flight` of 0 means no cap.
+    """
+
+    def __init__(self, max_in_flight):
+        self.max_in_flight = max_in_flight
+        self._lock = threading.Lock()
+        self.in_flight = 0
+        self.peak = 0
+        self.shed = 0
+
+    def try_acquire(self):
+        with self._lock:
+            if self.max_in_flight and self.in_flight >= self.max_in_flight:
+                self.shed += 1
+                return False
+            self.in_flight += 1
+            self.peak = max(self.peak, self.in_flight)
+            return True
+
+    def release(self):
+        with self._lock:
+            self.in_flight -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                'in_flight': self.in_flight,
+                'peak_in_flight': self.peak,
+                'max_in_flight': self.max_in_flight,
+                'shed': self.shed,
+            }
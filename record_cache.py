@@ -0,0 +1,73 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class CollectionCache:
+    """
+    In-process read-through cache for Firestore collection listings.
+    Entries are keyed by (app_id, collection_path), expire after `ttl` seconds
+    and the least recently used entry is evicted once `max_entries` is reached.
+    One instance is shared by all request threads of a worker.
+    """
+
+    def __init__(self, ttl=60, max_entries=128):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._generations = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get_or_load(self, app_id, collection_path, loader):
+        """Returns the cached value for the collection, calling `loader()` on a miss or expiry."""
+        key = (app_id, collection_path)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            generation = self._generations.get(key, 0)
+
+        value = loader()
+
+        with self._lock:
+            # An admin write landed while we were loading; don't cache the stale listing.
+            if self._generations.get(key, 0) != generation:
+                return value
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+        return value
+
+    def invalidate(self, app_id, collection_path):
+        """Drops the cached listing for one collection (called after admin writes)."""
+        key = (app_id, collection_path)
+        with self._lock:
+            self._generations[key] = self._generations.get(key, 0) + 1
+            if self._entries.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'invalidations': self.invalidations,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0.0,
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+            }
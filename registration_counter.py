@@ -0,0 +1,91 @@
+import random
+from datetime import datetime, timezone
+
+from storage import Document, Increment
+
+# Shard holding the registrations recorded before the event had counters.
+BASELINE_SHARD = 'baseline'
+
+
+class RegistrationCounter:
+    """
+    Sharded per-event registration counters.
+    Each event owns `shard_count` shard documents under
+    `<stats_path>/<event_id>/shards/<n>`, each holding a running `count` and an
+    `hourly` map of UTC hour -> registrations. A registration increments one
+    random shard in the same atomic batch as the registration document, so
+    reads cost `shard_count` documents instead of one per registration.
+    Registrations the shards never saw (written before counters existed) are
+    counted once and kept in an extra `baseline` shard.
+    """
+
+    def __init__(self, shard_count=10, backfill_attempts=3):
+        self.shard_count = shard_count
+        self.backfill_attempts = backfill_attempts
+
+    def shards_path(self, stats_path, event_id):
+        return f"{stats_path}/{event_id}/shards"
+
+    def add_to_batch(self, batch, registrations_path, stats_path, registration_id, registration_data, now=None):
+        """Adds the registration write and one shard increment to `batch` (two writes)."""
+        now = now or datetime.now(timezone.utc)
+        hour_key = now.strftime('%Y-%m-%dT%H')
+        shard_id = str(random.randrange(self.shard_count))
+
+        registration_id = batch.set(registrations_path, registration_id, registration_data)
+        batch.set(self.shards_path(stats_path, registration_data['event_id']), shard_id, {
+            'count': Increment(1),
+            'hourly': {hour_key: Increment(1)},
+        }, merge=True)
+        return registration_id
+
+    def add_registration(self, store, registrations_path, stats_path, registration_data, now=None):
+        """Writes the registration and bumps a counter shard atomically. Returns the registration doc id."""
+        batch = store.batch()
+        registration_id = self.add_to_batch(batch, registrations_path, stats_path, None, registration_data, now)
+        batch.commit()
+        return registration_id
+
+    def read_stats(self, store, registrations_path, stats_path, event_id):
+        """Sums the shards for one event, backfilling the baseline shard the first time the event is read."""
+        shards = list(store.stream(self.shards_path(stats_path, event_id)))
+        if not any(shard.id == BASELINE_SHARD for shard in shards):
+            shards = self._backfill(store, registrations_path, stats_path, event_id, shards)
+
+        total = 0
+        hourly = {}
+        for shard in shards:
+            data = shard.data or {}
+            total += data.get('count', 0)
+            for hour_key, count in (data.get('hourly') or {}).items():
+                hourly[hour_key] = hourly.get(hour_key, 0) + count
+
+        return {
+            'total': total,
+            'per_hour': [{'hour': hour_key, 'count': hourly[hour_key]} for hour_key in sorted(hourly)],
+        }
+
+    def _backfill(self, store, registrations_path, stats_path, event_id, shards):
+        """
+        Writes the baseline shard: registrations for the event minus those the
+        shards already count. A registration and its shard increment commit
+        together, so if the shards read the same before and after the count
+        aggregation, no registration landed in between and the difference is exact.
+        If no attempt sees the shards hold still, the difference is only an
+        estimate: it is returned for this read but not stored, so the next read
+        tries again.
+        """
+        shards_path = self.shards_path(stats_path, event_id)
+        for _ in range(self.backfill_attempts):
+            counted = sum((shard.data or {}).get('count', 0) for shard in shards)
+            total = store.count(registrations_path, 'event_id', event_id)
+            baseline = {'count': max(0, total - counted)}
+            again = list(store.stream(shards_path))
+            if any(shard.id == BASELINE_SHARD for shard in again):
+                return again  # Another worker backfilled first.
+            if sum((shard.data or {}).get('count', 0) for shard in again) == counted:
+                store.set(shards_path, BASELINE_SHARD, baseline)
+                return shards + [Document(BASELINE_SHARD, baseline)]
+            estimate = shards + [Document(BASELINE_SHARD, baseline)]
+            shards = again
+        return estimate
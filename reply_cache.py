@@ -0,0 +1,134 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+_WHITESPACE = re.compile(r"\s+")
+_TRAILING_PUNCTUATION = re.compile(r"[\s?!.,;:]+$")
+
+
+def normalize_prompt(prompt):
+    """Lower-cases, collapses whitespace and drops trailing punctuation so near-identical questions share a key."""
+    text = _WHITESPACE.sub(' ', prompt.strip().lower())
+    return _TRAILING_PUNCTUATION.sub('', text)
+
+
+class ReplyCache:
+    """
+    LRU/TTL cache of chatbot replies keyed by the normalized prompt, with
+    single-flight coalescing: while one request is generating a reply for a
+    prompt, identical concurrent prompts wait for that result instead of
+    making their own upstream call.
+    """
+
+    def __init__(self, ttl=600, max_entries=512):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._in_flight = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        self.upstream_calls = 0
+        self.upstream_seconds = 0.0
+        self.saved_seconds = 0.0
+
+    def get_or_generate(self, prompt, generate, timeout=None):
+        """
+        Returns the reply text for `prompt`, calling `generate(prompt)` only when no cached or in-flight result exists.
+        Requests waiting on another's in-flight call give up after `timeout` seconds
+        (concurrent.futures.TimeoutError); pass the timeout `generate` itself uses.
+        """
+        key = normalize_prompt(prompt)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                self.saved_seconds += entry[2]
+                return entry[1]
+
+            future = self._in_flight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                is_leader = False
+            else:
+                self.misses += 1
+                future = Future()
+                self._in_flight[key] = future
+                is_leader = True
+
+        if not is_leader:
+            reply = future.result(timeout=timeout)
+            with self._lock:
+                self.saved_seconds += self._entries.get(key, (0, None, 0.0))[2]
+            return reply
+
+        started = time.perf_counter()
+        try:
+            reply = generate(prompt)
+        except Exception as e:
+            with self._lock:
+                self._in_flight.pop(key, None)
+            future.set_exception(e)
+            raise
+        latency = time.perf_counter() - started
+
+        with self._lock:
+            self.upstream_calls += 1
+            self.upstream_seconds += latency
+            self._entries[key] = (time.monotonic() + self.ttl, reply, latency)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._in_flight.pop(key, None)
+        future.set_result(reply)
+        return reply
+
+    def peek(self, prompt):
+        """Returns a fresh cached reply for `prompt` (counting a hit), or None."""
+        key = normalize_prompt(prompt)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= time.monotonic():
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            self.saved_seconds += entry[2]
+            return entry[1]
+
+    def put(self, prompt, reply, latency=0.0):
+        """Stores a reply produced outside get_or_generate (e.g. by the streaming endpoint)."""
+        key = normalize_prompt(prompt)
+        with self._lock:
+            self.misses += 1
+            self.upstream_calls += 1
+            self.upstream_seconds += latency
+            self._entries[key] = (time.monotonic() + self.ttl, reply, latency)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses + self.coalesced
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'coalesced': self.coalesced,
+                'hit_rate': round((self.hits + self.coalesced) / lookups, 4) if lookups else 0.0,
+                'upstream_calls': self.upstream_calls,
+                'avg_upstream_latency_seconds': round(self.upstream_seconds / self.upstream_calls, 4) if self.upstream_calls else 0.0,
+                'saved_latency_seconds': round(self.saved_seconds, 3),
+                'entries': len(self._entries),
+                'max_entries': self.max_entries,
+                'ttl_seconds': self.ttl,
+            }
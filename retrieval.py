@@ -0,0 +1,232 @@
+import hashlib
+import heapq
+import math
+import re
+import threading
+import time
+from collections import Counter, namedtuple
+
+from reply_cache import normalize_prompt
+
+_TOKEN = re.compile(r"[a-z0-9]+")
+_SENTENCE = re.compile(r"(?<=[.!?])\s+|\n+")
+
+# Words too common in questions and notices to help ranking.
+STOPWORDS = frozenset("""
+a an and are as at be by can do does for from has have how i in is it its me my of on or our please tell
+that the their there this to was were what when where which who will with you your about any
+""".split())
+
+SNIPPET_CHARS = 300
+
+# One indexed record. `answer` is what an exact-title FAQ hit replies with.
+Entry = namedtuple('Entry', ['label', 'title', 'body', 'answer', 'stamp'])
+Hit = namedtuple('Hit', ['key', 'label', 'title', 'snippet', 'stamp', 'score'])
+
+
+def tokenize(text):
+    return [token for token in _TOKEN.findall(text.lower()) if token not in STOPWORDS]
+
+
+def _snippet(body, query_terms):
+    """The sentence sharing the most terms with the query, trimmed to SNIPPET_CHARS."""
+    sentences = [sentence.strip() for sentence in _SENTENCE.split(body) if sentence.strip()]
+    if not sentences:
+        return ''
+    best = max(sentences, key=lambda sentence: len(query_terms.intersection(tokenize(sentence))))
+    return best if len(best) <= SNIPPET_CHARS else best[:SNIPPET_CHARS - 3].rstrip() + '...'
+
+
+class BM25Index:
+    """
+    Okapi BM25 over short records, with an inverted index that is updated one
+    record at a time (upsert/remove), so admin writes never need a rebuild.
+    Records whose normalized title equals a normalized question are kept in
+    a separate map for exact FAQ-style answers.
+    """
+
+    def __init__(self, k1=1.5, b=0.75):
+        self.k1 = k1
+        self.b = b
+        self._entries = {}
+        self._terms = {}
+        self._lengths = {}
+        self._postings = {}
+        self._titles = {}
+        self._total_length = 0
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def upsert(self, key, entry):
+        with self._lock:
+            self.remove(key)
+            terms = Counter(tokenize(f"{entry.title} {entry.title} {entry.body}"))
+            self._entries[key] = entry
+            self._terms[key] = terms
+            self._lengths[key] = sum(terms.values())
+            self._total_length += self._lengths[key]
+            for term, frequency in terms.items():
+                self._postings.setdefault(term, {})[key] = frequency
+            title = normalize_prompt(entry.title)
+            if title:
+                self._titles.setdefault(title, set()).add(key)
+
+    def remove(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is None:
+                return
+            terms = self._terms.pop(key)
+            self._total_length -= self._lengths.pop(key)
+            for term in terms:
+                postings = self._postings[term]
+                del postings[key]
+                if not postings:
+                    del self._postings[term]
+            title = normalize_prompt(entry.title)
+            keys = self._titles.get(title)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._titles[title]
+
+    def exact_match(self, question):
+        """The record whose title is exactly the (normalized) question, if there is exactly one."""
+        with self._lock:
+            keys = self._titles.get(normalize_prompt(question))
+            if keys is None or len(keys) != 1:
+                return None
+            return self._entries[next(iter(keys))]
+
+    def search(self, query, k=3):
+        with self._lock:
+            query_terms = set(tokenize(query))
+            count = len(self._entries)
+            if not query_terms or not count:
+                return []
+            average_length = self._total_length / count
+            scores = {}
+            for term in query_terms:
+                postings = self._postings.get(term)
+                if not postings:
+                    continue
+                idf = math.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+                for key, frequency in postings.items():
+                    length = self._lengths[key]
+                    norm = frequency * (self.k1 + 1) / (
+                        frequency + self.k1 * (1 - self.b + self.b * length / average_length))
+                    scores[key] = scores.get(key, 0.0) + idf * norm
+            best = heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+            return [Hit(key, self._entries[key].label, self._entries[key].title,
+                        _snippet(self._entries[key].body, query_terms), self._entries[key].stamp, round(score, 4))
+                    for key, score in best]
+
+
+class CampusRetriever:
+    """
+    Grounds chatbot questions in campus records: one BM25Index per app id,
+    built on first use from `loader(app_id)` (an iterable of (key, Entry))
+    and rebuilt after `ttl` seconds so other workers' writes show up. This
+    worker's own writes are applied with upsert/remove.
+    """
+
+    def __init__(self, ttl=600, top_k=3, min_score=0.5):
+        self.ttl = ttl
+        self.top_k = top_k
+        self.min_score = min_score
+        self._indexes = {}
+        self._lock = threading.Lock()
+        self._stats_lock = threading.Lock()
+        self.questions = 0
+        self.bypassed = 0
+        self.grounded = 0
+        self.search_seconds = 0.0
+        self.builds = 0
+
+    def index(self, app_id, loader):
+        entry = self._indexes.get(app_id)
+        if entry is not None and time.monotonic() - entry[0] < self.ttl:
+            return entry[1]
+        with self._lock:
+            entry = self._indexes.get(app_id)
+            if entry is not None and time.monotonic() - entry[0] < self.ttl:
+                return entry[1]
+            index = BM25Index()
+            for key, record in loader(app_id):
+                index.upsert(key, record)
+            self._indexes[app_id] = (time.monotonic(), index)
+            self.builds += 1
+            return index
+
+    def is_built(self, app_id):
+        return app_id in self._indexes
+
+    def upsert(self, app_id, key, entry):
+        built = self._indexes.get(app_id)
+        if built is not None:
+            built[1].upsert(key, entry)
+
+    def remove(self, app_id, key):
+        built = self._indexes.get(app_id)
+        if built is not None:
+            built[1].remove(key)
+
+    def invalidate(self, app_id):
+        with self._lock:
+            self._indexes.pop(app_id, None)
+
+    def ground(self, app_id, question, loader):
+        """
+        Returns (faq_answer, hits). A non-None faq_answer means a record's title
+        matched the question exactly and can be sent without calling the model.
+        """
+        index = self.index(app_id, loader)
+        started = time.perf_counter()
+        faq = index.exact_match(question)
+        hits = [] if faq is not None else [hit for hit in index.search(question, self.top_k) if hit.score >= self.min_score]
+        elapsed = time.perf_counter() - started
+        with self._stats_lock:
+            self.questions += 1
+            self.search_seconds += elapsed
+            if faq is not None:
+                self.bypassed += 1
+            elif hits:
+                self.grounded += 1
+        return (faq.answer if faq is not None else None), hits
+
+    def stats(self):
+        with self._stats_lock:
+            return {
+                'questions': self.questions,
+                'model_bypassed': self.bypassed,
+                'bypass_rate': round(self.bypassed / self.questions, 4) if self.questions else 0.0,
+                'grounded': self.grounded,
+                'avg_search_seconds': round(self.search_seconds / self.questions, 6) if self.questions else 0.0,
+                'indexed_records': sum(len(index) for _, index in self._indexes.values()),
+                'builds': self.builds,
+                'ttl_seconds': self.ttl,
+            }
+
+
+def build_prompt(question, hits):
+    """Prompt for Gemini with the retrieved records as context; the bare question when nothing matched."""
+    if not hits:
+        return question
+    context = "\n".join(f"[{i}] {hit.label}: {hit.title} (updated {hit.stamp}) - {hit.snippet}"
+                        for i, hit in enumerate(hits, 1))
+    return ("You are the SmartCampus AI assistant. Use the campus records below when they answer the "
+            "student's question and mention which record you used. If they don't cover it, answer from "
+            "general knowledge and say the campus records don't mention it.\n\n"
+            f"Campus records:\n{context}\n\nStudent question: {question}")
+
+
+def context_fingerprint(hits):
+    """Short hash of which records (and which versions) grounded a reply; part of the reply cache key."""
+    if not hits:
+        return ''
+    digest = hashlib.blake2b(digest_size=8)
+    for hit in hits:
+        digest.update(f"{hit.key}@{hit.stamp}\0".encode('utf-8'))
+    return digest.hexdigest()
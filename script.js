@@ -1,9 +1,30 @@
 function sendMessage() {
     let text = document.getElementById("userInput").value;
+    let replyElement = document.getElementById("reply");
+    let reply = "";
 
-    fetch(`/get?msg=${text}`)
-    .then(response => response.json())
-    .then(data => {
-        document.getElementById("reply").innerText = data.reply;
+    replyElement.innerText = "";
+
+    // Stream the reply token by token; fall back to the plain endpoint if SSE fails before any text arrives.
+    const source = new EventSource(`/get/stream?msg=${encodeURIComponent(text)}`);
+
+    source.onmessage = (event) => {
+        reply += JSON.parse(event.data).token;
+        replyElement.innerText = reply;
+    };
+
+    source.addEventListener("done", () => source.close());
+
+    source.addEventListener("error", (event) => {
+        source.close();
+        if (event.data) {
+            replyElement.innerText = JSON.parse(event.data).message;
+        } else if (reply === "") {
+            fetch(`/get?msg=${encodeURIComponent(text)}`)
+            .then(response => response.json())
+            .then(data => {
+                replyElement.innerText = data.reply;
+            });
+        }
     });
 }
@@ -0,0 +1,363 @@
+"""
+Storage backends for SmartCampus AI.
+
+Routes talk to a small document-store interface instead of the Firestore
+client directly, so the app can also run fully offline on SQLite (local
+development, load tests, or when Firebase is unavailable).
+
+Every backend provides:
+    add(collection_path, data) -> doc_id
+    set(collection_path, doc_id, data, merge=False)
+    delete(collection_path, doc_id)
+    get(collection_path, doc_id) -> dict or None
+    stream(collection_path, order_by=None, descending=False, limit=None, start_after=None) -> iterator of Document
+        (start_after without order_by pages by document ID)
+    where_equals(collection_path, field, value, limit=None) -> iterator of Document
+    count(collection_path, field=None, value=None) -> int
+    batch() -> object with set(collection_path, doc_id, data, merge=False) -> doc_id, delete(...), commit()
+
+Values may contain the SERVER_TIMESTAMP and Increment(n) sentinels; each
+backend resolves them the way Firestore does.
+"""
+import json
+import re
+import sqlite3
+import threading
+import uuid
+from collections import namedtuple
+from datetime import datetime, timezone
+
+# Order by / start after the document ID instead of a field.
+DOCUMENT_ID = '__name__'
+
+Document = namedtuple('Document', ['id', 'data'])
+
+
+class _ServerTimestamp:
+    def __repr__(self):
+        return 'SERVER_TIMESTAMP'
+
+
+SERVER_TIMESTAMP = _ServerTimestamp()
+
+
+class Increment:
+    """Atomically adds `value` to a numeric field (missing fields count as 0)."""
+
+    def __init__(self, value):
+        self.value = value
+
+
+# =======================================================================
+# FIRESTORE BACKEND
+# =======================================================================
+
+class FirestoreStorage:
+    """Storage backed by a firebase_admin Firestore client."""
+
+    name = 'firestore'
+
+    def __init__(self, client):
+        from firebase_admin import firestore
+        from google.cloud.firestore_v1.base_query import FieldFilter
+
+        self.client = client
+        self._firestore = firestore
+        self._field_filter = FieldFilter
+
+    def _translate(self, value):
+        if value is SERVER_TIMESTAMP:
+            return self._firestore.SERVER_TIMESTAMP
+        if isinstance(value, Increment):
+            return self._firestore.Increment(value.value)
+        if isinstance(value, dict):
+            return {key: self._translate(item) for key, item in value.items()}
+        return value
+
+    def _field(self, field):
+        return self._firestore.FieldPath.document_id() if field == DOCUMENT_ID else field
+
+    def add(self, collection_path, data):
+        _, doc_ref = self.client.collection(collection_path).add(self._translate(data))
+        return doc_ref.id
+
+    def set(self, collection_path, doc_id, data, merge=False):
+        self.client.collection(collection_path).document(doc_id).set(self._translate(data), merge=merge)
+
+    def delete(self, collection_path, doc_id):
+        self.client.collection(collection_path).document(doc_id).delete()
+
+    def get(self, collection_path, doc_id):
+        snapshot = self.client.collection(collection_path).document(doc_id).get()
+        return snapshot.to_dict() if snapshot.exists else None
+
+    def stream(self, collection_path, order_by=None, descending=False, limit=None, start_after=None):
+        if start_after is not None and not order_by:
+            order_by = DOCUMENT_ID
+        query = self.client.collection(collection_path)
+        if order_by:
+            direction = self._firestore.Query.DESCENDING if descending else self._firestore.Query.ASCENDING
+            query = query.order_by(self._field(order_by), direction=direction)
+            if start_after is not None:
+                query = query.start_after({self._field(order_by): start_after})
+        if limit:
+            query = query.limit(limit)
+        for doc in query.stream():
+            yield Document(doc.id, doc.to_dict())
+
+    def _where(self, collection_path, field, value):
+        return self.client.collection(collection_path).where(filter=self._field_filter(field, '==', value))
+
+    def where_equals(self, collection_path, field, value, limit=None):
+        query = self._where(collection_path, field, value)
+        if limit:
+            query = query.limit(limit)
+        for doc in query.stream():
+            yield Document(doc.id, doc.to_dict())
+
+    def count(self, collection_path, field=None, value=None):
+        # Server-side count aggregation: Firestore returns the number without streaming the documents.
+        if field is None:
+            query = self.client.collection(collection_path)
+        else:
+            query = self._where(collection_path, field, value)
+        results = query.count(alias='total').get()
+        return int(results[0][0].value)
+
+    def batch(self):
+        return _FirestoreBatch(self)
+
+
+class _FirestoreBatch:
+    def __init__(self, storage):
+        self._storage = storage
+        self._batch = storage.client.batch()
+
+    def set(self, collection_path, doc_id, data, merge=False):
+        doc_ref = self._storage.client.collection(collection_path).document(doc_id)
+        self._batch.set(doc_ref, self._storage._translate(data), merge=merge)
+        return doc_ref.id
+
+    def delete(self, collection_path, doc_id):
+        self._batch.delete(self._storage.client.collection(collection_path).document(doc_id))
+
+    def commit(self):
+        self._batch.commit()
+
+
+# =======================================================================
+# SQLITE BACKEND
+# =======================================================================
+
+# Fields the app filters or orders on get real, indexed columns. Attendance
+# documents are keyed by student_id, so the primary key covers that lookup.
+INDEXED_FIELDS = ('timestamp', 'event_id')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    collection TEXT NOT NULL,
+    doc_id     TEXT NOT NULL,
+    data       TEXT NOT NULL,
+    timestamp  TEXT,
+    event_id   TEXT,
+    PRIMARY KEY (collection, doc_id)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_documents_timestamp ON documents (collection, timestamp);
+CREATE INDEX IF NOT EXISTS idx_documents_event_id ON documents (collection, event_id);
+"""
+
+_FIELD_NAME = re.compile(r"^[A-Za-z_][A-Za-z0-9_]*$")
+
+
+def _json_default(value):
+    if isinstance(value, datetime):
+        return {'__datetime__': _as_utc(value).isoformat()}
+    raise TypeError(f"Cannot store value of type {type(value).__name__}")
+
+
+def _json_object_hook(obj):
+    if len(obj) == 1 and '__datetime__' in obj:
+        return datetime.fromisoformat(obj['__datetime__'])
+    return obj
+
+
+def _as_utc(value):
+    return value.replace(tzinfo=timezone.utc) if value.tzinfo is None else value.astimezone(timezone.utc)
+
+
+def _column_value(value):
+    """Value stored in an indexed column; datetimes become fixed-width UTC strings so they sort correctly."""
+    if isinstance(value, datetime):
+        return _as_utc(value).strftime('%Y-%m-%dT%H:%M:%S.%fZ')
+    return value
+
+
+def _resolve(existing, updates, now):
+    """Applies `updates` on top of `existing` (deep merge for maps), resolving sentinels."""
+    result = dict(existing)
+    for key, value in updates.items():
+        if value is SERVER_TIMESTAMP:
+            result[key] = now
+        elif isinstance(value, Increment):
+            current = result.get(key)
+            result[key] = (current if isinstance(current, (int, float)) else 0) + value.value
+        elif isinstance(value, dict):
+            current = result.get(key)
+            result[key] = _resolve(current if isinstance(current, dict) else {}, value, now)
+        else:
+            result[key] = value
+    return result
+
+
+def _check_field(field):
+    if not _FIELD_NAME.match(field):
+        raise ValueError(f"Unsupported field name for SQLite storage: {field!r}")
+    return field
+
+
+class SQLiteStorage:
+    """
+    Storage in a single SQLite table of JSON documents keyed by (collection, doc_id).
+    `timestamp` and `event_id` are copied into indexed columns so ordered
+    listings, cursor pagination and where/count on event_id stay index scans.
+    One connection is shared by all threads behind a lock; WAL keeps file
+    databases responsive while a write is in progress.
+    """
+
+    name = 'sqlite'
+
+    def __init__(self, path=':memory:'):
+        self.path = str(path)
+        self._conn = sqlite3.connect(self.path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.RLock()
+        with self._lock:
+            if self.path != ':memory:':
+                self._conn.execute('PRAGMA journal_mode=WAL')
+                self._conn.execute('PRAGMA synchronous=NORMAL')
+            self._conn.executescript(_SCHEMA)
+
+    # --- Internal helpers -------------------------------------------------
+
+    def _load(self, collection_path, doc_id):
+        row = self._conn.execute(
+            'SELECT data FROM documents WHERE collection = ? AND doc_id = ?', (collection_path, doc_id)).fetchone()
+        return json.loads(row[0], object_hook=_json_object_hook) if row else None
+
+    def _write(self, collection_path, doc_id, data, merge, now):
+        existing = (self._load(collection_path, doc_id) or {}) if merge else {}
+        document = _resolve(existing, data, now)
+        self._conn.execute(
+            'INSERT OR REPLACE INTO documents (collection, doc_id, data, timestamp, event_id) VALUES (?, ?, ?, ?, ?)',
+            (collection_path, doc_id, json.dumps(document, default=_json_default),
+             _column_value(document.get('timestamp')), _column_value(document.get('event_id'))))
+
+    def _order_expression(self, field):
+        if field == DOCUMENT_ID:
+            return 'doc_id'
+        if field in INDEXED_FIELDS:
+            return field
+        return f"json_extract(data, '$.{_check_field(field)}')"
+
+    def _rows(self, sql, params):
+        with self._lock:
+            rows = self._conn.execute(sql, params).fetchall()
+        for doc_id, data in rows:
+            yield Document(doc_id, json.loads(data, object_hook=_json_object_hook))
+
+    def _run_writes(self, writes):
+        now = datetime.now(timezone.utc)
+        with self._lock:
+            self._conn.execute('BEGIN IMMEDIATE')
+            try:
+                for operation, collection_path, doc_id, data, merge in writes:
+                    if operation == 'set':
+                        self._write(collection_path, doc_id, data, merge, now)
+                    else:
+                        self._conn.execute(
+                            'DELETE FROM documents WHERE collection = ? AND doc_id = ?', (collection_path, doc_id))
+                self._conn.execute('COMMIT')
+            except Exception:
+                self._conn.execute('ROLLBACK')
+                raise
+
+    # --- Storage interface ------------------------------------------------
+
+    def add(self, collection_path, data):
+        doc_id = uuid.uuid4().hex[:20]
+        self.set(collection_path, doc_id, data)
+        return doc_id
+
+    def set(self, collection_path, doc_id, data, merge=False):
+        self._run_writes([('set', collection_path, doc_id, data, merge)])
+
+    def delete(self, collection_path, doc_id):
+        self._run_writes([('delete', collection_path, doc_id, None, False)])
+
+    def get(self, collection_path, doc_id):
+        with self._lock:
+            return self._load(collection_path, doc_id)
+
+    def stream(self, collection_path, order_by=None, descending=False, limit=None, start_after=None):
+        if start_after is not None and not order_by:
+            order_by = DOCUMENT_ID
+        sql = 'SELECT doc_id, data FROM documents WHERE collection = ?'
+        params = [collection_path]
+        if order_by:
+            expression = self._order_expression(order_by)
+            if start_after is not None:
+                sql += f" AND {expression} {'<' if descending else '>'} ?"
+                params.append(_column_value(start_after))
+            # Firestore sorts missing values first; NULLs do the same in ascending SQLite order.
+            sql += f" ORDER BY {expression} {'DESC' if descending else 'ASC'}"
+        if limit:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        return self._rows(sql, params)
+
+    def _where_clause(self, field, value):
+        if field == DOCUMENT_ID:
+            return 'doc_id = ?', value
+        if field in INDEXED_FIELDS:
+            return f'{field} = ?', _column_value(value)
+        return f"json_extract(data, '$.{_check_field(field)}') = ?", value
+
+    def where_equals(self, collection_path, field, value, limit=None):
+        clause, param = self._where_clause(field, value)
+        sql = f'SELECT doc_id, data FROM documents WHERE collection = ? AND {clause}'
+        params = [collection_path, param]
+        if limit:
+            sql += ' LIMIT ?'
+            params.append(limit)
+        return self._rows(sql, params)
+
+    def count(self, collection_path, field=None, value=None):
+        sql = 'SELECT COUNT(*) FROM documents WHERE collection = ?'
+        params = [collection_path]
+        if field is not None:
+            clause, param = self._where_clause(field, value)
+            sql += f' AND {clause}'
+            params.append(param)
+        with self._lock:
+            return self._conn.execute(sql, params).fetchone()[0]
+
+    def batch(self):
+        return _SQLiteBatch(self)
+
+
+class _SQLiteBatch:
+    def __init__(self, storage):
+        self._storage = storage
+        self._writes = []
+
+    def set(self, collection_path, doc_id, data, merge=False):
+        doc_id = doc_id or uuid.uuid4().hex[:20]
+        self._writes.append(('set', collection_path, doc_id, data, merge))
+        return doc_id
+
+    def delete(self, collection_path, doc_id):
+        self._writes.append(('delete', collection_path, doc_id, None, False))
+
+    def commit(self):
+        # One transaction per batch, like a Firestore WriteBatch.
+        self._storage._run_writes(self._writes)
+        self._writes = []
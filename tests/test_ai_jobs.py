@@ -0,0 +1,122 @@
+import threading
+import time
+
+import pytest
+
+from ai_jobs import AIJobQueue, JobQueueFull, ModelRegistry
+
+
+class Flaky:
+    """A call that raises for its first `failures` invocations, then returns a result."""
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise RuntimeError(f"upstream error {self.calls}")
+        return {'report': 'ok'}
+
+
+def test_retries_until_success():
+    jobs = AIJobQueue(max_workers=1, retries=2, backoff=0.001)
+    call = Flaky(failures=2)
+
+    status = jobs.wait(jobs.submit('summary', call), timeout=5)
+
+    assert status['status'] == 'done'
+    assert status['result'] == {'report': 'ok'}
+    assert status['attempts'] == 3
+    assert jobs.stats()['retried'] == 2
+    assert jobs.stats()['succeeded'] == 1
+
+
+def test_fails_after_the_last_retry():
+    jobs = AIJobQueue(max_workers=1, retries=1, backoff=0.001)
+    call = Flaky(failures=5)
+
+    status = jobs.wait(jobs.submit('summary', call), timeout=5)
+
+    assert call.calls == 2
+    assert status['status'] == 'failed'
+    assert status['error'] == 'upstream error 2'
+    assert status['finished_at'] is not None
+    assert jobs.stats()['failed'] == 1
+    assert jobs.stats()['pending'] == 0
+
+
+def test_rejects_jobs_over_max_pending():
+    release = threading.Event()
+    jobs = AIJobQueue(max_workers=1, max_pending=2)
+    first = jobs.submit('summary', lambda: release.wait(5) and {})
+    jobs.submit('summary', lambda: {})
+
+    with pytest.raises(JobQueueFull):
+        jobs.submit('summary', lambda: {})
+    assert jobs.stats()['rejected'] == 1
+
+    release.set()
+    jobs.wait(first, timeout=5)
+    jobs.wait(jobs.submit('summary', lambda: {}), timeout=5)
+
+
+def test_history_keeps_unfinished_jobs():
+    release = threading.Event()
+    jobs = AIJobQueue(max_workers=1, max_history=2)
+    running = jobs.submit('summary', lambda: release.wait(5) and {})
+    queued = [jobs.submit('summary', lambda: {}) for _ in range(2)]
+
+    # Nothing has finished, so nothing can be dropped yet.
+    assert all(jobs.status(job_id) is not None for job_id in [running] + queued)
+
+    release.set()
+    for job_id in [running] + queued:
+        jobs.wait(job_id, timeout=5)
+    jobs.wait(jobs.submit('summary', lambda: {}), timeout=5)
+    assert jobs.status(running) is None
+    assert jobs.status('unknown') is None
+
+
+def test_model_registry_creates_each_model_once():
+    created = []
+    registry = ModelRegistry(factory=lambda name: created.append(name) or object())
+
+    threads = [threading.Thread(target=registry.get, args=('gemini',)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert created == ['gemini']
+    assert registry.is_loaded('gemini')
+    assert not registry.is_loaded('other')
+
+
+def test_model_registry_retries_a_failed_factory_after_the_cooldown():
+    attempts = []
+
+    def factory(name):
+        attempts.append(name)
+        if len(attempts) == 1:
+            raise RuntimeError("no API key")
+        return 'model'
+
+    registry = ModelRegistry(factory=factory, fallback='fallback', retry_after=0.05)
+
+    assert registry.get('gemini') == 'fallback'
+    assert registry.get('gemini') == 'fallback'  # Still cooling down: no second attempt yet.
+    assert len(attempts) == 1
+    time.sleep(0.06)
+    assert registry.get('gemini') == 'model'
+    assert registry.get('gemini') == 'model'
+    assert len(attempts) == 2
+
+
+def test_model_registry_without_fallback_raises():
+    registry = ModelRegistry(factory=lambda name: 1 / 0)
+
+    with pytest.raises(ZeroDivisionError):
+        registry.get('gemini')
+    assert not registry.is_loaded('gemini')
@@ -0,0 +1,198 @@
+import io
+import json
+import threading
+import time
+
+import pytest
+
+import attendance_import
+from attendance_import import detect_format, import_attendance, iter_raw_rows, validate_row
+from storage import SQLiteStorage
+
+COLLECTION = 'artifacts/test/public/data/attendance'
+
+
+class FakeStore:
+    """
+    Wraps a SQLiteStorage: records the size of every batch commit and how many
+    ran at once, and fails the commits whose numbers (from 1) are in `fail_commits`.
+    """
+
+    def __init__(self, fail_commits=(), commit_delay=0.0):
+        self.store = SQLiteStorage(':memory:')
+        self.fail_commits = set(fail_commits)
+        self.commit_delay = commit_delay
+        self.batch_sizes = []
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self._lock = threading.Lock()
+
+    def batch(self):
+        return FakeBatch(self, self.store.batch())
+
+    def get(self, collection_path, doc_id):
+        return self.store.get(collection_path, doc_id)
+
+
+class FakeBatch:
+    def __init__(self, owner, batch):
+        self.owner = owner
+        self.batch = batch
+        self.writes = 0
+
+    def set(self, collection_path, doc_id, data, merge=False):
+        self.writes += 1
+        return self.batch.set(collection_path, doc_id, data, merge=merge)
+
+    def commit(self):
+        owner = self.owner
+        with owner._lock:
+            owner.batch_sizes.append(self.writes)
+            number = len(owner.batch_sizes)
+            owner.in_flight += 1
+            owner.peak_in_flight = max(owner.peak_in_flight, owner.in_flight)
+        try:
+            time.sleep(owner.commit_delay)
+            if number in owner.fail_commits:
+                raise RuntimeError("deadline exceeded")
+            self.batch.commit()
+        finally:
+            with owner._lock:
+                owner.in_flight -= 1
+
+
+def rows_from(text, file_format):
+    return list(iter_raw_rows(io.BytesIO(text.encode('utf-8')), file_format))
+
+
+def csv_text(count):
+    return 'student_id,percentage,status\n' + ''.join(f"s{n:05d},{n % 101},Good\n" for n in range(count))
+
+
+# --- Parsing ----------------------------------------------------------------
+
+def test_detect_format():
+    assert detect_format('roster.csv') == 'csv'
+    assert detect_format('roster.JSONL') == 'jsonl'
+    assert detect_format('roster.ndjson') == 'jsonl'
+    assert detect_format(None) == 'csv'
+    assert detect_format('roster.csv', 'JSONL') == 'jsonl'
+
+
+def test_csv_rows_are_numbered_after_the_header():
+    rows = rows_from('\ufeffstudent_id,percentage,status,extra\ns1,90,Good,x\ns2,40,Warning,y\n', 'csv')
+
+    assert [(number, row['student_id'], error) for number, row, error in rows] == [(2, 's1', None), (3, 's2', None)]
+
+
+def test_csv_missing_columns_is_one_error():
+    rows = rows_from('student_id,status\ns1,Good\n', 'csv')
+
+    assert rows == [(1, None, "CSV header is missing columns: percentage")]
+
+
+def test_jsonl_parsing_reports_bad_lines():
+    text = '{"student_id": "s1", "percentage": 90, "status": "Good"}\n\n[1, 2]\n{not json\n'
+    rows = rows_from(text, 'jsonl')
+
+    assert rows[0] == (1, {'student_id': 's1', 'percentage': 90, 'status': 'Good'}, None)
+    assert rows[1] == (3, None, "Each JSONL line must be an object.")
+    assert rows[2][0] == 4 and rows[2][2].startswith("Invalid JSON")
+
+
+def test_unsupported_format():
+    assert rows_from('x', 'xlsx') == [(0, None, "Unsupported format 'xlsx'. Use 'csv' or 'jsonl'.")]
+
+
+# --- Validation -------------------------------------------------------------
+
+def test_validate_row_normalizes_fields():
+    assert validate_row({'student_id': ' s1 ', 'percentage': ' 75 ', 'status': 'Good '}) == \
+        ('s1', {'percentage': 75, 'status': 'Good'})
+
+
+@pytest.mark.parametrize('row, message', [
+    ({'percentage': 50, 'status': 'Good'}, "Missing student_id."),
+    ({'student_id': 'a/b', 'percentage': 50, 'status': 'Good'}, "student_id must not contain '/'."),
+    ({'student_id': 's1', 'percentage': 50, 'status': ' '}, "Missing status."),
+    ({'student_id': 's1', 'percentage': 'ninety', 'status': 'Good'}, "Percentage 'ninety' is not an integer."),
+    ({'student_id': 's1', 'percentage': None, 'status': 'Good'}, "Percentage 'None' is not an integer."),
+    ({'student_id': 's1', 'percentage': 101, 'status': 'Good'}, "Percentage 101 is outside 0-100."),
+    ({'student_id': 's1', 'percentage': -1, 'status': 'Good'}, "Percentage -1 is outside 0-100."),
+])
+def test_validate_row_rejections(row, message):
+    with pytest.raises(ValueError) as excinfo:
+        validate_row(row)
+    assert str(excinfo.value) == message
+
+
+# --- Importing --------------------------------------------------------------
+
+def test_import_writes_rows_in_batches_of_at_most_500():
+    store = FakeStore()
+    result = import_attendance(store, COLLECTION, rows_from(csv_text(1234), 'csv'), batch_size=5000)
+
+    assert sorted(store.batch_sizes) == [234, 500, 500]
+    assert result['rows_read'] == 1234
+    assert result['rows_written'] == 1234
+    assert result['batches_committed'] == 3
+    assert result['rows_failed'] == 0
+    stored = store.get(COLLECTION, 's00042')
+    assert (stored['percentage'], stored['status']) == (42, 'Good')
+    assert stored['timestamp'] is not None
+
+
+def test_import_merges_into_existing_records():
+    store = FakeStore()
+    store.store.set(COLLECTION, 's00001', {'percentage': 10, 'status': 'Warning', 'note': 'kept'})
+
+    import_attendance(store, COLLECTION, rows_from(csv_text(2), 'csv'))
+
+    assert store.get(COLLECTION, 's00001')['note'] == 'kept'
+    assert store.get(COLLECTION, 's00001')['percentage'] == 1
+
+
+def test_import_keeps_at_most_max_in_flight_commits():
+    store = FakeStore(commit_delay=0.02)
+    result = import_attendance(store, COLLECTION, rows_from(csv_text(1000), 'csv'), batch_size=50)
+
+    assert result['batches_committed'] == 20
+    assert store.peak_in_flight == attendance_import.DEFAULT_MAX_IN_FLIGHT
+    assert 1 < store.peak_in_flight
+
+
+def test_failed_batch_reports_each_of_its_rows():
+    store = FakeStore(fail_commits={2})
+    result = import_attendance(store, COLLECTION, rows_from(csv_text(30), 'csv'), batch_size=10, max_in_flight=1)
+
+    assert result['rows_written'] == 20
+    assert result['batches_committed'] == 2
+    assert result['rows_failed'] == 10
+    # Commits run in order with one in flight, so the second batch (rows 12-21 of the file) failed.
+    assert [error['row'] for error in result['errors']] == list(range(12, 22))
+    assert result['errors'][0] == {'row': 12, 'student_id': 's00010', 'error': "Batch commit failed: deadline exceeded"}
+    assert store.get(COLLECTION, 's00010') is None
+    assert store.get(COLLECTION, 's00020') is not None
+
+
+def test_invalid_rows_are_reported_and_skipped():
+    text = 'student_id,percentage,status\ns1,90,Good\ns2,abc,Good\n,50,Good\ns4,50,Good\n'
+    store = FakeStore()
+    result = import_attendance(store, COLLECTION, rows_from(text, 'csv'))
+
+    assert result['rows_read'] == 4
+    assert result['rows_written'] == 2
+    assert result['errors'] == [
+        {'row': 3, 'student_id': 's2', 'error': "Percentage 'abc' is not an integer."},
+        {'row': 4, 'student_id': '', 'error': "Missing student_id."},
+    ]
+
+
+def test_reported_errors_are_truncated(monkeypatch):
+    monkeypatch.setattr(attendance_import, 'MAX_REPORTED_ERRORS', 5)
+    text = '\n'.join(json.dumps({'student_id': f"s{n}", 'percentage': 500, 'status': 'Good'}) for n in range(12))
+    result = import_attendance(FakeStore(), COLLECTION, rows_from(text, 'jsonl'))
+
+    assert result['rows_failed'] == 12
+    assert len(result['errors']) == 5
+    assert result['errors_truncated'] is True
@@ -0,0 +1,143 @@
+import random
+from datetime import datetime, timezone
+
+import pytest
+
+import attendance_index
+from attendance_index import AttendanceIndex
+from storage import Document
+
+STATUSES = ['Good', 'Warning', 'Detained', 'Medical']
+
+QUERIES = [
+    {},
+    {'status': 'Detained'},
+    {'max_percentage': 75},
+    {'max_percentage': 75, 'status': 'Detained'},
+    {'min_percentage': 90, 'max_percentage': 91},
+    {'min_percentage': 95, 'status': 'Medical', 'descending': True},
+    {'sort': 'percentage'},
+    {'sort': 'percentage', 'descending': True, 'offset': 100},
+    {'sort': 'percentage', 'status': 'Good', 'min_percentage': 50, 'max_percentage': 60, 'offset': 7},
+    {'max_percentage': 75, 'descending': True, 'offset': 300},
+    {'min_percentage': 99, 'offset': 10, 'limit': 5},
+    {'min_percentage': 40, 'max_percentage': 80, 'status': 'Warning', 'offset': 20},
+    {'status': 'Unknown status'},
+    {'max_percentage': 0},
+    {'offset': 100000},
+]
+
+
+def reference(state, status=None, min_percentage=None, max_percentage=None,
+              sort='student_id', descending=False, offset=0, limit=50):
+    """Brute-force version of AttendanceIndex.query over {student_id: data}."""
+    rows = [(student_id, data) for student_id, data in state.items()
+            if (status is None or data['status'] == status)
+            and (min_percentage is None or data['percentage'] >= min_percentage)
+            and (max_percentage is None or data['percentage'] < max_percentage)]
+    if sort == 'student_id':
+        rows.sort(key=lambda row: row[0], reverse=descending)
+    else:
+        rows.sort(key=lambda row: row[1]['percentage'], reverse=descending)
+    return rows[offset:offset + limit], len(rows)
+
+
+def check(index, state, query):
+    records, total = index.query(**query)
+    expected, expected_total = reference(state, **query)
+    assert total == expected_total, query
+    if query.get('sort') == 'percentage':
+        # Students with equal percentages may be paged in any order; compare the percentages.
+        assert [record['percentage'] for record in records] == [data['percentage'] for _, data in expected], query
+    else:
+        assert [record['student_id'] for record in records] == [student_id for student_id, _ in expected], query
+    for record in records:
+        assert record['status'] == state[record['student_id']]['status']
+        assert record['percentage'] == state[record['student_id']]['percentage']
+
+
+def random_data(rng):
+    # Whole percentages, so the index's float32 column holds them exactly.
+    return {'percentage': rng.randint(0, 100), 'status': rng.choice(STATUSES),
+            'timestamp': datetime(2026, 1, 1, tzinfo=timezone.utc)}
+
+
+@pytest.fixture(params=[4096, 8], ids=['sort-candidates', 'scan-id-order'])
+def candidates_limit(request, monkeypatch):
+    # Ranged student_id-ordered pages take one of two paths depending on the number of matches.
+    monkeypatch.setattr(attendance_index, '_SORT_CANDIDATES_LIMIT', request.param)
+
+
+def build(rng, size):
+    state = {f"s{n:05d}": random_data(rng) for n in rng.sample(range(size * 2), size)}
+    return AttendanceIndex.build(Document(student_id, data) for student_id, data in state.items()), state
+
+
+def test_queries_match_brute_force(candidates_limit):
+    index, state = build(random.Random(1), 3000)
+    for query in QUERIES:
+        check(index, state, query)
+
+
+def test_queries_match_brute_force_after_updates_and_removals(candidates_limit):
+    rng = random.Random(2)
+    index, state = build(rng, 2000)
+    for step in range(3000):
+        roll = rng.random()
+        if roll < 0.05 and state:
+            student_id = rng.choice(sorted(state))
+            index.remove(student_id)
+            del state[student_id]
+        elif roll < 0.25:
+            student_id = f"n{step:05d}"
+            data = random_data(rng)
+            index.update(student_id, data)
+            state[student_id] = data
+        else:
+            student_id = rng.choice(sorted(state))
+            data = random_data(rng)
+            if roll > 0.9:
+                data['status'] = 'Transferred'  # A status first seen on update.
+            index.update(student_id, data)
+            state[student_id] = data
+
+    assert len(index) == len(state)
+    for query in QUERIES + [{'status': 'Transferred', 'sort': 'percentage'}, {'status': 'Transferred', 'max_percentage': 50}]:
+        check(index, state, query)
+    for student_id in rng.sample(sorted(state), 50):
+        assert index.get(student_id)['percentage'] == state[student_id]['percentage']
+
+
+def test_partial_update_keeps_other_fields():
+    index = AttendanceIndex.build([Document('s1', {'percentage': 80, 'status': 'Good'})])
+    index.update('s1', {'percentage': 60})
+    assert index.get('s1') == {'student_id': 's1', 'percentage': 60, 'status': 'Good', 'last_updated': 'N/A'}
+    index.update('s1', {'status': 'Warning'})
+    assert index.get('s1')['percentage'] == 60
+    assert index.query(status='Good') == ([], 0)
+
+
+def test_summary_matches_brute_force():
+    rng = random.Random(3)
+    index, state = build(rng, 1000)
+    for student_id in rng.sample(sorted(state), 100):
+        index.remove(student_id)
+        del state[student_id]
+
+    summary = index.summary(bins=10)
+
+    percentages = [data['percentage'] for data in state.values()]
+    assert summary['students'] == len(state)
+    assert summary['mean_percentage'] == round(sum(percentages) / len(percentages), 2)
+    assert sum(bucket['count'] for bucket in summary['histogram']) == len(state)
+    assert summary['histogram'][0]['count'] == sum(1 for p in percentages if p < 10)
+    assert summary['histogram'][-1]['count'] == sum(1 for p in percentages if p >= 90)
+    for status in STATUSES:
+        matching = [data['percentage'] for data in state.values() if data['status'] == status]
+        assert summary['by_status'][status] == {'count': len(matching),
+                                                'mean_percentage': round(sum(matching) / len(matching), 2)}
+
+
+def test_rejects_unknown_sort_field():
+    with pytest.raises(ValueError):
+        AttendanceIndex().query(sort='name')
@@ -0,0 +1,163 @@
+import json
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from live_view import ADDED, MODIFIED, REMOVED, Change, ChangeBroadcaster, LiveCollections, LocalChangeFeed, SubscribersFull
+
+
+def parse(message):
+    """Splits one SSE message into its fields."""
+    fields = {}
+    for line in message.strip().split('\n'):
+        key, _, value = line.partition(': ')
+        fields[key] = value
+    return fields
+
+
+def open_stream(broadcaster, topics, last_event_id=None):
+    stream = broadcaster.subscribe(topics, last_event_id=last_event_id)
+    assert next(stream).startswith('retry:')
+    return stream
+
+
+def test_resume_from_last_event_id():
+    broadcaster = ChangeBroadcaster(heartbeat=0.01)
+    for n in range(3):
+        broadcaster.publish('events', 'change', {'n': n})
+
+    stream = open_stream(broadcaster, {'events'}, last_event_id=f"{broadcaster.epoch}-1")
+    resumed = [parse(next(stream)) for _ in range(2)]
+
+    assert [json.loads(event['data'])['n'] for event in resumed] == [1, 2]
+    assert [event['id'] for event in resumed] == [f"{broadcaster.epoch}-2", f"{broadcaster.epoch}-3"]
+
+
+def test_resume_skips_other_topics():
+    broadcaster = ChangeBroadcaster(heartbeat=0.01)
+    broadcaster.publish('events', 'change', {'n': 0})
+    broadcaster.publish('circulars', 'change', {'n': 1})
+    broadcaster.publish('events', 'change', {'n': 2})
+
+    stream = open_stream(broadcaster, {'events'}, last_event_id=f"{broadcaster.epoch}-0")
+
+    assert json.loads(parse(next(stream))['data'])['n'] == 0
+    assert json.loads(parse(next(stream))['data'])['n'] == 2
+
+
+def test_new_subscriber_starts_at_latest():
+    broadcaster = ChangeBroadcaster(heartbeat=0.01)
+    broadcaster.publish('events', 'change', {'n': 0})
+
+    stream = open_stream(broadcaster, {'events'})
+    broadcaster.publish('events', 'change', {'n': 1})
+
+    assert json.loads(parse(next(stream))['data'])['n'] == 1
+
+
+@pytest.mark.parametrize('last_event_id', ['0badc0de-1', '1', 'garbage', '{epoch}-99'])
+def test_foreign_or_unknown_event_id_gets_reset(last_event_id):
+    broadcaster = ChangeBroadcaster(heartbeat=0.01)
+    broadcaster.publish('events', 'change', {'n': 0})
+
+    stream = open_stream(broadcaster, {'events'}, last_event_id=last_event_id.format(epoch=broadcaster.epoch))
+    event = parse(next(stream))
+
+    assert event['event'] == 'reset'
+    assert event['id'] == f"{broadcaster.epoch}-1"
+    # After the reset the stream carries on from the latest event.
+    broadcaster.publish('events', 'change', {'n': 1})
+    assert json.loads(parse(next(stream))['data'])['n'] == 1
+
+
+def test_cursor_evicted_from_history_gets_reset():
+    broadcaster = ChangeBroadcaster(history=2, heartbeat=0.01)
+    stream = open_stream(broadcaster, {'events'})
+    for n in range(5):
+        broadcaster.publish('events', 'change', {'n': n})
+
+    assert parse(next(stream))['event'] == 'reset'
+
+    stale = open_stream(broadcaster, {'events'}, last_event_id=f"{broadcaster.epoch}-1")
+    assert parse(next(stale))['event'] == 'reset'
+
+
+def test_idle_stream_sends_keepalive():
+    broadcaster = ChangeBroadcaster(heartbeat=0.01)
+    stream = open_stream(broadcaster, {'events'})
+
+    assert next(stream) == ": keepalive\n\n"
+
+
+def test_subscriber_cap_and_release():
+    broadcaster = ChangeBroadcaster(max_subscribers=1, heartbeat=0.01)
+    stream = open_stream(broadcaster, {'events'})
+
+    with pytest.raises(SubscribersFull):
+        broadcaster.subscribe({'events'})
+    assert broadcaster.stats()['rejected'] == 1
+
+    stream.close()
+    open_stream(broadcaster, {'events'})
+
+
+def test_close_ends_streams():
+    broadcaster = ChangeBroadcaster(heartbeat=0.01)
+    stream = open_stream(broadcaster, {'events'})
+
+    broadcaster.close()
+
+    assert list(stream) == []
+    assert broadcaster.stats()['subscribers'] == 0
+
+
+def test_local_feed_drives_views_and_broadcasts():
+    feed = LocalChangeFeed()
+    broadcaster = ChangeBroadcaster(heartbeat=0.01)
+    live = LiveCollections(feed, broadcaster)
+    view = live.watch('data/events', 'events', lambda doc_id, data: dict(data, id=doc_id),
+                      order_by='timestamp', descending=True)
+    assert live.view('data/events') is not None  # The empty initial snapshot makes it ready.
+
+    stream = open_stream(broadcaster, {'events'})
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    feed.publish('data/events', [
+        Change(ADDED, 'a', {'title': 'A', 'timestamp': start}),
+        Change(ADDED, 'b', {'title': 'B', 'timestamp': start + timedelta(hours=1)}),
+        Change(ADDED, 'untimed', {'title': 'No timestamp'}),
+    ])
+    feed.publish('data/events', [Change(MODIFIED, 'a', {'title': 'A2', 'timestamp': start + timedelta(hours=2)})])
+    feed.publish('data/events', [Change(REMOVED, 'b', None)])
+
+    # Ordered like the storage query, which leaves out documents without the order field.
+    assert [doc.id for doc in view.documents()] == ['a']
+    assert view.get('a')['title'] == 'A2'
+
+    events = [json.loads(parse(next(stream))['data']) for _ in range(5)]
+    assert [(event['type'], event['id']) for event in events] == [
+        (ADDED, 'a'), (ADDED, 'b'), (ADDED, 'untimed'), (MODIFIED, 'a'), (REMOVED, 'b')]
+    assert events[3]['record'] == {'title': 'A2', 'timestamp': str(start + timedelta(hours=2)), 'id': 'a'}
+    assert events[4]['record'] is None
+
+    # A new initial state (e.g. after a bulk import) tells open pages to reload.
+    feed.publish('data/events', [Change(ADDED, 'c', {'title': 'C', 'timestamp': start})], initial=True)
+    assert parse(next(stream))['event'] == 'reset'
+    assert [doc.id for doc in view.documents()] == ['c']
+
+
+def test_view_build_is_cached_until_the_next_change():
+    feed = LocalChangeFeed()
+    live = LiveCollections(feed, ChangeBroadcaster())
+    view = live.watch('data/circulars', 'circulars', lambda doc_id, data: data)
+    calls = []
+
+    def builder(collection_path, docs):
+        calls.append(collection_path)
+        return [doc.id for doc in docs]
+
+    feed.publish('data/circulars', [Change(ADDED, 'x', {}), Change(ADDED, 'w', {})])
+    assert view.build(builder) == ['w', 'x']
+    assert view.build(builder) == ['w', 'x']
+    feed.publish('data/circulars', [Change(REMOVED, 'w', None)])
+    assert view.build(builder) == ['x']
+    assert len(calls) == 2
@@ -0,0 +1,124 @@
+import json
+import threading
+
+import pytest
+
+from write_behind import BufferFull, WriteBehindBuffer
+
+
+class Recorder:
+    """flush_fn that records each call and fails the first `failures` of them."""
+
+    def __init__(self, failures=0):
+        self.failures = failures
+        self.calls = []
+        self.flushed = threading.Event()
+
+    def __call__(self, records, maybe_committed):
+        self.calls.append(([record['id'] for record in records], set(maybe_committed)))
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("commit failed")
+        self.flushed.set()
+
+
+def spill_lines(spill_dir):
+    with open(spill_dir / 'registrations-0.jsonl', encoding='utf-8') as f:
+        return [json.loads(line) for line in f]
+
+
+def make_buffer(flush_fn, spill_dir, **kwargs):
+    kwargs.setdefault('flush_interval', 0.01)
+    return WriteBehindBuffer(flush_fn, spill_dir, name='registrations', **kwargs)
+
+
+def test_flushes_in_batches_and_empties_the_spill_file(tmp_path):
+    recorder = Recorder()
+    buffer = make_buffer(recorder, tmp_path, max_batch=2, flush_interval=60)
+    buffer.start()
+    for n in range(4):
+        buffer.submit({'id': f"r{n}"})
+    buffer.drain()
+
+    assert [ids for ids, _ in recorder.calls] == [['r0', 'r1'], ['r2', 'r3']]
+    assert all(maybe_committed == set() for _, maybe_committed in recorder.calls)
+    assert buffer.stats()['flushed'] == 4
+    assert spill_lines(tmp_path) == []
+
+
+def test_replays_unacknowledged_records_after_a_crash(tmp_path):
+    # What a worker leaves behind when it dies mid-run: r0 committed and acked, r1 and r2
+    # accepted but never acked, and a torn final line from a write cut short.
+    with open(tmp_path / 'registrations-0.jsonl', 'w', encoding='utf-8') as f:
+        for entry in ({'id': 'r0'}, {'id': 'r1'}, {'ack': 'r0'}, {'id': 'r2'}):
+            f.write(json.dumps(entry) + '\n')
+        f.write('{"id": "r3", "event')
+
+    recorder = Recorder()
+    buffer = make_buffer(recorder, tmp_path)
+    buffer.start()
+    assert recorder.flushed.wait(5)
+    buffer.drain()
+
+    assert buffer.stats()['replayed'] == 2
+    # Replayed records may have been committed before the crash; flush_fn is told so.
+    assert recorder.calls == [(['r1', 'r2'], {'r1', 'r2'})]
+    assert spill_lines(tmp_path) == []
+
+
+def test_records_from_a_failed_flush_are_retried_as_maybe_committed(tmp_path):
+    recorder = Recorder(failures=1)
+    buffer = make_buffer(recorder, tmp_path, max_batch=2, flush_interval=60)
+    buffer.start()
+    buffer.submit({'id': 'r0'})
+    buffer.submit({'id': 'r1'})
+    assert recorder.flushed.wait(5)
+    buffer.submit({'id': 'r2'})
+    buffer.drain()
+
+    first, retry = recorder.calls[0], recorder.calls[1]
+    assert first == (['r0', 'r1'], set())
+    assert retry == (['r0', 'r1'], {'r0', 'r1'})
+    # Once acknowledged, ids are no longer reported as maybe committed.
+    assert recorder.calls[2:] == [(['r2'], set())]
+    assert buffer.stats()['flush_failures'] == 1
+
+
+def test_unflushed_records_survive_shutdown(tmp_path):
+    buffer = make_buffer(Recorder(failures=1000), tmp_path)
+    buffer.start()
+    buffer.submit({'id': 'r0', 'event_id': 'E1'})
+    buffer.drain(timeout=5)
+    buffer._lock_file.close()  # Release the spill slot, as a process exit would.
+
+    recorder = Recorder()
+    restarted = make_buffer(recorder, tmp_path)
+    restarted.start()
+    assert recorder.flushed.wait(5)
+    restarted.drain()
+
+    assert recorder.calls == [(['r0'], {'r0'})]
+
+
+def test_rejects_when_full_or_stopping(tmp_path):
+    buffer = make_buffer(Recorder(failures=1000), tmp_path, max_queue=1, flush_interval=60)
+    buffer.start()
+    buffer.submit({'id': 'r0'})
+    with pytest.raises(BufferFull):
+        buffer.submit({'id': 'r1'})
+    buffer.drain(timeout=1)
+    with pytest.raises(BufferFull):
+        buffer.submit({'id': 'r2'})
+
+
+def test_concurrent_workers_use_separate_spill_files(tmp_path):
+    first = make_buffer(Recorder(), tmp_path)
+    second = make_buffer(Recorder(), tmp_path)
+    first.start()
+    second.start()
+    first.submit({'id': 'a'})
+    second.submit({'id': 'b'})
+    first.drain()
+    second.drain()
+
+    assert first._spill_file.name != second._spill_file.name
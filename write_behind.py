@@ -0,0 +1,204 @@
+import json
+import os
+import threading
+import time
+from collections import deque
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:  # Windows: a single process owns the one spill file.
+    fcntl = None
+
+
+class BufferFull(Exception):
+    """Raised when the write-behind buffer is full (`max_queue` unflushed records) or shutting down."""
+
+
+class WriteBehindBuffer:
+    """
+    Accepts records in memory and commits them in the background.
+
+    Every accepted record is first appended to a JSONL spill file, so a crash
+    before the flush loses nothing: on start() any record without a matching
+    {"ack": id} line is re-queued. The flusher thread calls
+    `flush_fn(records, maybe_committed)` whenever `max_batch` records are
+    waiting or `flush_interval` seconds have passed. On failure the records
+    stay queued and are retried on the next cycle. `maybe_committed` is the set
+    of ids in `records` that may already have been committed: records replayed
+    after a crash, and records from a flush that failed part-way. `flush_fn`
+    must not apply those a second time.
+    """
+
+    def __init__(self, flush_fn, spill_dir, name='buffer', max_batch=200, flush_interval=1.0, max_queue=10000):
+        self.flush_fn = flush_fn
+        self.spill_dir = Path(spill_dir)
+        self.name = name
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_queue = max_queue
+
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._spill_file = None
+        self._lock_file = None
+        self._thread = None
+        self._stopping = False
+        self._maybe_committed = set()
+
+        self.accepted = 0
+        self.flushed = 0
+        self.flush_failures = 0
+        self.replayed = 0
+        self.last_flush_seconds = 0.0
+        self.total_flush_seconds = 0.0
+        self.flush_count = 0
+
+    # --- Spill file -----------------------------------------------------
+
+    def _claim_spill_path(self):
+        """Each worker process locks its own numbered spill file, so concurrent workers never share one."""
+        self.spill_dir.mkdir(parents=True, exist_ok=True)
+        if fcntl is None:
+            return self.spill_dir / f"{self.name}-0.jsonl"
+
+        slot = 0
+        while True:
+            lock_file = open(self.spill_dir / f"{self.name}-{slot}.lock", 'a')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                slot += 1
+                continue
+            self._lock_file = lock_file
+            return self.spill_dir / f"{self.name}-{slot}.jsonl"
+
+    def _replay(self, spill_path):
+        """Returns records from a previous run that were never acknowledged, in order."""
+        if not spill_path.exists():
+            return []
+        pending = {}
+        with open(spill_path, 'r', encoding='utf-8') as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # A torn final line from a crash mid-write.
+                    continue
+                if 'ack' in entry:
+                    pending.pop(entry['ack'], None)
+                else:
+                    pending[entry['id']] = entry
+        return list(pending.values())
+
+    def _append(self, entries):
+        for entry in entries:
+            self._spill_file.write(json.dumps(entry) + '\n')
+        self._spill_file.flush()
+
+    # --- Lifecycle ------------------------------------------------------
+
+    def start(self):
+        """Replays unacknowledged records from the spill file and starts the flusher thread."""
+        spill_path = self._claim_spill_path()
+        pending = self._replay(spill_path)
+
+        # Compact: rewrite the spill file with only the still-pending records.
+        tmp_path = spill_path.with_suffix('.tmp')
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            for entry in pending:
+                f.write(json.dumps(entry) + '\n')
+        os.replace(tmp_path, spill_path)
+
+        self._spill_file = open(spill_path, 'a', encoding='utf-8')
+        self._queue.extend(pending)
+        self._maybe_committed.update(entry['id'] for entry in pending)
+        self.replayed = len(pending)
+        if pending:
+            print(f"Write-behind ({self.name}): replaying {len(pending)} unflushed records from {spill_path}")
+
+        self._thread = threading.Thread(target=self._run, name=f"write-behind-{self.name}", daemon=True)
+        self._thread.start()
+
+    def submit(self, record):
+        """Durably accepts one record (a dict with a unique 'id') for background commit."""
+        with self._cond:
+            if self._stopping or len(self._queue) >= self.max_queue:
+                raise BufferFull()
+            self._append([record])
+            self._queue.append(record)
+            self.accepted += 1
+            if len(self._queue) >= self.max_batch:
+                self._cond.notify()
+
+    def _run(self):
+        while True:
+            with self._cond:
+                if not self._stopping and len(self._queue) < self.max_batch:
+                    self._cond.wait(timeout=self.flush_interval)
+                if self._stopping and not self._queue:
+                    return
+            if not self._flush_once() and self._stopping:
+                # Committing keeps failing during shutdown; the spill file still holds the records.
+                return
+
+    def _flush_once(self):
+        with self._cond:
+            batch = [self._queue[i] for i in range(min(self.max_batch, len(self._queue)))]
+        if not batch:
+            return True
+
+        ids = [record['id'] for record in batch]
+        started = time.perf_counter()
+        try:
+            self.flush_fn(batch, self._maybe_committed.intersection(ids))
+        except Exception as e:
+            self._maybe_committed.update(ids)
+            self.flush_failures += 1
+            print(f"Write-behind ({self.name}) flush of {len(batch)} records failed: {e}")
+            time.sleep(min(self.flush_interval, 1.0))
+            return False
+        elapsed = time.perf_counter() - started
+
+        with self._cond:
+            for _ in batch:
+                self._queue.popleft()
+            self._append([{'ack': record_id} for record_id in ids])
+            self._maybe_committed.difference_update(ids)
+            if not self._queue:
+                # Everything is committed; start the spill file afresh so it stays small.
+                self._spill_file.seek(0)
+                self._spill_file.truncate()
+            os.fsync(self._spill_file.fileno())
+            self.flushed += len(batch)
+            self.flush_count += 1
+            self.last_flush_seconds = elapsed
+            self.total_flush_seconds += elapsed
+        return True
+
+    def drain(self, timeout=30):
+        """Stops accepting new work, flushes everything queued and stops the flusher (shutdown hook)."""
+        if self._thread is None:
+            return
+        with self._cond:
+            self._stopping = True
+            self._cond.notify()
+        self._thread.join(timeout=timeout)
+        remaining = len(self._queue)
+        if remaining:
+            print(f"Write-behind ({self.name}): {remaining} records left in the spill file for the next start")
+
+    def stats(self):
+        with self._cond:
+            return {
+                'queue_depth': len(self._queue),
+                'accepted': self.accepted,
+                'flushed': self.flushed,
+                'replayed': self.replayed,
+                'flush_failures': self.flush_failures,
+                'last_flush_seconds': round(self.last_flush_seconds, 4),
+                'avg_flush_seconds': round(self.total_flush_seconds / self.flush_count, 4) if self.flush_count else 0.0,
+                'max_batch': self.max_batch,
+                'flush_interval_seconds': self.flush_interval,
+            }